@@ -0,0 +1,239 @@
+"""
+Cheap /ingest pre-validation, done before (or while) the body is read
+
+- Body limits: MAX_BODY_BYTES caps every request; TENANT_MAX_BODY_BYTES
+  (JSON keyed by tenant_id, "*" for tenants without an entry) can only lower
+  it. Limits count bytes on the wire, so a Content-Length over the limit is
+  rejected before any body byte is read
+- Tenant ids must be usable as a Firestore document id
+- TenantIdScanner finds the top-level "tenant_id" of a JSON object as the
+  body streams in, without building the document, so a missing or invalid
+  tenant_id (or a body that is not a JSON object) is rejected early
+"""
+
+import codecs
+import json
+import re
+from typing import Dict, Optional
+
+# Firestore allows 1500 bytes; tenant ids are also used in log lines and
+# Pub/Sub attributes, so keep them short
+TENANT_ID_MAX_CHARS = 128
+
+# Scanner states
+PENDING = "pending"
+FOUND = "found"
+MISSING = "missing"
+INVALID = "invalid"
+MALFORMED = "malformed"
+
+TENANT_KEY = "tenant_id"
+JSON_WHITESPACE = b" \t\r\n"
+BACKSLASH = ord("\\")
+# json.loads accepts (and skips) a leading UTF-8 BOM on bytes, so must we
+UTF8_BOM = codecs.BOM_UTF8
+# Longest raw (still escaped) key or tenant_id string the scanner buffers
+KEY_MAX_BYTES = 64
+VALUE_MAX_BYTES = TENANT_ID_MAX_CHARS * 6
+
+_STRUCTURAL = re.compile(rb'[{}\[\]",:]')
+
+
+def valid_tenant_id(value) -> bool:
+    """Non-empty string that is a valid Firestore document id"""
+    return (
+        isinstance(value, str)
+        and 0 < len(value) <= TENANT_ID_MAX_CHARS
+        and "/" not in value
+        and value not in (".", "..")
+        and value.isprintable()
+    )
+
+
+def parse_content_length(value: Optional[str]) -> Optional[int]:
+    """Declared body size, None if absent; ValueError if malformed"""
+    if value is None:
+        return None
+    length = int(value)
+    if length < 0:
+        raise ValueError("negative Content-Length")
+    return length
+
+
+class BodyLimits:
+    """Global body cap plus per-tenant caps below it"""
+
+    def __init__(self, max_bytes: int, tenants: Optional[Dict[str, int]] = None):
+        self.max_bytes = max_bytes
+        self.tenants = {}
+        for tenant_id, limit in (tenants or {}).items():
+            if not isinstance(limit, int) or isinstance(limit, bool) or limit <= 0:
+                raise ValueError(f"Invalid body limit for tenant {tenant_id!r}")
+            self.tenants[tenant_id] = min(limit, max_bytes)
+
+    def limit_for(self, tenant_id: Optional[str]) -> int:
+        if tenant_id is None:
+            return self.max_bytes
+        return self.tenants.get(tenant_id) or self.tenants.get("*") or self.max_bytes
+
+
+def load_limits(max_bytes: int, inline: Optional[str] = None) -> BodyLimits:
+    """BodyLimits from MAX_BODY_BYTES and TENANT_MAX_BODY_BYTES (inline JSON)"""
+    return BodyLimits(max_bytes, json.loads(inline) if inline else None)
+
+
+class TenantIdScanner:
+    """
+    Incremental scan for the top-level "tenant_id" string of a JSON object
+    Only the structure is tracked (nesting depth, strings, top-level keys);
+    bytes are skipped with searches (bytes.find for the closing quote inside
+    strings, which hold most of a log's bytes), and nothing is buffered except
+    top-level keys and the tenant_id value. Stops at the first result:
+
+    - FOUND: tenant_id holds the (unescaped) value
+    - MISSING: the top-level object closed without a tenant_id
+    - INVALID: tenant_id is not a string (or an absurdly long one)
+    - MALFORMED: the body is not a JSON object
+    """
+
+    def __init__(self):
+        self.state = PENDING
+        self.tenant_id = None
+        self._started = False
+        self._bom = 0  # leading BOM bytes checked (len(UTF8_BOM) once decided)
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._await_tenant = False
+        self._role = None  # "key" or "tenant" while buffering a string
+        self._buffer = None
+        self._key = None
+        self._view = None
+        self._view_offset = 0
+
+    def feed(self, data: bytes):
+        pos, size = 0, len(data)
+        self._view = None
+        if self._bom < len(UTF8_BOM):
+            pos = self._skip_bom(data)
+        while pos < size and self.state == PENDING:
+            if not self._started or self._await_tenant:
+                while pos < size and data[pos] in JSON_WHITESPACE:
+                    pos += 1
+                if pos == size:
+                    return
+                pos = self._value_start(data[pos], pos)
+            elif self._in_string:
+                pos = self._scan_string(data, pos, size)
+            else:
+                match = _STRUCTURAL.search(data, pos)
+                if match is None:
+                    return
+                pos = match.end()
+                self._structural(data[match.start()])
+
+    def _skip_bom(self, data: bytes) -> int:
+        """Consume a leading UTF-8 BOM, possibly split across chunks"""
+        pos = 0
+        while pos < len(data) and self._bom < len(UTF8_BOM):
+            if data[pos] != UTF8_BOM[self._bom]:
+                if self._bom:
+                    self.state = MALFORMED  # a truncated BOM
+                self._bom = len(UTF8_BOM)
+                return pos
+            self._bom += 1
+            pos += 1
+        return pos
+
+    def _value_start(self, byte: int, pos: int) -> int:
+        if not self._started:
+            if byte != ord("{"):
+                self.state = MALFORMED
+            self._started, self._depth, self._expect_key = True, 1, True
+        elif byte == ord('"'):
+            self._await_tenant = False
+            self._begin_string("tenant")
+        else:
+            self.state = INVALID
+        return pos + 1
+
+    def _scan_string(self, data: bytes, pos: int, size: int) -> int:
+        if self._escape:
+            self._escape = False
+            self._collect(data[pos : pos + 1])
+            pos += 1
+        quote = data.find(b'"', pos)
+        if quote > pos and data[quote - 1] == BACKSLASH:
+            # maybe escaped: find it again where escape pairs are blanked out
+            view = self._unescaped_view(data, pos)
+            quote = view.find(b'"', pos - self._view_offset)
+            if quote >= 0:
+                quote += self._view_offset
+        if quote < 0:
+            # an odd trailing backslash run escapes the next chunk's first byte
+            run = size
+            while run > pos and data[run - 1] == BACKSLASH:
+                run -= 1
+            self._escape = (size - run) % 2 == 1
+            self._collect(data[pos:size])
+            return size
+        self._collect(data[pos:quote])
+        self._in_string = False
+        self._end_string()
+        return quote + 1
+
+    def _unescaped_view(self, data: bytes, pos: int) -> bytes:
+        """
+        data[pos:] with every two-byte escape replaced by spaces (same
+        length), built once per chunk; pos must not be inside an escape
+        """
+        if self._view is None:
+            self._view = data[pos:].replace(b"\\\\", b"  ").replace(b'\\"', b"  ")
+            self._view_offset = pos
+        return self._view
+
+    def _structural(self, byte: int):
+        top_level = self._depth == 1
+        if byte == ord('"'):
+            self._begin_string("key" if top_level and self._expect_key else None)
+        elif byte in b"{[":
+            self._depth += 1
+        elif byte in b"}]":
+            self._depth -= 1
+            if self._depth == 0:
+                self.state = MISSING
+        elif top_level and byte == ord(":"):
+            self._expect_key = False
+            self._await_tenant = self._key == TENANT_KEY
+        elif top_level and byte == ord(","):
+            self._expect_key = True
+
+    def _begin_string(self, role: Optional[str]):
+        self._in_string = True
+        self._role = role
+        self._buffer = bytearray() if role else None
+
+    def _collect(self, chunk: bytes):
+        if self._buffer is None:
+            return
+        self._buffer += chunk
+        if self._role == "key" and len(self._buffer) > KEY_MAX_BYTES:
+            self._buffer = None  # far longer than "tenant_id", whatever escapes
+        elif self._role == "tenant" and len(self._buffer) > VALUE_MAX_BYTES:
+            self.state = INVALID
+
+    def _end_string(self):
+        value = None
+        if self._buffer is not None:
+            try:
+                value = json.loads(b'"' + bytes(self._buffer) + b'"')
+            except ValueError:
+                self.state = MALFORMED
+                return
+        if self._role == "key":
+            self._key = value
+        elif self._role == "tenant":
+            self.tenant_id = value
+            self.state = FOUND
+        self._role, self._buffer = None, None
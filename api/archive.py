@@ -0,0 +1,62 @@
+"""
+Archive format for compacted processed_logs (written by worker/compaction.py)
+
+- tenants/{tenant_id}/archives/{day}-{digest}: an append-only segment of up
+  to SEGMENT_MAX_RECORDS logs processed on one day, stored as zlib-compressed
+  JSON lines in a single document
+- tenants/{tenant_id}/archive_index/{bucket}: {"entries": {log_id: segment}}
+  for the archived logs whose log_id hashes to that bucket, so a log is
+  found with two reads however many segments exist
+"""
+
+import hashlib
+import json
+import zlib
+from typing import Iterable, List, Optional
+
+ARCHIVES_COLLECTION = "archives"
+INDEX_COLLECTION = "archive_index"
+
+# Fixed: changing it orphans existing index entries. A bucket document holds
+# at most 20,000 fields, so the index covers ~4M archived logs per tenant
+# (with "entries" exempt from indexing, see terraform; otherwise the
+# per-document index entry limit is reached first)
+INDEX_BUCKETS = 256
+
+# Each segment and its index updates are committed in one batch (500 writes
+# at most); segments stay under Firestore's 1 MiB document limit
+SEGMENT_MAX_RECORDS = 2000
+SEGMENT_MAX_BYTES = 900 * 1024
+COMPRESSION_LEVEL = 6
+CODEC = "jsonl+zlib"
+
+
+def index_bucket(log_id: str) -> str:
+    digest = hashlib.blake2b(log_id.encode("utf-8"), digest_size=2).digest()
+    return f"{int.from_bytes(digest, 'big') % INDEX_BUCKETS:02x}"
+
+
+def segment_id(day: str, log_ids: Iterable[str]) -> str:
+    """Deterministic, so re-archiving the same logs overwrites the segment"""
+    digest = hashlib.blake2b("\n".join(log_ids).encode("utf-8"), digest_size=6)
+    return f"{day}-{digest.hexdigest()}"
+
+
+def encode_records(records: List[dict]) -> bytes:
+    """Records (each with a log_id) -> compressed JSON lines"""
+    lines = "\n".join(json.dumps(r, sort_keys=True, default=str) for r in records)
+    return zlib.compress(lines.encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def decode_records(data: bytes) -> List[dict]:
+    lines = zlib.decompress(data).decode("utf-8")
+    return [json.loads(line) for line in lines.split("\n") if line]
+
+
+def find_record(data: bytes, log_id: str) -> Optional[dict]:
+    """The record for log_id in an encoded segment, without its log_id key"""
+    for record in decode_records(data):
+        if record.get("log_id") == log_id:
+            record.pop("log_id")
+            return record
+    return None
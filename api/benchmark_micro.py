@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the API hot paths
+normalize_to_internal_format and the /ingest handler (accepts and early
+rejects), driven in-process through an ASGI client with Pub/Sub and
+Firestore mocked
+
+Usage:
+    python benchmark_micro.py --save               # write .benchmarks/baseline.json
+    python benchmark_micro.py --compare            # exit 1 on a >1.5x regression
+    python benchmark_micro.py --compare --threshold 1.3 --gate 'ingest*'
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import httpx
+import microbench
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Keep per-request log records out of the measurements and the output
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+# Mock GCP clients BEFORE importing main (no credentials needed)
+mock_publisher = MagicMock()
+mock_publisher.publish.return_value.result.return_value = "bench-message-id"
+mock_publisher.topic_path.return_value = "projects/bench/topics/data-ingestion"
+
+with patch(
+    "google.cloud.pubsub_v1.PublisherClient", return_value=mock_publisher
+), patch("google.cloud.firestore.Client", return_value=MagicMock()):
+    from main import app, normalize_to_internal_format
+
+TEXT = "User 555-0199 accessed the system from IP 192.168.1.1. "
+
+# ---- normalize_to_internal_format ----------------------------------------
+
+for label, payload in (
+    ("text", {"tenant_id": "acme", "text": TEXT}),
+    ("no_text", {"tenant_id": "acme", "event": "login", "ip": "192.168.1.1"}),
+    ("large", {"tenant_id": "acme", "text": TEXT * 2000}),
+):
+    microbench.register(
+        f"normalize[{label}]", lambda p=payload: normalize_to_internal_format(p)
+    )
+
+# ---- /ingest via in-process ASGI client ----------------------------------
+
+loop = asyncio.new_event_loop()
+client = httpx.AsyncClient(
+    transport=httpx.ASGITransport(app=app), base_url="http://bench"
+)
+
+json_body = json.dumps({"tenant_id": "acme", "text": TEXT * 20}).encode("utf-8")
+large_json_body = json.dumps({"tenant_id": "acme", "text": TEXT * 2000}).encode()
+REQUESTS = {
+    "ingest[json_1k]": (json_body, {"Content-Type": "application/json"}),
+    "ingest[json_100k]": (large_json_body, {"Content-Type": "application/json"}),
+    "ingest[text_1k]": (
+        (TEXT * 20).encode("utf-8"),
+        {"Content-Type": "text/plain", "X-Tenant-ID": "acme"},
+    ),
+    "ingest[gzip_json_100k]": (
+        gzip.compress(large_json_body),
+        {"Content-Type": "application/json", "Content-Encoding": "gzip"},
+    ),
+}
+
+
+# Rejected by pre-validation: from the headers alone, and by the tenant_id
+# scan (which has to reach the end of the object to know it is missing)
+REJECTED = {
+    "ingest_reject[bad_tenant_header]": (
+        (TEXT * 20).encode("utf-8"),
+        {"Content-Type": "text/plain", "X-Tenant-ID": "a/b"},
+    ),
+    "ingest_reject[no_tenant_json_100k]": (
+        json.dumps({"text": TEXT * 2000}).encode("utf-8"),
+        {"Content-Type": "application/json"},
+    ),
+}
+
+
+def post(body: bytes, headers: dict, expected: int = 202):
+    response = loop.run_until_complete(
+        client.post("/ingest", content=body, headers=headers)
+    )
+    if response.status_code != expected:
+        raise RuntimeError(f"/ingest returned {response.status_code}")
+
+
+for name, (body, headers) in REQUESTS.items():
+    microbench.register(name, lambda b=body, h=headers: post(b, h))
+
+for name, (body, headers) in REJECTED.items():
+    microbench.register(name, lambda b=body, h=headers: post(b, h, 400))
+
+
+if __name__ == "__main__":
+    sys.exit(
+        microbench.main(
+            "API microbenchmarks",
+            os.path.join(HERE, ".benchmarks", "baseline.json"),
+        )
+    )
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Throughput vs. worker-count benchmark for the production server (serve.py)
+Starts the API with mocked Pub/Sub/Firestore (run_local:app) for each worker
+count and drives /ingest from several client processes
+
+Usage:
+    python benchmark_workers.py --workers 1 2 4 --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from statistics import median
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+PAYLOAD = json.dumps(
+    {
+        "tenant_id": "bench_tenant",
+        "text": "User 555-0199 accessed the system from IP 192.168.1.1 " * 20,
+    }
+).encode("utf-8")
+
+
+async def drive(url: str, duration: float, concurrency: int):
+    """Send requests from `concurrency` coroutines for `duration` seconds"""
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=10) as client:
+
+        async def loop():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    r = await client.post(
+                        f"{url}/ingest",
+                        content=PAYLOAD,
+                        headers={"Content-Type": "application/json"},
+                    )
+                    if r.status_code == 202:
+                        latencies.append(time.perf_counter() - start)
+                    else:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+
+        await asyncio.gather(*(loop() for _ in range(concurrency)))
+
+    return latencies, errors
+
+
+def client_process(args):
+    url, duration, concurrency = args
+    return asyncio.run(drive(url, duration, concurrency))
+
+
+def wait_until_healthy(url: str, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not become healthy")
+
+
+def run_for_workers(workers: int, args) -> dict:
+    url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.join(HERE, "serve.py"),
+            "--app",
+            "run_local:app",
+            "--workers",
+            str(workers),
+            "--port",
+            str(args.port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=HERE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_healthy(url)
+        jobs = [(url, args.duration, args.concurrency)] * args.clients
+        with multiprocessing.Pool(args.clients) as pool:
+            results = pool.map(client_process, jobs)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    latencies = sorted(latency for result in results for latency in result[0])
+    errors = sum(result[1] for result in results)
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / args.duration,
+        "p50_ms": median(latencies) * 1000 if latencies else 0.0,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=4, help="Client processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="Per client")
+    parser.add_argument("--port", type=int, default=8090)
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("⚙️  API WORKER SCALING BENCHMARK")
+    print("=" * 70)
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8} {'p50 ms':>8} {'p99 ms':>8}")
+
+    baseline = None
+    for workers in args.workers:
+        result = run_for_workers(workers, args)
+        baseline = baseline or result["rps"] or 1.0
+        print(
+            f"{result['workers']:>8} {result['rps']:>10.1f} "
+            f"{result['rps'] / baseline:>7.2f}x "
+            f"{result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f}"
+            + (f"  ({result['errors']} errors)" if result["errors"] else "")
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -26,3 +26,12 @@ def mock_gcp_publisher():
 
         mock_class.return_value = mock_publisher
         yield mock_publisher
+
+
+@pytest.fixture(scope="session", autouse=True)
+def mock_gcp_firestore():
+    """Mock Firestore Client for all tests"""
+    with patch("google.cloud.firestore.Client") as mock_class:
+        mock_db = MagicMock()
+        mock_class.return_value = mock_db
+        yield mock_db
@@ -0,0 +1,170 @@
+"""
+Ingest-side content deduplication
+A rotating Bloom filter remembers content hashes for a time window in
+bounded memory; a small LRU maps recent hashes back to their original log_id
+
+The window is split into `generations` slices, each with its own filter.
+Every slice the oldest filter is dropped and a fresh one started, so a hash
+is remembered for at least window_seconds and at most one slice longer.
+Lookups check every live filter; inserts go to the newest one
+"""
+
+import hashlib
+import json
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Optional, Tuple
+
+
+def content_key(
+    tenant_id: str, source: str, text: str, fields: Optional[dict] = None
+) -> bytes:
+    """128-bit hash of what would be published for a payload"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (tenant_id, source, text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    if fields:
+        digest.update(json.dumps(fields, sort_keys=True, default=str).encode("utf-8"))
+    return digest.digest()
+
+
+class RotatingBloomFilter:
+    """Time-windowed Bloom filter over 128-bit keys (see module docstring)"""
+
+    def __init__(
+        self,
+        window_seconds: float,
+        expected_items: int,
+        false_positive_rate: float,
+        generations: int = 4,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if not 0 < false_positive_rate < 1:
+            raise ValueError("false_positive_rate must be between 0 and 1")
+        self.window_seconds = window_seconds
+        self.false_positive_rate = false_positive_rate
+        self.slice_seconds = window_seconds / generations
+        self._clock = clock
+        # Each live filter holds one slice of the window; a lookup can hit any
+        # of generations + 1 filters, so each gets a share of the target rate
+        self.slice_items = max(1, math.ceil(expected_items / generations))
+        rate = false_positive_rate / (generations + 1)
+        bits = math.ceil(-self.slice_items * math.log(rate) / math.log(2) ** 2)
+        self.bits = (bits + 7) // 8 * 8
+        self.hashes = max(1, round(self.bits / self.slice_items * math.log(2)))
+        self._filters = deque([bytearray(self.bits // 8)], maxlen=generations + 1)
+        self._counts = deque([0], maxlen=generations + 1)
+        self._rotated_at = clock()
+
+    def _rotate(self):
+        elapsed = self._clock() - self._rotated_at
+        if elapsed < self.slice_seconds:
+            return
+        steps = int(elapsed // self.slice_seconds)
+        for _ in range(min(steps, self._filters.maxlen)):
+            self._filters.append(bytearray(self.bits // 8))
+            self._counts.append(0)
+        self._rotated_at += steps * self.slice_seconds
+
+    def _positions(self, key: bytes):
+        # Double hashing: k positions from the two 64-bit halves of the key
+        h1 = int.from_bytes(key[:8], "little")
+        h2 = int.from_bytes(key[8:16], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def __contains__(self, key: bytes) -> bool:
+        self._rotate()
+        positions = self._positions(key)
+        return any(
+            all(bits[p >> 3] & (1 << (p & 7)) for p in positions)
+            for bits in self._filters
+        )
+
+    def add(self, key: bytes):
+        self._rotate()
+        bits = self._filters[-1]
+        for p in self._positions(key):
+            bits[p >> 3] |= 1 << (p & 7)
+        self._counts[-1] += 1
+
+    def estimated_false_positive_rate(self) -> float:
+        """Current chance that an unseen key is reported as seen"""
+        self._rotate()
+        miss = 1.0
+        for count in self._counts:
+            fill = 1 - math.exp(-self.hashes * count / self.bits)
+            miss *= 1 - fill**self.hashes
+        return 1 - miss
+
+    def stats(self) -> dict:
+        return {
+            "window_seconds": self.window_seconds,
+            "generations": len(self._filters),
+            "items": list(self._counts),
+            "bits_per_generation": self.bits,
+            "hashes": self.hashes,
+            "memory_bytes": sum(len(bits) for bits in self._filters),
+            "target_false_positive_rate": self.false_positive_rate,
+            "estimated_false_positive_rate": round(
+                self.estimated_false_positive_rate(), 8
+            ),
+        }
+
+
+class DedupWindow:
+    """
+    Content dedup for /ingest: a RotatingBloomFilter plus an LRU of original
+    log_ids. A duplicate whose original has left the LRU reports log_id None
+    """
+
+    def __init__(
+        self,
+        window_seconds: float,
+        expected_items: int,
+        false_positive_rate: float,
+        generations: int = 4,
+        id_cache_size: int = 100_000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.filter = RotatingBloomFilter(
+            window_seconds, expected_items, false_positive_rate, generations, clock
+        )
+        self.id_cache_size = id_cache_size
+        self._log_ids = OrderedDict()
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.duplicates = 0
+
+    def check(self, key: bytes) -> Tuple[bool, Optional[str]]:
+        """(is_duplicate, original log_id if still known)"""
+        with self._lock:
+            self.checks += 1
+            if key not in self.filter:
+                return False, None
+            self.duplicates += 1
+            return True, self._log_ids.get(key)
+
+    def remember(self, key: bytes, log_id: str):
+        """Record a payload once it has been queued"""
+        with self._lock:
+            self.filter.add(key)
+            if self.id_cache_size <= 0:
+                return
+            self._log_ids[key] = log_id
+            self._log_ids.move_to_end(key)
+            while len(self._log_ids) > self.id_cache_size:
+                self._log_ids.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": True,
+                "checks": self.checks,
+                "duplicates": self.duplicates,
+                "id_cache_entries": len(self._log_ids),
+                "id_cache_max_entries": self.id_cache_size,
+                **self.filter.stats(),
+            }
@@ -0,0 +1,220 @@
+"""
+On-demand profiling hooks
+- Sampling CPU profiler: 1-in-N requests/messages are traced by a
+  background thread that samples their stacks every interval
+- Allocation tracing: tracemalloc snapshots grouped by traceback
+Both render to collapsed-stack ("folded") text, the input format of
+flamegraph.pl and speedscope
+
+This module is kept identical in api/ and worker/ (separate build contexts)
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+TRUNCATED_STACK = "[truncated]"
+
+
+class SamplingProfiler:
+    """
+    Stack-sampling profiler for selected units of work
+
+    sample_rate N traces every Nth unit (0 disables). While at least one
+    traced unit is running, a daemon thread records the stack of each
+    thread running one every `interval` seconds
+    """
+
+    def __init__(
+        self, sample_rate: int = 0, interval: float = 0.005, max_stacks: int = 20000
+    ):
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.stacks = Counter()
+        self.samples = 0
+        self.traced_units = 0
+        self._seen = 0
+        self._active = Counter()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def configure(self, sample_rate: int = None, interval: float = None):
+        if sample_rate is not None:
+            self.sample_rate = max(0, sample_rate)
+        if interval is not None:
+            self.interval = interval
+
+    def reset(self):
+        with self._lock:
+            self.stacks.clear()
+            self.samples = 0
+            self.traced_units = 0
+
+    # ---- unit-of-work hooks ----------------------------------------------
+
+    def should_sample(self) -> bool:
+        """Cheap 1-in-N decision; always False when disabled"""
+        rate = self.sample_rate
+        if not rate:
+            return False
+        with self._lock:
+            self._seen += 1
+            return self._seen % rate == 0
+
+    def begin(self) -> int:
+        """Start tracing the calling thread; returns a token for end()"""
+        ident = threading.get_ident()
+        with self._lock:
+            self._active[ident] += 1
+            self.traced_units += 1
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="sampling-profiler", daemon=True
+                )
+                self._thread.start()
+        self._wake.set()
+        return ident
+
+    def end(self, ident: int):
+        with self._lock:
+            self._active[ident] -= 1
+            if self._active[ident] <= 0:
+                del self._active[ident]
+
+    @contextmanager
+    def profile(self):
+        """Trace the enclosed block if it is selected by the sample rate"""
+        if not self.should_sample():
+            yield
+            return
+        ident = self.begin()
+        try:
+            yield
+        finally:
+            self.end(ident)
+
+    # ---- sampler thread ----------------------------------------------------
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                idents = list(self._active)
+                if not idents:
+                    self._wake.clear()
+                    continue
+            frames = sys._current_frames()
+            stacks = [self._stack(frames[i]) for i in idents if i in frames]
+            with self._lock:
+                for stack in stacks:
+                    if stack not in self.stacks and len(self.stacks) >= self.max_stacks:
+                        stack = TRUNCATED_STACK
+                    self.stacks[stack] += 1
+                    self.samples += 1
+
+    @staticmethod
+    def _stack(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            filename = os.path.basename(code.co_filename)
+            names.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    # ---- reporting -------------------------------------------------------
+
+    def folded(self) -> str:
+        """Collapsed stacks: 'root;child;leaf <samples>' per line"""
+        with self._lock:
+            items = self.stacks.most_common()
+        return "\n".join(f"{stack} {count}" for stack, count in items) + "\n"
+
+    def function_stats(self, limit: int = 50) -> list:
+        """Per-function self/total time estimated from sample counts"""
+        self_counts, total_counts = Counter(), Counter()
+        with self._lock:
+            items = list(self.stacks.items())
+        for stack, count in items:
+            frames = stack.split(";")
+            self_counts[frames[-1]] += count
+            for name in set(frames):
+                total_counts[name] += count
+        return [
+            {
+                "function": name,
+                "self_seconds": round(self_counts[name] * self.interval, 4),
+                "total_seconds": round(total * self.interval, 4),
+                "samples": total,
+            }
+            for name, total in total_counts.most_common(limit)
+        ]
+
+    def status(self) -> dict:
+        return {
+            "sample_rate": self.sample_rate,
+            "interval_seconds": self.interval,
+            "traced_units": self.traced_units,
+            "samples": self.samples,
+            "distinct_stacks": len(self.stacks),
+            "allocation_tracing": tracemalloc.is_tracing(),
+        }
+
+
+# ---- allocation tracing ----------------------------------------------------
+
+
+def start_allocation_tracing(frames: int = 25):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def stop_allocation_tracing():
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def allocations_folded(limit: int = 500) -> str:
+    """
+    Live allocations grouped by traceback as 'oldest;...;newest <bytes>'
+    Requires allocation tracing to be running
+    """
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("Allocation tracing is not running")
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        )
+    )
+    lines = []
+    for stat in snapshot.statistics("traceback")[:limit]:
+        stack = ";".join(
+            f"{os.path.basename(frame.filename)}:{frame.lineno}"
+            for frame in stat.traceback
+        )
+        lines.append(f"{stack} {stat.size}")
+    return "\n".join(lines) + "\n"
+
+
+def profiler_from_env() -> SamplingProfiler:
+    """
+    PROFILE_SAMPLE_RATE: trace 1-in-N units (0 = off)
+    PROFILE_INTERVAL_MS: stack sampling interval
+    TRACEMALLOC_FRAMES: start allocation tracing with N frames (0 = off)
+    """
+    profiler = SamplingProfiler(
+        sample_rate=int(os.getenv("PROFILE_SAMPLE_RATE", 0)),
+        interval=float(os.getenv("PROFILE_INTERVAL_MS", 5)) / 1000,
+    )
+    frames = int(os.getenv("TRACEMALLOC_FRAMES", 0))
+    if frames:
+        start_allocation_tracing(frames)
+    return profiler
@@ -1,54 +1,682 @@
 """
 FastAPI Ingestion Gateway
 Handles JSON and TXT payloads, publishes to Pub/Sub
+Serves paginated reads of processed logs from Firestore
 """
 
+import base64
+import binascii
+import hmac
 import json
 import logging
 import os
+import threading
+import time
 import uuid
-from datetime import datetime
-from typing import Optional
+import zlib
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
 
-from fastapi import FastAPI, Header, HTTPException, Request
-from fastapi.responses import JSONResponse
-from google.cloud import pubsub_v1
+import admission
+import archive
+import dedup
+import diagnostics
+import faults
+import grpc
+import normalization
+import sharding
+import structured_logging
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from google.cloud import firestore, pubsub_v1
+from google.cloud.firestore_v1.field_path import FieldPath
+from spool import WriteAheadSpool, claim_spool_directory
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+try:
+    import zstandard
+except ImportError:  # zstd bodies are rejected with 415 when unavailable
+    zstandard = None
 
-app = FastAPI(title="Data Processor API")
+# Configure logging (JSON, queue-based; see structured_logging.py)
+structured_logging.configure_logging()
+logger = logging.getLogger(__name__)
 
 # GCP Configuration
 PROJECT_ID = os.getenv("GCP_PROJECT_ID")
 TOPIC_ID = os.getenv("PUBSUB_TOPIC_ID", "data-ingestion")
 
+# Write-ahead spool configuration (disabled unless SPOOL_DIR is set)
+SPOOL_DIR = os.getenv("SPOOL_DIR")
+SPOOL_SEGMENT_MAX_BYTES = int(os.getenv("SPOOL_SEGMENT_MAX_BYTES", 64 * 1024 * 1024))
+SPOOL_FSYNC = os.getenv("SPOOL_FSYNC", "false").lower() == "true"
+SPOOL_REPLAY_INTERVAL_SECONDS = float(os.getenv("SPOOL_REPLAY_INTERVAL_SECONDS", 5))
+SPOOL_REPLAY_BATCH_SIZE = int(os.getenv("SPOOL_REPLAY_BATCH_SIZE", 100))
+
+# How long ingest waits for Pub/Sub to confirm a publish
+# With the spool enabled, unconfirmed publishes are spooled after a short budget
+PUBLISH_TIMEOUT_SECONDS = float(os.getenv("PUBLISH_TIMEOUT_SECONDS", 5))
+PUBLISH_CONFIRM_BUDGET_SECONDS = float(os.getenv("PUBLISH_CONFIRM_BUDGET_SECONDS", 0.5))
+# How long each server process waits at startup for its Pub/Sub channel
+PUBLISHER_WARMUP_TIMEOUT_SECONDS = float(
+    os.getenv("PUBLISHER_WARMUP_TIMEOUT_SECONDS", 5)
+)
+
+# Per-tenant ordered delivery (opt-in)
+# ORDERING_MODE: "off", "tenant" (key = tenant_id) or "tenant_stream"
+# (key = tenant_id:stream, stream from JSON "stream" / X-Stream-ID header)
+ORDERING_MODE = os.getenv("ORDERING_MODE", "off").lower()
+# Comma-separated tenant ids that get ordering, or "*" for all tenants
+ORDERED_TENANTS = {
+    t.strip() for t in os.getenv("ORDERED_TENANTS", "*").split(",") if t.strip()
+}
+
+# Per-tenant JSON normalization rules (see normalization.py), compiled once
+# NORMALIZATION_RULES (inline JSON) overrides NORMALIZATION_RULES_FILE per tenant
+normalization_rules = normalization.load_rules(
+    os.getenv("NORMALIZATION_RULES"), os.getenv("NORMALIZATION_RULES_FILE")
+)
+
+# Ingest-side content dedup (off unless DEDUP_TENANTS is set)
+# Comma-separated tenant ids, or "*" for all tenants
+DEDUP_TENANTS = {
+    t.strip() for t in os.getenv("DEDUP_TENANTS", "").split(",") if t.strip()
+}
+DEDUP_WINDOW_SECONDS = float(os.getenv("DEDUP_WINDOW_SECONDS", 300))
+DEDUP_EXPECTED_ITEMS = int(os.getenv("DEDUP_EXPECTED_ITEMS", 1_000_000))
+DEDUP_FALSE_POSITIVE_RATE = float(os.getenv("DEDUP_FALSE_POSITIVE_RATE", 0.001))
+DEDUP_GENERATIONS = int(os.getenv("DEDUP_GENERATIONS", 4))
+DEDUP_ID_CACHE_SIZE = int(os.getenv("DEDUP_ID_CACHE_SIZE", 100_000))
+# Status returned for a duplicate (202 looks like a normal accept to clients)
+DEDUP_STATUS_CODE = int(os.getenv("DEDUP_STATUS_CODE", 202))
+
+# Tenant-affinity sharding (off unless SHARD_COUNT > 0): messages carry a
+# `shard` attribute that the per-shard subscriptions filter on
+shard_ring = sharding.ring_from_env()
+
 # Initialize Pub/Sub Publisher
 # publisher = pubsub_v1.PublisherClient()
 try:
-    publisher = pubsub_v1.PublisherClient()
+    if ORDERING_MODE == "off":
+        publisher = pubsub_v1.PublisherClient()
+    else:
+        publisher = pubsub_v1.PublisherClient(
+            publisher_options=pubsub_v1.types.PublisherOptions(
+                enable_message_ordering=True
+            )
+        )
     logger.info("✓ Pub/Sub client initialized successfully")
 except Exception as e:
     logger.error(f"Failed to initialize Pub/Sub client: {e}")
     logger.error("Ensure GCP credentials are properly configured")
     raise
 
+# Fault injection for chaos runs and benchmarks (off unless FAULT_INJECTION is set)
+fault_injector = faults.injector_from_env()
+if fault_injector is not None:
+    publisher = faults.FaultyPublisher(publisher, fault_injector)
+    logger.warning("⚠️ Fault injection enabled for Pub/Sub publishes")
+
 topic_path = publisher.topic_path(PROJECT_ID, TOPIC_ID)
 
+# Initialize Firestore (read path for processed logs)
+db = firestore.Client(project=PROJECT_ID)
+
+# Compressed request bodies (Content-Encoding) are capped after decompression
+MAX_DECOMPRESSED_BODY_BYTES = int(
+    os.getenv("MAX_DECOMPRESSED_BODY_BYTES", 10 * 1024 * 1024)
+)
+DECOMPRESS_WRITE_SIZE = 64 * 1024
+
+# /ingest pre-validation (see admission.py): body limits count bytes on the
+# wire and are checked against Content-Length before the body is read
+# TENANT_MAX_BODY_BYTES (inline JSON, "*" for the rest) can only lower MAX_BODY_BYTES
+MAX_BODY_BYTES = int(os.getenv("MAX_BODY_BYTES", 10 * 1024 * 1024))
+body_limits = admission.load_limits(MAX_BODY_BYTES, os.getenv("TENANT_MAX_BODY_BYTES"))
+
+# Log query configuration
+LOGS_DEFAULT_PAGE_SIZE = int(os.getenv("LOGS_DEFAULT_PAGE_SIZE", 50))
+LOGS_MAX_PAGE_SIZE = int(os.getenv("LOGS_MAX_PAGE_SIZE", 500))
+LOG_CACHE_MAX_ENTRIES = int(os.getenv("LOG_CACHE_MAX_ENTRIES", 10000))
+LOG_CACHE_TTL_SECONDS = float(os.getenv("LOG_CACHE_TTL_SECONDS", 60))
+
+# Fields written by the worker to tenants/{tenant_id}/processed_logs/{log_id}
+LOG_DOCUMENT_FIELDS = (
+    "source",
+    "original_text",
+    "modified_data",
+    "ingested_at",
+    "processed_at",
+    "character_count",
+    "processing_time_seconds",
+    "delivery_attempt(s)",
+    "fields",
+    "chunked",
+    "chunk_count",
+)
+# Stored in processed_logs/{log_id}/chunks/* when the parent has chunked: true
+CHUNKED_TEXT_FIELDS = ("original_text", "modified_data")
+
+# Per-tenant totals maintained by the worker in sharded counter documents
+AGGREGATE_FIELDS = ("messages", "characters", "redactions", "delivery_attempts")
+
+
+class TTLCache:
+    """
+    Bounded, thread-safe LRU cache with per-entry expiry
+    Used as a read-through cache for single log lookups
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return cached value or None if missing/expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        """Insert value, evicting the least recently used entry when full"""
+        if self.max_entries <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """Drop a single entry"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+log_cache = TTLCache(LOG_CACHE_MAX_ENTRIES, LOG_CACHE_TTL_SECONDS)
+
+# One filter per process: duplicates are caught when they reach the same process
+dedup_window = None
+if DEDUP_TENANTS:
+    dedup_window = dedup.DedupWindow(
+        DEDUP_WINDOW_SECONDS,
+        DEDUP_EXPECTED_ITEMS,
+        DEDUP_FALSE_POSITIVE_RATE,
+        DEDUP_GENERATIONS,
+        DEDUP_ID_CACHE_SIZE,
+    )
+
+spool = None
+if SPOOL_DIR:
+    # One spool per worker process (see serve.py)
+    spool_directory, spool_lock = claim_spool_directory(SPOOL_DIR)
+    spool = WriteAheadSpool(spool_directory, SPOOL_SEGMENT_MAX_BYTES, SPOOL_FSYNC)
+
+
+def publish_spooled_batch(records: list):
+    """
+    Republish a batch of spooled records and wait for every confirmation
+    Raises on the first failure so the spool keeps its checkpoint
+    """
+    futures = [
+        publisher.publish(
+            topic_path, record["data"].encode("utf-8"), **record["attributes"]
+        )
+        for record in records
+    ]
+    for future in futures:
+        future.result(timeout=PUBLISH_TIMEOUT_SECONDS)
+
+
+def run_spool_replayer(stop: threading.Event):
+    """Background loop draining the spool to Pub/Sub"""
+    while not stop.wait(SPOOL_REPLAY_INTERVAL_SECONDS):
+        try:
+            replayed = spool.replay(publish_spooled_batch, SPOOL_REPLAY_BATCH_SIZE)
+            if replayed:
+                logger.info(f"Replayed {replayed} spooled messages to Pub/Sub")
+        except Exception as e:
+            logger.error(f"Spool replay failed, will retry: {e}")
+
+
+def warm_publisher():
+    """
+    Open the publisher's gRPC channel before serving traffic so the first
+    requests in each worker process don't pay for connection setup
+    """
+    try:
+        channel = publisher.transport.grpc_channel
+        grpc.channel_ready_future(channel).result(
+            timeout=PUBLISHER_WARMUP_TIMEOUT_SECONDS
+        )
+        logger.info(f"Pub/Sub channel ready (pid {os.getpid()})")
+    except Exception as e:
+        logger.warning(f"Pub/Sub channel warm-up skipped: {e!r}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start/stop background tasks"""
+    warm_publisher()
+    stop = threading.Event()
+    if spool is not None:
+        replayer = threading.Thread(
+            target=run_spool_replayer, args=(stop,), daemon=True
+        )
+        replayer.start()
+        logger.info(f"Write-ahead spool enabled at {SPOOL_DIR}")
+    yield
+    stop.set()
+    if spool is not None:
+        spool.close()
+
+
+app = FastAPI(title="Data Processor API", lifespan=lifespan)
+
+# Admin endpoints (profiling) are disabled unless ADMIN_TOKEN is set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+profiler = diagnostics.profiler_from_env()
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware tracing 1-in-N requests with the sampling profiler
+    Requests share the event loop thread, so samples taken while a traced
+    request is in flight may include work for concurrent requests
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiler.should_sample():
+            return await self.app(scope, receive, send)
+        ident = profiler.begin()
+        try:
+            return await self.app(scope, receive, send)
+        finally:
+            profiler.end(ident)
+
+
+app.add_middleware(ProfilingMiddleware)
+
+
+def require_admin(x_admin_token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+class DecompressedSizeExceeded(Exception):
+    """Raised when a compressed body inflates past the configured limit"""
+
+
+class BoundedSink:
+    """
+    Collects decompressed output, failing as soon as it exceeds max_bytes
+    observer (if set) sees each piece of output as it is written
+    """
+
+    def __init__(self, max_bytes: int, observer=None):
+        self.max_bytes = max_bytes
+        self.observer = observer
+        self.size = 0
+        self.parts = []
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise DecompressedSizeExceeded()
+        if self.observer is not None and data:
+            self.observer(data)
+        self.parts.append(data)
+        return len(data)
+
+    def getvalue(self) -> bytes:
+        return b"".join(self.parts)
+
+
+class ZlibStreamDecoder:
+    """Incremental gzip/deflate decoder writing into a BoundedSink"""
+
+    def __init__(self, encoding: str, sink: BoundedSink):
+        self.encoding = encoding
+        self.sink = sink
+        self._decompressor = None
+
+    def _create(self, first_chunk: bytes):
+        if self.encoding == "gzip":
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        # "deflate" should be zlib-wrapped (RFC 9110), but accept raw deflate
+        is_zlib = (
+            len(first_chunk) >= 2
+            and first_chunk[0] & 0x0F == 8
+            and (first_chunk[0] << 8 | first_chunk[1]) % 31 == 0
+        )
+        return zlib.decompressobj(zlib.MAX_WBITS if is_zlib else -zlib.MAX_WBITS)
+
+    def write(self, chunk: bytes):
+        if self._decompressor is None:
+            self._decompressor = self._create(chunk)
+        data = chunk
+        # max_length bounds each step so a bomb never materializes in memory
+        while data:
+            self.sink.write(self._decompressor.decompress(data, DECOMPRESS_WRITE_SIZE))
+            data = self._decompressor.unconsumed_tail
+
+    def close(self):
+        if self._decompressor is None:
+            return
+        self.sink.write(self._decompressor.flush())
+        if not self._decompressor.eof:
+            raise zlib.error("truncated compressed body")
+
+
+# A zstd RLE block turns 4 input bytes into 128KiB, and decompressobj() has no
+# output cap, so input is fed in slices sized to the sink's remaining budget
+ZSTD_MAX_RATIO = 32 * 1024
+ZSTD_MIN_INPUT_STEP = 16
+
+
+class ZstdStreamDecoder:
+    """Incremental zstd decoder writing into a BoundedSink"""
+
+    def __init__(self, sink: BoundedSink):
+        self.sink = sink
+        self._started = False
+        self._decompressor = zstandard.ZstdDecompressor().decompressobj(
+            write_size=DECOMPRESS_WRITE_SIZE
+        )
+
+    def write(self, chunk: bytes):
+        self._started = self._started or bool(chunk)
+        pos = 0
+        # Data after the end of the frame is ignored, as for gzip
+        while pos < len(chunk) and not self._decompressor.eof:
+            budget = self.sink.max_bytes - self.sink.size
+            step = max(ZSTD_MIN_INPUT_STEP, budget // ZSTD_MAX_RATIO)
+            self.sink.write(self._decompressor.decompress(chunk[pos : pos + step]))
+            pos += step
+
+    def close(self):
+        if self._started and not self._decompressor.eof:
+            raise zstandard.ZstdError("truncated compressed body")
+
+
+# Running totals per Content-Encoding, reported by /metrics
+compression_stats = {}
+
+
+def record_compression(encoding: str, compressed: int, decompressed: int):
+    stats = compression_stats.setdefault(
+        encoding, {"requests": 0, "compressed_bytes": 0, "decompressed_bytes": 0}
+    )
+    stats["requests"] += 1
+    stats["compressed_bytes"] += compressed
+    stats["decompressed_bytes"] += decompressed
+
+
+def compression_metrics() -> dict:
+    return {
+        encoding: {
+            **stats,
+            "ratio": round(
+                stats["decompressed_bytes"] / max(stats["compressed_bytes"], 1), 3
+            ),
+        }
+        for encoding, stats in compression_stats.items()
+    }
+
+
+# /ingest rejections by reason, reported by /metrics
+admission_stats = {"rejected": {}, "rejected_before_body": 0, "bytes_read": 0}
+
+
+def reject(status_code: int, reason: str, detail: str, bytes_read: int = 0):
+    """Count a pre-validation rejection; returns the HTTPException to raise"""
+    rejected = admission_stats["rejected"]
+    rejected[reason] = rejected.get(reason, 0) + 1
+    if bytes_read == 0:
+        admission_stats["rejected_before_body"] += 1
+    admission_stats["bytes_read"] += bytes_read
+    return HTTPException(status_code=status_code, detail=detail)
+
+
+class IngestGuard:
+    """
+    Body checks for one /ingest request while it streams in: wire bytes
+    against the tenant's limit (the global one until the tenant is known)
+    and, for JSON, the incremental tenant_id scan
+    """
+
+    def __init__(
+        self,
+        tenant_id: Optional[str] = None,
+        declared: Optional[int] = None,
+        scanner: Optional[admission.TenantIdScanner] = None,
+    ):
+        self.tenant_id = tenant_id
+        self.declared = declared
+        self.scanner = scanner
+        self.received = 0
+        self.limit = body_limits.limit_for(tenant_id)
+
+    def check_declared(self):
+        if self.declared is not None and self.declared > self.limit:
+            raise reject(
+                413,
+                "too_large",
+                f"Request body exceeds {self.limit} bytes",
+                self.received,
+            )
+
+    def on_wire(self, size: int):
+        self.received += size
+        if self.received > self.limit:
+            raise reject(
+                413,
+                "too_large",
+                f"Request body exceeds {self.limit} bytes",
+                self.received,
+            )
+
+    def on_data(self, data: bytes):
+        if self.scanner is None or self.scanner.state != admission.PENDING:
+            return
+        self.scanner.feed(data)
+        state = self.scanner.state
+        if state == admission.FOUND:
+            if not admission.valid_tenant_id(self.scanner.tenant_id):
+                detail = (
+                    "Invalid tenant_id"
+                    if self.scanner.tenant_id
+                    else "tenant_id required in JSON payload"
+                )
+                raise reject(400, "tenant_id", detail, self.received)
+            # Now the tenant's own limit applies
+            self.tenant_id = self.scanner.tenant_id
+            self.limit = body_limits.limit_for(self.tenant_id)
+            self.check_declared()
+            self.on_wire(0)
+        elif state in (admission.MISSING, admission.INVALID):
+            raise reject(
+                400, "tenant_id", "tenant_id required in JSON payload", self.received
+            )
+        elif state == admission.MALFORMED:
+            raise reject(400, "malformed_json", "Invalid JSON payload", self.received)
+
+
+def prevalidate_ingest(
+    request: Request, content_type_header: str, x_tenant_id: Optional[str]
+) -> Tuple[str, IngestGuard]:
+    """
+    Checks that need no body bytes: content type, Content-Length against the
+    body limits and, for text/plain, the X-Tenant-ID header
+    Returns ("json" or "text", the guard to read the body with)
+    """
+    content_type_header = content_type_header.lower()
+    if "application/json" in content_type_header:
+        kind = "json"
+    elif "text/plain" in content_type_header:
+        kind = "text"
+    else:
+        raise reject(
+            415,
+            "content_type",
+            "Unsupported content type. Use application/json or text/plain",
+        )
+
+    try:
+        declared = admission.parse_content_length(request.headers.get("content-length"))
+    except ValueError:
+        raise reject(400, "content_length", "Invalid Content-Length header")
+
+    if kind == "json":
+        guard = IngestGuard(declared=declared, scanner=admission.TenantIdScanner())
+    elif not x_tenant_id:
+        raise reject(400, "tenant_header", "X-Tenant-ID header required for text/plain")
+    elif not admission.valid_tenant_id(x_tenant_id):
+        raise reject(400, "tenant_header", "Invalid X-Tenant-ID header")
+    else:
+        guard = IngestGuard(x_tenant_id, declared)
+    guard.check_declared()
+    return kind, guard
+
 
-def normalize_to_internal_format(data: dict) -> str:
+async def read_request_body(
+    request: Request, guard: Optional[IngestGuard] = None
+) -> bytes:
+    """
+    Read the request body, decompressing gzip/deflate/zstd as it streams in
+    Raises HTTPException 415 for unsupported encodings, 413 when the
+    decompressed size exceeds MAX_DECOMPRESSED_BODY_BYTES, 400 on bad data
+    A guard sees wire chunks and decoded data as they arrive, and may stop
+    the read early
+    """
+    encoding = request.headers.get("content-encoding", "identity").strip().lower()
+    if encoding in ("", "identity"):
+        if guard is None:
+            return await request.body()
+        parts = []
+        async for chunk in request.stream():
+            guard.on_wire(len(chunk))
+            guard.on_data(chunk)
+            parts.append(chunk)
+        return b"".join(parts)
+
+    sink = BoundedSink(
+        MAX_DECOMPRESSED_BODY_BYTES, guard.on_data if guard is not None else None
+    )
+    if encoding in ("gzip", "x-gzip", "deflate"):
+        decoder = ZlibStreamDecoder(
+            "deflate" if encoding == "deflate" else "gzip", sink
+        )
+    elif encoding == "zstd" and zstandard is not None:
+        decoder = ZstdStreamDecoder(sink)
+    else:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Unsupported Content-Encoding: {encoding}",
+        )
+
+    compressed_size = 0
+    try:
+        async for chunk in request.stream():
+            compressed_size += len(chunk)
+            if guard is not None:
+                guard.on_wire(len(chunk))
+            decoder.write(chunk)
+        decoder.close()
+    except DecompressedSizeExceeded:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Decompressed body exceeds {MAX_DECOMPRESSED_BODY_BYTES} bytes",
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.warning(f"Failed to decode {encoding} body: {e}")
+        raise HTTPException(status_code=400, detail="Invalid compressed body")
+
+    record_compression(encoding, compressed_size, sink.size)
+    return sink.getvalue()
+
+
+def normalize_to_internal_format(data: dict, tenant_id: Optional[str] = None) -> str:
     """
     Normalize any input to flat text format
+    Uses the tenant's normalization rule: "text" as-is by default, otherwise
+    flattened "key.path=value" lines instead of a Python repr
     """
-    if "text" in data:
-        return data["text"]
-    return str(data)
+    return normalization.rule_for(normalization_rules, tenant_id).text(data)
 
 
-def publish_to_pubsub(tenant_id: str, log_id: str, text: str, source: str):
+def ordering_key_for(tenant_id: str, stream: Optional[str] = None) -> str:
+    """
+    Pub/Sub ordering key for a message ("" means unordered)
+    """
+    if ORDERING_MODE == "off":
+        return ""
+    if "*" not in ORDERED_TENANTS and tenant_id not in ORDERED_TENANTS:
+        return ""
+    if ORDERING_MODE == "tenant_stream" and stream:
+        return f"{tenant_id}:{stream}"
+    return tenant_id
+
+
+def dedup_key_for(
+    tenant_id: str, source: str, text: str, fields: Optional[dict] = None
+) -> Optional[bytes]:
+    """
+    Content hash to dedup on, or None when dedup is off for the tenant
+    """
+    if dedup_window is None:
+        return None
+    if "*" not in DEDUP_TENANTS and tenant_id not in DEDUP_TENANTS:
+        return None
+    return dedup.content_key(tenant_id, source, text, fields)
+
+
+def publish_to_pubsub(
+    tenant_id: str,
+    log_id: str,
+    text: str,
+    source: str,
+    ordering_key: str = "",
+    fields: Optional[dict] = None,
+):
     """
     Publish normalized message to Pub/Sub
+    Returns the message_id, or None if the message was spooled locally
+    because Pub/Sub did not confirm within PUBLISH_CONFIRM_BUDGET_SECONDS
+    Ordered messages are never spooled: replaying them later would let
+    newer messages for the same key overtake them
     """
     message_data = {
         "tenant_id": tenant_id,
@@ -57,23 +685,173 @@ def publish_to_pubsub(tenant_id: str, log_id: str, text: str, source: str):
         "source": source,
         "ingested_at": datetime.utcnow().isoformat(),
     }
+    if fields:
+        # Structured fields selected by the tenant's normalization rule
+        message_data["fields"] = fields
 
     # Serialize to JSON bytes
     message_bytes = json.dumps(message_data).encode("utf-8")
 
     # Publish with tenant_id as attribute for filtering
-    future = publisher.publish(
-        topic_path, message_bytes, tenant_id=tenant_id, source=source
-    )
+    attributes = {"tenant_id": tenant_id, "source": source}
+    if shard_ring is not None:
+        attributes[sharding.SHARD_ATTRIBUTE] = str(shard_ring.shard_for(tenant_id))
+    if ordering_key:
+        future = publisher.publish(
+            topic_path, message_bytes, ordering_key=ordering_key, **attributes
+        )
+    else:
+        future = publisher.publish(topic_path, message_bytes, **attributes)
 
     # Wait for publish to complete (with timeout)
+    use_spool = spool is not None and not ordering_key
+    timeout = PUBLISH_CONFIRM_BUDGET_SECONDS if use_spool else PUBLISH_TIMEOUT_SECONDS
     try:
-        message_id = future.result(timeout=5)
-        logger.info(f"Published message {message_id} for tenant {tenant_id}")
+        message_id = future.result(timeout=timeout)
+        structured_logging.log_event(
+            logger,
+            logging.INFO,
+            "published",
+            "Published message %s",
+            message_id,
+            tenant_id=tenant_id,
+            log_id=log_id,
+        )
         return message_id
     except Exception as e:
-        logger.error(f"Failed to publish message: {e}")
-        raise
+        if ordering_key:
+            # A failed ordered publish pauses its key until resumed; the
+            # client retries the request, which keeps the original order
+            publisher.resume_publish(topic_path, ordering_key)
+        if not use_spool:
+            logger.error(f"Failed to publish message: {e}")
+            raise
+        # The client may still deliver the original publish; replay makes
+        # this at-least-once, which the worker tolerates (writes keyed by log_id)
+        spool.append(message_bytes, attributes)
+        logger.warning(f"Publish not confirmed ({e!r}), spooled log {log_id}")
+        return None
+
+
+def processed_logs_collection(tenant_id: str):
+    """Tenant-scoped collection: tenants/{tenant_id}/processed_logs"""
+    return db.collection("tenants").document(tenant_id).collection("processed_logs")
+
+
+def archive_collection(tenant_id: str, name: str):
+    """Compacted logs: tenants/{tenant_id}/archives and archive_index"""
+    return db.collection("tenants").document(tenant_id).collection(name)
+
+
+def find_archived_log(tenant_id: str, log_id: str) -> Optional[dict]:
+    """
+    Look up a log compacted into an archive segment (worker/compaction.py):
+    the index entry is read on its own, then the segment is decoded
+    """
+    entry = FieldPath("entries", log_id).to_api_repr()
+    bucket = (
+        archive_collection(tenant_id, archive.INDEX_COLLECTION)
+        .document(archive.index_bucket(log_id))
+        .get(field_paths=[entry])
+    )
+    if not bucket.exists:
+        return None
+    segment_id = ((bucket.to_dict() or {}).get("entries") or {}).get(log_id)
+    if segment_id is None:
+        return None
+    segment = (
+        archive_collection(tenant_id, archive.ARCHIVES_COLLECTION)
+        .document(segment_id)
+        .get()
+    )
+    if not segment.exists:
+        return None
+    record = archive.find_record(segment.get("data"), log_id)
+    if record is not None:
+        record["archive_segment"] = segment_id
+    return record
+
+
+def resolve_projection(
+    fields: Optional[str], exclude: Optional[str]
+) -> Optional[List[str]]:
+    """
+    Turn comma-separated include/exclude lists into a field projection
+    Returns None when the full document should be returned
+    """
+    if fields:
+        selected = [f.strip() for f in fields.split(",") if f.strip()]
+    elif exclude:
+        excluded = {f.strip() for f in exclude.split(",") if f.strip()}
+        selected = [f for f in LOG_DOCUMENT_FIELDS if f not in excluded]
+    else:
+        return None
+
+    if not selected:
+        raise HTTPException(status_code=400, detail="Projection selects no fields")
+    # "." or "a..b" would fail later in to_field_paths
+    if any(not part for f in selected for part in f.split(".")):
+        raise HTTPException(status_code=400, detail="Invalid field path")
+    return selected
+
+
+def to_field_paths(fields: List[str]) -> List[str]:
+    """Quote field names (e.g. 'delivery_attempt(s)') as Firestore field paths"""
+    return [FieldPath(*f.split(".")).to_api_repr() for f in fields]
+
+
+def project_document(data: dict, fields: Optional[List[str]]) -> dict:
+    """Apply a top-level projection to an already fetched document"""
+    if fields is None:
+        return dict(data)
+    return {f: data[f] for f in fields if f in data}
+
+
+def read_chunked_text(tenant_id: str, log_id: str, fields: List[str]) -> dict:
+    """Rebuild text fields of a chunked log from its chunks, in index order"""
+    parts = {f: [] for f in fields}
+    chunks = (
+        processed_logs_collection(tenant_id)
+        .document(log_id)
+        .collection("chunks")
+        .order_by("index")
+        .select(fields)
+    )
+    for snapshot in chunks.stream():
+        chunk = snapshot.to_dict() or {}
+        for f in fields:
+            parts[f].append(chunk.get(f, ""))
+    return {f: "".join(values) for f, values in parts.items()}
+
+
+def normalize_timestamp(value: Optional[str], name: str) -> Optional[str]:
+    """
+    Parse an ISO-8601 filter bound and render it like the worker's
+    processed_at (naive UTC isoformat) so string comparison is correct
+    """
+    if value is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} timestamp")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.isoformat()
+
+
+def encode_cursor(processed_at: str, log_id: str) -> str:
+    """Opaque pagination cursor: last (processed_at, log_id) of a page"""
+    raw = json.dumps([processed_at, log_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str):
+    try:
+        processed_at, log_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return processed_at, log_id
 
 
 @app.get("/")
@@ -89,6 +867,29 @@ async def health():
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat(),
         "pubsub_topic": topic_path,
+        "log_cache": log_cache.stats(),
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Operational metrics (JSON)"""
+    return {
+        "spool": spool.stats() if spool is not None else {"enabled": False},
+        "compression": compression_metrics(),
+        "admission": admission_stats,
+        "logging": {"dropped_records": structured_logging.dropped_records()},
+        "dedup": (
+            dedup_window.stats() if dedup_window is not None else {"enabled": False}
+        ),
+        "faults": (
+            fault_injector.stats() if fault_injector is not None else {"enabled": False}
+        ),
+        "sharding": (
+            {"enabled": True, "shards": shard_ring.shards}
+            if shard_ring is not None
+            else {"enabled": False}
+        ),
     }
 
 
@@ -97,6 +898,7 @@ async def ingest(
     request: Request,
     content_type: Optional[str] = Header(None),
     x_tenant_id: Optional[str] = Header(None, alias="X-Tenant-ID"),
+    x_stream_id: Optional[str] = Header(None, alias="X-Stream-ID"),
 ):
     """
     Unified ingestion endpoint
@@ -104,69 +906,96 @@ async def ingest(
     Returns immediately (async/non-blocking)
     """
     try:
-        # Determine content type
-        content_type_header = content_type or request.headers.get("content-type", "")
+        # Reject what can be rejected before reading the body
+        kind, guard = prevalidate_ingest(
+            request,
+            content_type or request.headers.get("content-type", ""),
+            x_tenant_id,
+        )
 
         tenant_id = None
         log_id = str(uuid.uuid4())
         text = None
         source = None
+        stream = x_stream_id
+        structured_fields = None
 
         # Scenario 1: JSON payload
-        if "application/json" in content_type_header.lower():
+        if kind == "json":
             try:
-                body = await request.json()
-
-                # Extract tenant_id from payload
-                tenant_id = body.get("tenant_id")
-                if not tenant_id:
-                    raise HTTPException(
-                        status_code=400, detail="tenant_id required in JSON payload"
-                    )
-
-                # Extract or generate log_id
-                log_id = body.get("log_id", str(uuid.uuid4()))
-
-                # Normalize to internal format
-                text = normalize_to_internal_format(body)
-                source = "json_upload"
-
-            except json.JSONDecodeError:
-                raise HTTPException(status_code=400, detail="Invalid JSON payload")
-
-        # Scenario 2: Plain text payload
-        elif "text/plain" in content_type_header.lower():
-            # Extract tenant_id from header
-            tenant_id = x_tenant_id
-            if not tenant_id:
-                raise HTTPException(
-                    status_code=400, detail="X-Tenant-ID header required for text/plain"
+                # The guard has checked tenant_id by the time the body is read
+                body = json.loads(await read_request_body(request, guard))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                raise reject(
+                    400, "malformed_json", "Invalid JSON payload", guard.received
                 )
 
-            # Read raw text
-            body_bytes = await request.body()
-            text = body_bytes.decode("utf-8")
-            source = "text_upload"
+            # Extract tenant_id from payload; a duplicate key must not swap
+            # the tenant the limits were checked for
+            tenant_id = body.get("tenant_id")
+            if tenant_id != guard.tenant_id:
+                raise reject(
+                    400, "tenant_id", "Conflicting tenant_id values", guard.received
+                )
+
+            # Extract or generate log_id
+            log_id = body.get("log_id", str(uuid.uuid4()))
+            stream = body.get("stream", stream)
+
+            # Normalize to internal format
+            rule = normalization.rule_for(normalization_rules, tenant_id)
+            text = rule.text(body)
+            structured_fields = rule.structured(body)
+            source = "json_upload"
 
+        # Scenario 2: Plain text payload (tenant from the X-Tenant-ID header)
         else:
-            raise HTTPException(
-                status_code=415,
-                detail="Unsupported content type. Use application/json or text/plain",
-            )
+            tenant_id = guard.tenant_id
+
+            # Read raw text (decompressed if Content-Encoding is set)
+            body_bytes = await read_request_body(request, guard)
+            text = body_bytes.decode("utf-8")
+            source = "text_upload"
 
         # Validate required fields
         if not tenant_id or not text:
             raise HTTPException(status_code=400, detail="Missing required fields")
 
+        # Identical payloads inside the dedup window are not published again
+        dedup_key = dedup_key_for(tenant_id, source, text, structured_fields)
+        if dedup_key is not None:
+            duplicate, original_log_id = dedup_window.check(dedup_key)
+            if duplicate:
+                return JSONResponse(
+                    status_code=DEDUP_STATUS_CODE,
+                    content={
+                        "status": "duplicate",
+                        "tenant_id": tenant_id,
+                        "log_id": original_log_id,
+                        "message": "Duplicate payload; already queued for processing",
+                    },
+                )
+
         # Publish to Pub/Sub (non-blocking from API perspective)
         try:
-            message_id = publish_to_pubsub(tenant_id, log_id, text, source)
+            message_id = publish_to_pubsub(
+                tenant_id,
+                log_id,
+                text,
+                source,
+                ordering_key=ordering_key_for(tenant_id, stream),
+                fields=structured_fields,
+            )
         except Exception as e:
             logger.error(f"Pub/Sub publish failed: {e}")
             raise HTTPException(
                 status_code=500, detail="Failed to queue message for processing"
             )
 
+        # Only remembered once queued, so a failed publish can be retried
+        if dedup_key is not None:
+            dedup_window.remember(dedup_key, log_id)
+
         # Return immediately (202 Accepted)
         return JSONResponse(
             status_code=202,
@@ -175,6 +1004,7 @@ async def ingest(
                 "tenant_id": tenant_id,
                 "log_id": log_id,
                 "message_id": message_id,
+                "spooled": message_id is None,
                 "message": "Data queued for processing",
             },
         )
@@ -186,6 +1016,173 @@ async def ingest(
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+@app.get("/tenants/{tenant_id}/logs")
+def list_logs(
+    tenant_id: str,
+    limit: int = Query(LOGS_DEFAULT_PAGE_SIZE, ge=1, le=LOGS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    exclude: Optional[str] = None,
+    processed_after: Optional[str] = None,
+    processed_before: Optional[str] = None,
+):
+    """
+    List processed logs for a tenant, ordered by processed_at
+    Supports cursor pagination, field projection and time-range filters
+    """
+    projection = resolve_projection(fields, exclude)
+    start = normalize_timestamp(processed_after, "processed_after")
+    end = normalize_timestamp(processed_before, "processed_before")
+
+    query = processed_logs_collection(tenant_id)
+    if start is not None:
+        query = query.where(filter=firestore.FieldFilter("processed_at", ">=", start))
+    if end is not None:
+        query = query.where(filter=firestore.FieldFilter("processed_at", "<", end))
+    query = query.order_by("processed_at").order_by(FieldPath.document_id())
+
+    if projection is not None:
+        # processed_at is always read back so the next cursor can be built
+        selected = list(dict.fromkeys(projection + ["processed_at"]))
+        query = query.select(to_field_paths(selected))
+
+    if cursor:
+        last_processed_at, last_log_id = decode_cursor(cursor)
+        query = query.start_after(
+            {"processed_at": last_processed_at, "__name__": last_log_id}
+        )
+
+    # Read one extra document to learn whether another page exists
+    snapshots = list(query.limit(limit + 1).stream())
+    page = snapshots[:limit]
+
+    logs = []
+    for snapshot in page:
+        data = snapshot.to_dict() or {}
+        item = {"log_id": snapshot.id}
+        item.update(project_document(data, projection))
+        logs.append(item)
+
+    next_cursor = None
+    if len(snapshots) > limit and page:
+        last = page[-1].to_dict() or {}
+        next_cursor = encode_cursor(last.get("processed_at"), page[-1].id)
+
+    return {
+        "tenant_id": tenant_id,
+        "count": len(logs),
+        "logs": logs,
+        "next_cursor": next_cursor,
+    }
+
+
+@app.get("/tenants/{tenant_id}/logs/{log_id}")
+def get_log(
+    tenant_id: str,
+    log_id: str,
+    fields: Optional[str] = None,
+    exclude: Optional[str] = None,
+):
+    """
+    Fetch a single processed log, falling back to the archive once the
+    log has been compacted; chunked logs get their text rebuilt from chunks
+    Served through the read-through TTL cache; projection is applied on top
+    """
+    projection = resolve_projection(fields, exclude)
+    cache_key = (tenant_id, log_id)
+
+    data = log_cache.get(cache_key)
+    if data is None:
+        snapshot = processed_logs_collection(tenant_id).document(log_id).get()
+        if snapshot.exists:
+            data = snapshot.to_dict() or {}
+        else:
+            data = find_archived_log(tenant_id, log_id)
+            if data is None:
+                raise HTTPException(status_code=404, detail="Log not found")
+        log_cache.set(cache_key, data)
+
+    if data.get("chunked"):
+        # The cache holds the parent only; text is read from the chunks
+        text_fields = [
+            f for f in CHUNKED_TEXT_FIELDS if projection is None or f in projection
+        ]
+        if text_fields:
+            data = {**data, **read_chunked_text(tenant_id, log_id, text_fields)}
+
+    result = {"tenant_id": tenant_id, "log_id": log_id}
+    result.update(project_document(data, projection))
+    return result
+
+
+@app.get("/tenants/{tenant_id}/aggregates")
+def get_aggregates(tenant_id: str):
+    """
+    Per-tenant totals, summed over the worker's sharded counter documents
+    Reads O(shards) documents instead of scanning processed_logs
+    """
+    totals = dict.fromkeys(AGGREGATE_FIELDS, 0)
+    shard_count = 0
+
+    shards = db.collection("tenants").document(tenant_id).collection("aggregate_shards")
+    for snapshot in shards.stream():
+        data = snapshot.to_dict() or {}
+        shard_count += 1
+        for field in AGGREGATE_FIELDS:
+            totals[field] += data.get(field, 0)
+
+    return {"tenant_id": tenant_id, "shards": shard_count, "totals": totals}
+
+
+@app.get("/admin/profiling")
+def profiling_status(x_admin_token: Optional[str] = Header(None)):
+    """Profiler and allocation tracing status"""
+    require_admin(x_admin_token)
+    return profiler.status()
+
+
+@app.post("/admin/profiling")
+def configure_profiling(
+    sample_rate: Optional[int] = Query(None, ge=0),
+    tracemalloc_frames: Optional[int] = Query(None, ge=0),
+    reset: bool = False,
+    x_admin_token: Optional[str] = Header(None),
+):
+    """
+    Change the CPU sample rate (0 disables), start/stop allocation tracing
+    (tracemalloc_frames > 0 starts, 0 stops) and optionally reset samples
+    """
+    require_admin(x_admin_token)
+    profiler.configure(sample_rate=sample_rate)
+    if tracemalloc_frames is not None:
+        if tracemalloc_frames:
+            diagnostics.start_allocation_tracing(tracemalloc_frames)
+        else:
+            diagnostics.stop_allocation_tracing()
+    if reset:
+        profiler.reset()
+    return profiler.status()
+
+
+@app.get("/admin/profiling/cpu")
+def profiling_cpu(format: str = "folded", x_admin_token: Optional[str] = Header(None)):
+    """CPU samples as folded stacks (flamegraph) or per-function JSON"""
+    require_admin(x_admin_token)
+    if format == "json":
+        return {"functions": profiler.function_stats(), **profiler.status()}
+    return PlainTextResponse(profiler.folded())
+
+
+@app.get("/admin/profiling/allocations")
+def profiling_allocations(x_admin_token: Optional[str] = Header(None)):
+    """Live allocations by traceback as folded stacks (bytes)"""
+    require_admin(x_admin_token)
+    try:
+        return PlainTextResponse(diagnostics.allocations_folded())
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Global exception handler for unexpected errors"""
@@ -194,6 +1191,7 @@ async def global_exception_handler(request: Request, exc: Exception):
 
 
 if __name__ == "__main__":
+    # Single-process development server; production uses serve.py
     import uvicorn
 
     port = int(os.getenv("PORT", 8080))
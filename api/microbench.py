@@ -0,0 +1,203 @@
+"""
+Microbenchmark harness
+- Times registered callables: loop count auto-scaled to min_time, best of N
+- Saves results as a JSON baseline and compares later runs against it,
+  failing when a gated benchmark is slower than baseline * threshold
+- Times are normalized by a fixed pure-Python calibration workload, so a
+  baseline stays comparable on a slower or faster machine
+
+This module is kept identical in api/ and worker/ (separate build contexts)
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import statistics
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+BENCHMARKS: Dict[str, Callable[[], object]] = {}
+
+
+def register(name: str, fn: Callable[[], object]):
+    BENCHMARKS[name] = fn
+
+
+def _run(fn: Callable[[], object], loops: int) -> float:
+    start = time.perf_counter()
+    for _ in range(loops):
+        fn()
+    return time.perf_counter() - start
+
+
+def measure(fn: Callable[[], object], repeat: int = 5, min_time: float = 0.05):
+    """Seconds per call: best and median of `repeat` timed runs"""
+    # Scaling the loop count doubles as warm-up
+    loops = 1
+    while True:
+        elapsed = _run(fn, loops)
+        if elapsed >= min_time:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+    times = [_run(fn, loops) / loops for _ in range(repeat)]
+    return {"best": min(times), "median": statistics.median(times), "loops": loops}
+
+
+def _calibration_workload():
+    data = {str(i): i * i for i in range(2000)}
+    return sum(len(key) + value % 7 for key, value in data.items())
+
+
+def calibrate(repeat: int = 5) -> float:
+    return measure(_calibration_workload, repeat=max(repeat, 10))["best"]
+
+
+def run_benchmarks(patterns: Optional[List[str]] = None, repeat=5, min_time=0.05):
+    results = {}
+    for name, fn in BENCHMARKS.items():
+        if patterns and not any(fnmatch.fnmatch(name, p) for p in patterns):
+            continue
+        results[name] = measure(fn, repeat=repeat, min_time=min_time)
+        print(f"  {name:<40} {format_time(results[name]['best']):>10}", flush=True)
+    return results
+
+
+def format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def save_baseline(path: str, results: dict, calibration: float):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    payload = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "calibration": calibration,
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+
+
+def load_baseline(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(
+    results: dict,
+    calibration: float,
+    baseline: dict,
+    threshold: float,
+    gates: Optional[List[str]] = None,
+    normalize: bool = True,
+) -> List[str]:
+    """
+    Print current vs. baseline and return the gated benchmarks whose
+    (normalized) best time exceeds baseline * threshold
+    """
+    scale = calibration / baseline["calibration"] if normalize else 1.0
+    regressions = []
+    print(f"{'benchmark':<40} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for name, current in results.items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            print(f"{name:<40} {'-':>10} {format_time(current['best']):>10}    new")
+            continue
+        ratio = current["best"] / (previous["best"] * scale)
+        gated = not gates or any(fnmatch.fnmatch(name, p) for p in gates)
+        status = ""
+        if ratio > threshold:
+            status = "REGRESSION" if gated else "slower (not gated)"
+            if gated:
+                regressions.append(name)
+        print(
+            f"{name:<40} {format_time(previous['best']):>10} "
+            f"{format_time(current['best']):>10} {ratio:>6.2f}x {status}"
+        )
+    return regressions
+
+
+def main(title: str, default_baseline: str, argv=None) -> int:
+    parser = argparse.ArgumentParser(description=title)
+    parser.add_argument(
+        "-k", "--filter", action="append", help="Only benchmarks matching this glob"
+    )
+    parser.add_argument(
+        "--save",
+        nargs="?",
+        const=default_baseline,
+        metavar="PATH",
+        help=f"Save results as the baseline (default {default_baseline})",
+    )
+    parser.add_argument(
+        "--compare",
+        nargs="?",
+        const=default_baseline,
+        metavar="PATH",
+        help="Compare against a saved baseline and exit 1 on regression",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.5,
+        help="Fail when current > baseline * threshold (default 1.5)",
+    )
+    parser.add_argument(
+        "--gate",
+        action="append",
+        help="Glob of benchmarks that can fail the run (default: all)",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.05)
+    parser.add_argument(
+        "--no-normalize",
+        action="store_true",
+        help="Compare raw times instead of calibration-normalized ones",
+    )
+    parser.add_argument("--list", action="store_true", help="List benchmarks and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        return 0
+
+    print("=" * 70)
+    print(f"⏱️  {title.upper()}")
+    print("=" * 70)
+    calibration = calibrate(args.repeat)
+    results = run_benchmarks(args.filter, args.repeat, args.min_time)
+
+    status = 0
+    if args.compare:
+        if not os.path.exists(args.compare):
+            print(f"No baseline at {args.compare}; run with --save first")
+            return 2
+        print()
+        regressions = compare(
+            results,
+            calibration,
+            load_baseline(args.compare),
+            args.threshold,
+            args.gate,
+            normalize=not args.no_normalize,
+        )
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) past {args.threshold}x:")
+            for name in regressions:
+                print(f"   {name}")
+            status = 1
+        else:
+            print(f"\n✅ No gated benchmark regressed past {args.threshold}x")
+
+    # Saved after comparing, so --compare --save checks against the old baseline
+    if args.save:
+        save_baseline(args.save, results, calibration)
+        print(f"Saved baseline to {args.save}")
+    return status
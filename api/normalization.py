@@ -0,0 +1,210 @@
+"""
+Schema-aware normalization of JSON bodies
+Per-tenant rules choose which fields become the normalized text, how nested
+objects flatten to key paths, and which fields stay structured in the stored
+document. Each rule is compiled once into path tuples and reused per request
+
+Rules are JSON keyed by tenant_id; "*" applies to tenants without a rule:
+
+    {
+      "acme": {
+        "text_fields": ["message", "error.detail", "request.*"],
+        "structured_fields": ["severity", "user.id", "http"],
+        "exclude": ["password", "*.token"],
+        "separator": ".",
+        "max_depth": 4
+      }
+    }
+
+- text_fields: paths rendered as "path=value" lines, in rule order. Without
+  it, a string "text" field is used as-is, else every field is flattened
+- structured_fields: paths copied (nested, as in the body) into "fields"
+- exclude: paths dropped from both, including everything below them
+- "*" matches any key or list index at its level
+- Objects deeper than max_depth are rendered as compact JSON
+"""
+
+import json
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+Path = Tuple[str, ...]
+
+# Envelope keys consumed by /ingest itself, never part of the normalized text
+ENVELOPE_FIELDS = ("tenant_id", "log_id", "stream")
+RULE_KEYS = {"text_fields", "structured_fields", "exclude", "separator", "max_depth"}
+WILDCARD = "*"
+
+
+def parse_path(path: str) -> Path:
+    segments = tuple(path.split("."))
+    if not path or any(not segment for segment in segments):
+        raise ValueError(f"Invalid field path {path!r}")
+    return segments
+
+
+def _render(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+
+def _children(node: Any) -> Iterator[Tuple[str, Any]]:
+    if isinstance(node, dict):
+        return ((str(key), value) for key, value in node.items())
+    if isinstance(node, list):
+        return ((str(index), value) for index, value in enumerate(node))
+    return iter(())
+
+
+def _select(node: Any, path: Path, prefix: Path = ()) -> Iterator[Tuple[Path, Any]]:
+    """(path, value) for every node matching path (wildcards expanded)"""
+    for depth, segment in enumerate(path):
+        if segment == WILDCARD:
+            for key, child in _children(node):
+                yield from _select(child, path[depth + 1 :], prefix + (key,))
+            return
+        if isinstance(node, dict) and segment in node:
+            node = node[segment]
+        elif isinstance(node, list) and segment.isdigit() and int(segment) < len(node):
+            node = node[int(segment)]
+        else:
+            return
+        prefix += (segment,)
+    yield prefix, node
+
+
+class NormalizationRule:
+    """A tenant's compiled normalization rule"""
+
+    def __init__(
+        self,
+        text_fields: Optional[List[str]] = None,
+        structured_fields: Optional[List[str]] = None,
+        exclude: Optional[List[str]] = None,
+        separator: str = ".",
+        max_depth: int = 8,
+    ):
+        self.text_paths = [parse_path(p) for p in text_fields or []]
+        self.structured_paths = [parse_path(p) for p in structured_fields or []]
+        self.exclude_paths = [parse_path(p) for p in exclude or []]
+        self.separator = separator
+        self.max_depth = max_depth
+
+    @classmethod
+    def from_spec(cls, spec: dict) -> "NormalizationRule":
+        if not isinstance(spec, dict):
+            raise ValueError("A normalization rule must be an object")
+        unknown = set(spec) - RULE_KEYS
+        if unknown:
+            raise ValueError(f"Unknown normalization rule keys: {sorted(unknown)}")
+        for key in ("text_fields", "structured_fields", "exclude"):
+            value = spec.get(key, [])
+            if not isinstance(value, list) or not all(
+                isinstance(p, str) for p in value
+            ):
+                raise ValueError(f"{key} must be a list of field paths")
+        max_depth = spec.get("max_depth", 8)
+        if not isinstance(max_depth, int) or max_depth < 1:
+            raise ValueError("max_depth must be a positive integer")
+        return cls(
+            text_fields=spec.get("text_fields"),
+            structured_fields=spec.get("structured_fields"),
+            exclude=spec.get("exclude"),
+            separator=str(spec.get("separator", ".")),
+            max_depth=max_depth,
+        )
+
+    def _excluded(self, path: Path) -> bool:
+        for pattern in self.exclude_paths:
+            if len(pattern) <= len(path) and all(
+                p == WILDCARD or p == s for p, s in zip(pattern, path)
+            ):
+                return True
+        return False
+
+    def _flatten(self, path: Path, value: Any) -> Iterator[Tuple[Path, Any]]:
+        if self._excluded(path):
+            return
+        if isinstance(value, (dict, list)) and value and len(path) < self.max_depth:
+            for key, child in _children(value):
+                yield from self._flatten(path + (key,), child)
+        else:
+            yield path, value
+
+    def _lines(self, matches: Iterator[Tuple[Path, Any]]) -> str:
+        lines, seen = [], set()
+        for path, value in matches:
+            for leaf, leaf_value in self._flatten(path, value):
+                if leaf not in seen:
+                    seen.add(leaf)
+                    lines.append(f"{self.separator.join(leaf)}={_render(leaf_value)}")
+        return "\n".join(lines)
+
+    def text(self, body: dict) -> str:
+        """Normalized text for a JSON body"""
+        if self.text_paths:
+            return self._lines(
+                match for path in self.text_paths for match in _select(body, path)
+            )
+        if isinstance(body.get("text"), str):
+            return body["text"]
+        return self._lines(
+            ((key,), value) for key, value in body.items() if key not in ENVELOPE_FIELDS
+        )
+
+    def _prune(self, path: Path, value: Any) -> Any:
+        if isinstance(value, dict):
+            return {
+                key: self._prune(path + (key,), child)
+                for key, child in value.items()
+                if not self._excluded(path + (key,))
+            }
+        return value
+
+    def structured(self, body: dict) -> Optional[Dict[str, Any]]:
+        """Nested dict of the structured fields present in body, or None"""
+        fields: Dict[str, Any] = {}
+        for path in self.structured_paths:
+            for matched, value in _select(body, path):
+                if self._excluded(matched):
+                    continue
+                target = fields
+                for segment in matched[:-1]:
+                    target = target.setdefault(segment, {})
+                target[matched[-1]] = self._prune(matched, value)
+        return fields or None
+
+
+DEFAULT_RULE = NormalizationRule()
+
+
+def compile_rules(spec: dict) -> Dict[str, NormalizationRule]:
+    """{tenant_id: spec} -> {tenant_id: NormalizationRule}; raises ValueError"""
+    if not isinstance(spec, dict):
+        raise ValueError("Normalization rules must be an object keyed by tenant_id")
+    compiled = {}
+    for tenant_id, rule_spec in spec.items():
+        try:
+            compiled[tenant_id] = NormalizationRule.from_spec(rule_spec)
+        except ValueError as e:
+            raise ValueError(f"Normalization rule for {tenant_id!r}: {e}") from e
+    return compiled
+
+
+def load_rules(
+    inline: Optional[str] = None, path: Optional[str] = None
+) -> Dict[str, NormalizationRule]:
+    """Compile rules from a JSON file and/or inline JSON (inline wins per tenant)"""
+    spec = {}
+    if path:
+        with open(path) as f:
+            spec.update(json.load(f))
+    if inline:
+        spec.update(json.loads(inline))
+    return compile_rules(spec)
+
+
+def rule_for(
+    rules: Dict[str, NormalizationRule], tenant_id: Optional[str]
+) -> NormalizationRule:
+    return rules.get(tenant_id) or rules.get(WILDCARD) or DEFAULT_RULE
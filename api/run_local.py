@@ -1,5 +1,5 @@
 """
-Run API locally with mocked Pub/Sub
+Run API locally with mocked Pub/Sub and Firestore
 No GCP credentials needed!
 """
 
@@ -14,7 +14,9 @@ mock_future.result.return_value = "local-mock-message-id"
 mock_publisher.publish.return_value = mock_future
 mock_publisher.topic_path.return_value = "projects/local/topics/data-ingestion"
 
-with patch("google.cloud.pubsub_v1.PublisherClient", return_value=mock_publisher):
+with patch(
+    "google.cloud.pubsub_v1.PublisherClient", return_value=mock_publisher
+), patch("google.cloud.firestore.Client", return_value=MagicMock()):
     from main import app
 
 print("=" * 60)
@@ -0,0 +1,108 @@
+"""
+Production server entry point for the API
+Runs uvicorn with N worker processes, uvloop/httptools when installed,
+and tunable keep-alive / backlog settings
+
+Usage:
+    python serve.py                      # settings from environment
+    python serve.py --workers 4 --port 8080
+"""
+
+import argparse
+import importlib.util
+import logging
+import os
+
+import structured_logging
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on (respects cgroup/affinity limits)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def pick_loop() -> str:
+    """uvloop when installed, else the stdlib asyncio loop"""
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def pick_http() -> str:
+    """httptools parser when installed, else pure-Python h11"""
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the Data Processor API")
+    parser.add_argument("--app", default=os.getenv("APP_MODULE", "main:app"))
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8080)))
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("WEB_CONCURRENCY", available_cpus())),
+        help="Worker processes (default: WEB_CONCURRENCY or available CPUs)",
+    )
+    parser.add_argument(
+        "--keep-alive",
+        type=int,
+        default=int(os.getenv("UVICORN_KEEPALIVE_SECONDS", 75)),
+        help="Idle keep-alive timeout; keep above the load balancer's (Cloud Run: 60s)",
+    )
+    parser.add_argument(
+        "--backlog",
+        type=int,
+        default=int(os.getenv("UVICORN_BACKLOG", 2048)),
+        help="Listen socket backlog",
+    )
+    parser.add_argument(
+        "--limit-concurrency",
+        type=int,
+        default=int(os.getenv("UVICORN_LIMIT_CONCURRENCY", 0)) or None,
+        help="Per-worker cap on concurrent connections before returning 503",
+    )
+    parser.add_argument("--log-level", default=os.getenv("UVICORN_LOG_LEVEL", "info"))
+    return parser.parse_args(argv)
+
+
+def build_config(args: argparse.Namespace) -> dict:
+    """uvicorn.run keyword arguments for the parsed settings"""
+    return {
+        "host": args.host,
+        "port": args.port,
+        "workers": max(1, args.workers),
+        "loop": pick_loop(),
+        "http": pick_http(),
+        "timeout_keep_alive": args.keep_alive,
+        "backlog": args.backlog,
+        "limit_concurrency": args.limit_concurrency,
+        "log_level": args.log_level,
+        # Let uvicorn's loggers propagate to the app's structured handler
+        "log_config": None,
+        # Access logs are formatted per request; Cloud Run already records them
+        "access_log": False,
+        "proxy_headers": True,
+        "forwarded_allow_ips": "*",
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = build_config(args)
+    structured_logging.configure_logging()
+    logger.info(
+        f"Starting {args.app} with {config['workers']} worker(s), "
+        f"loop={config['loop']}, http={config['http']}"
+    )
+    # Each worker process imports the app itself, so Pub/Sub and Firestore
+    # clients (and their gRPC channels) are created after the process starts
+    uvicorn.run(args.app, **config)
+
+
+if __name__ == "__main__":
+    main()
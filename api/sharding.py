@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Tenant-affinity sharding: tenants map to shards 0..N-1 on a consistent-hash
+ring, so each worker instance keeps warm state for its own tenants
+
+The API stamps a `shard` attribute on every message it publishes (SHARD_COUNT
+> 0); each shard has its own subscription, filtered on that attribute, and
+its own worker service bound to it (WORKER_SHARD). Growing the ring from N to
+N+1 shards only moves tenants onto the new shard (about 1/(N+1) of them);
+removing the last shard only moves that shard's tenants
+
+Usage (rebalance planning):
+    python sharding.py --shards 4 acme globex initech
+    python sharding.py --shards 4 --to 5 --tenants-file tenants.txt
+"""
+
+import argparse
+import bisect
+import functools
+import hashlib
+import os
+import sys
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple
+
+# Ring points per shard; more points even out the tenant split (changing this
+# remaps every tenant, so API and workers must agree)
+VNODES_PER_SHARD = 256
+SHARD_ATTRIBUTE = "shard"
+SUBSCRIPTION_SUFFIX = "-shard-"
+# The API publishes to {topic}-sharded when sharding is on (see terraform)
+SHARDED_TOPIC_SUFFIX = "-sharded"
+
+
+def hash64(value: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big"
+    )
+
+
+class ShardRing:
+    """
+    Consistent-hash ring of shards 0..shards-1; shard_for() is memoized,
+    since the tenant set is small compared to the message rate
+    """
+
+    def __init__(
+        self,
+        shards: int,
+        vnodes: int = VNODES_PER_SHARD,
+        cache_size: int = 65536,
+    ):
+        if shards < 1:
+            raise ValueError("A shard ring needs at least one shard")
+        points = sorted(
+            (hash64(f"shard-{shard}#{vnode}"), shard)
+            for shard in range(shards)
+            for vnode in range(vnodes)
+        )
+        self.shards = shards
+        self._hashes = [h for h, _ in points]
+        self._owners = [shard for _, shard in points]
+        self.shard_for = functools.lru_cache(maxsize=cache_size)(self._lookup)
+
+    def _lookup(self, tenant_id: str) -> int:
+        """First ring point clockwise from the tenant's hash"""
+        index = bisect.bisect(self._hashes, hash64(tenant_id))
+        return self._owners[index % len(self._owners)]
+
+
+def ring_from_env() -> Optional[ShardRing]:
+    """ShardRing from SHARD_COUNT, or None when sharding is off (0/unset)"""
+    shards = int(os.getenv("SHARD_COUNT", 0))
+    return ShardRing(shards) if shards > 0 else None
+
+
+def sharded_topic_name(base: str) -> str:
+    """Topic the API publishes to when sharding is on, matching terraform"""
+    if base.endswith(SHARDED_TOPIC_SUFFIX):
+        return base
+    return f"{base}{SHARDED_TOPIC_SUFFIX}"
+
+
+def subscription_name(base: str, shard: int) -> str:
+    """Shard subscription name, matching terraform"""
+    return f"{base}{SUBSCRIPTION_SUFFIX}{shard}"
+
+
+def subscription_filter(shard: int) -> str:
+    """Pub/Sub filter selecting one shard's messages"""
+    return f'attributes.{SHARD_ATTRIBUTE} = "{shard}"'
+
+
+def rebalance_plan(
+    tenants: Iterable[str], old_shards: int, new_shards: int
+) -> Dict[str, Tuple[int, int]]:
+    """{tenant: (old_shard, new_shard)} for the tenants that move"""
+    old, new = ShardRing(old_shards), ShardRing(new_shards)
+    moves = {}
+    for tenant in tenants:
+        before, after = old.shard_for(tenant), new.shard_for(tenant)
+        if before != after:
+            moves[tenant] = (before, after)
+    return moves
+
+
+def main_cli(argv=None, out=sys.stdout):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("tenants", nargs="*", help="Tenant ids")
+    parser.add_argument("--tenants-file", help="One tenant id per line")
+    parser.add_argument("--shards", type=int, required=True, help="Current shards")
+    parser.add_argument("--to", type=int, help="Planned shard count")
+    args = parser.parse_args(argv)
+
+    tenants = list(args.tenants)
+    if args.tenants_file:
+        with open(args.tenants_file) as f:
+            tenants.extend(line.strip() for line in f if line.strip())
+    if not tenants:
+        parser.error("no tenants given")
+
+    ring = ShardRing(args.shards)
+    if args.to is None:
+        for tenant in tenants:
+            print(f"{tenant}\t{ring.shard_for(tenant)}", file=out)
+        counts = Counter(ring.shard_for(t) for t in tenants)
+        print(f"# tenants per shard: {dict(sorted(counts.items()))}", file=out)
+        return
+
+    moves = rebalance_plan(tenants, args.shards, args.to)
+    for shard in range(args.shards, args.to):
+        print(f"# new shard {shard}: filter {subscription_filter(shard)}", file=out)
+    for tenant, (before, after) in sorted(moves.items()):
+        print(f"{tenant}\t{before} -> {after}", file=out)
+    print(
+        f"# {len(moves)}/{len(tenants)} tenants move "
+        f"({len(moves) / len(tenants):.1%}) going from {args.shards} to "
+        f"{args.to} shards",
+        file=out,
+    )
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,284 @@
+"""
+Local write-ahead spool for Pub/Sub publishes
+Append-only segment files of length-prefixed, CRC32-checked records
+Used by the API when Pub/Sub does not confirm a publish in time
+"""
+
+import fcntl
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Callable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Record layout: [payload length u32][crc32(payload) u32][payload]
+RECORD_HEADER = struct.Struct(">II")
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".log"
+CHECKPOINT_SUFFIX = ".ckpt"
+
+
+class SpoolCorruptionError(Exception):
+    """Raised when a record fails its CRC check"""
+
+
+def claim_spool_directory(base_directory: str, max_claims: int = 1024):
+    """
+    Claim an exclusive per-process subdirectory (worker-0, worker-1, ...)
+    Multi-process servers share SPOOL_DIR; an flock on worker-N.lock keeps
+    each spool single-writer and lets a restarted process adopt the
+    segments left behind by a previous one
+    Returns (directory, lock_file); keep lock_file open for the process lifetime
+    """
+    os.makedirs(base_directory, exist_ok=True)
+    for index in range(max_claims):
+        lock_file = open(os.path.join(base_directory, f"worker-{index}.lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            continue
+        return os.path.join(base_directory, f"worker-{index}"), lock_file
+    raise RuntimeError(f"No free spool directory under {base_directory}")
+
+
+class WriteAheadSpool:
+    """
+    Durable FIFO of publish requests backed by segment files
+
+    - append() writes to the active segment, rotating at segment_max_bytes
+    - replay() seals the active segment, then drains sealed segments in
+      order, checkpointing the byte offset after each confirmed batch
+    - fully replayed segments (and their checkpoints) are deleted
+
+    Delivery is at-least-once: a crash between publish and checkpoint
+    replays the batch again (the worker's writes are keyed by log_id)
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_max_bytes: int = 64 * 1024 * 1024,
+        fsync: bool = False,
+    ):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._active = None
+        self._active_path = None
+        self._next_sequence = 0
+        self.pending_records = 0
+        # Unreplayed records per segment, so a quarantined one can be dropped
+        self._segment_records = {}
+        self.replayed_records = 0
+        self.last_replay_at = None
+
+        os.makedirs(directory, exist_ok=True)
+        for path in self.segments():
+            self._next_sequence = max(self._next_sequence, self._sequence(path) + 1)
+            offset = self._read_checkpoint(path)
+            records = 0
+            try:
+                for _ in self.read_segment(path, offset):
+                    records += 1
+            except SpoolCorruptionError as e:
+                logger.error(f"Spool segment will be quarantined on replay: {e}")
+            self._segment_records[path] = records
+            self.pending_records += records
+
+    # ---- segment helpers -------------------------------------------------
+
+    @staticmethod
+    def _sequence(path: str) -> int:
+        name = os.path.basename(path)
+        return int(name[len(SEGMENT_PREFIX) : -len(SEGMENT_SUFFIX)])
+
+    def segments(self) -> List[str]:
+        """All segment files, oldest first"""
+        names = [
+            name
+            for name in os.listdir(self.directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        ]
+        paths = [os.path.join(self.directory, name) for name in names]
+        return sorted(paths, key=self._sequence)
+
+    def _read_checkpoint(self, path: str) -> int:
+        try:
+            with open(path + CHECKPOINT_SUFFIX) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_checkpoint(self, path: str, offset: int):
+        tmp_path = path + CHECKPOINT_SUFFIX + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(offset))
+        os.replace(tmp_path, path + CHECKPOINT_SUFFIX)
+
+    def _open_new_segment(self):
+        name = f"{SEGMENT_PREFIX}{self._next_sequence:020d}{SEGMENT_SUFFIX}"
+        self._next_sequence += 1
+        self._active_path = os.path.join(self.directory, name)
+        self._active = open(self._active_path, "ab")
+
+    def _seal(self):
+        """Close the active segment so the replayer may consume it"""
+        if self._active is not None:
+            self._active.close()
+            self._active = None
+            self._active_path = None
+
+    # ---- write path ------------------------------------------------------
+
+    def append(self, data: bytes, attributes: Optional[dict] = None):
+        """Append one publish request to the spool"""
+        payload = json.dumps(
+            {
+                "data": data.decode("utf-8"),
+                "attributes": attributes or {},
+                "spooled_at": time.time(),
+            }
+        ).encode("utf-8")
+        record = RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+        with self._lock:
+            if self._active is None or self._active.tell() >= self.segment_max_bytes:
+                self._seal()
+                self._open_new_segment()
+            self._active.write(record)
+            self._active.flush()
+            if self.fsync:
+                os.fsync(self._active.fileno())
+            self.pending_records += 1
+            self._segment_records[self._active_path] = (
+                self._segment_records.get(self._active_path, 0) + 1
+            )
+
+    # ---- read path -------------------------------------------------------
+
+    @staticmethod
+    def read_segment(path: str, offset: int = 0) -> Iterator[Tuple[int, dict]]:
+        """
+        Yield (end_offset, record) from offset onwards
+        A truncated tail (torn write) ends iteration; a CRC mismatch raises
+        """
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return
+                length, crc = RECORD_HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length:
+                    return
+                if zlib.crc32(payload) != crc:
+                    raise SpoolCorruptionError(f"CRC mismatch in {path} at {offset}")
+                offset += RECORD_HEADER.size + length
+                yield offset, json.loads(payload)
+
+    def replay(
+        self,
+        publish_batch: Callable[[List[dict]], None],
+        batch_size: int = 100,
+    ) -> int:
+        """
+        Drain sealed segments through publish_batch
+        publish_batch must raise if any record in the batch was not confirmed
+        Returns the number of records replayed
+        """
+        with self._replay_lock:
+            with self._lock:
+                self._seal()
+                paths = self.segments()
+
+            replayed = 0
+            for path in paths:
+                offset = self._read_checkpoint(path)
+                batch, batch_end = [], offset
+                try:
+                    for end_offset, record in self.read_segment(path, offset):
+                        batch.append(record)
+                        batch_end = end_offset
+                        if len(batch) >= batch_size:
+                            replayed += self._commit_batch(
+                                path, publish_batch, batch, batch_end
+                            )
+                            batch = []
+                    if batch:
+                        replayed += self._commit_batch(
+                            path, publish_batch, batch, batch_end
+                        )
+                except SpoolCorruptionError as e:
+                    logger.error(f"Quarantining corrupt spool segment: {e}")
+                    os.replace(path, path + ".corrupt")
+                    # Its remaining records will never be replayed
+                    with self._lock:
+                        self.pending_records -= self._segment_records.pop(path, 0)
+                    continue
+
+                os.remove(path)
+                with self._lock:
+                    self._segment_records.pop(path, None)
+                if os.path.exists(path + CHECKPOINT_SUFFIX):
+                    os.remove(path + CHECKPOINT_SUFFIX)
+
+            return replayed
+
+    def _commit_batch(self, path, publish_batch, batch, batch_end) -> int:
+        publish_batch(batch)
+        self._write_checkpoint(path, batch_end)
+        with self._lock:
+            self.pending_records -= len(batch)
+            self._segment_records[path] = self._segment_records.get(path, 0) - len(
+                batch
+            )
+            self.replayed_records += len(batch)
+            self.last_replay_at = time.time()
+        return len(batch)
+
+    # ---- observability ---------------------------------------------------
+
+    def oldest_spooled_at(self) -> Optional[float]:
+        """Timestamp of the next record to be replayed, if any"""
+        for path in self.segments():
+            try:
+                for _, record in self.read_segment(path, self._read_checkpoint(path)):
+                    return record["spooled_at"]
+            except (SpoolCorruptionError, FileNotFoundError):
+                continue
+        return None
+
+    @staticmethod
+    def _size(path: str) -> int:
+        """0 for a segment replay() removed since it was listed"""
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    def stats(self) -> dict:
+        segments = self.segments()
+        oldest = self.oldest_spooled_at()
+        return {
+            "pending_records": self.pending_records,
+            "replayed_records": self.replayed_records,
+            "segments": len(segments),
+            "bytes": sum(self._size(path) for path in segments),
+            "replay_lag_seconds": (
+                round(time.time() - oldest, 3) if oldest is not None else 0.0
+            ),
+            "last_replay_at": self.last_replay_at,
+        }
+
+    def close(self):
+        with self._lock:
+            self._seal()
@@ -0,0 +1,101 @@
+"""
+Unit tests for /ingest pre-validation helpers
+Run with: pytest tests/
+"""
+
+import json
+
+import admission
+import pytest
+
+
+def scan(body: bytes, chunk_size: int = 0) -> admission.TenantIdScanner:
+    scanner = admission.TenantIdScanner()
+    step = chunk_size or len(body) or 1
+    for start in range(0, len(body), step):
+        scanner.feed(body[start : start + step])
+    return scanner
+
+
+class TestTenantIdScanner:
+    def test_finds_tenant_id_across_chunk_boundaries(self):
+        body = json.dumps(
+            {
+                "text": 'quote " brace } bracket ] \\ ", "tenant_id": "evil',
+                "nested": {"tenant_id": "inner", "list": [{"a": "}"}]},
+                "tenant_id": "acme",
+                "after": "x" * 100,
+            }
+        ).encode()
+
+        for chunk_size in (0, 1, 2, 3, 7):
+            scanner = scan(body, chunk_size)
+            assert scanner.state == admission.FOUND
+            assert scanner.tenant_id == "acme"
+
+    def test_stops_before_the_rest_of_the_body(self):
+        scanner = scan(b'{"tenant_id": "acme", "text": ')
+
+        assert scanner.state == admission.FOUND
+
+    def test_escaped_key_and_value(self):
+        scanner = scan(b'{"tenant\\u005fid" : "ac\\"me"}', chunk_size=3)
+
+        assert scanner.state == admission.FOUND
+        assert scanner.tenant_id == 'ac"me'
+
+    def test_missing_invalid_and_malformed(self):
+        assert scan(b'{"text": "x", "nested": {"tenant_id": "a"}}').state == (
+            admission.MISSING
+        )
+        assert scan(b'{"tenant_id": 42}').state == admission.INVALID
+        assert scan(b'{"tenant_id": null}').state == admission.INVALID
+        long_value = b'{"tenant_id": "' + b"a" * 2000 + b'"}'
+        assert scan(long_value, chunk_size=100).state == admission.INVALID
+        assert scan(b"  [1, 2]").state == admission.MALFORMED
+        assert scan(b"invalid json {{{").state == admission.MALFORMED
+
+    def test_leading_utf8_bom_skipped(self):
+        body = b'\xef\xbb\xbf {"tenant_id": "acme"}'
+
+        for chunk_size in (0, 1, 2):
+            scanner = scan(body, chunk_size)
+            assert scanner.state == admission.FOUND
+            assert scanner.tenant_id == "acme"
+        assert json.loads(body)["tenant_id"] == "acme"
+        assert scan(b'\xef\xbb{"tenant_id": "acme"}').state == admission.MALFORMED
+        assert scan(b'{"tenant_id": "\xef\xbb\xbfacme"}').tenant_id == "\ufeffacme"
+
+    def test_pending_until_decided(self):
+        scanner = scan(b'  {"text": "a long str')
+
+        assert scanner.state == admission.PENDING
+        assert scanner.tenant_id is None
+
+
+class TestBodyLimits:
+    def test_tenant_limits_only_lower_the_global_cap(self):
+        limits = admission.load_limits(1000, '{"small": 10, "big": 5000, "*": 500}')
+
+        assert limits.limit_for(None) == 1000
+        assert limits.limit_for("small") == 10
+        assert limits.limit_for("big") == 1000
+        assert limits.limit_for("other") == 500
+
+    def test_invalid_limit_rejected(self):
+        with pytest.raises(ValueError):
+            admission.load_limits(1000, '{"acme": "lots"}')
+
+    def test_content_length(self):
+        assert admission.parse_content_length(None) is None
+        assert admission.parse_content_length("42") == 42
+        for bad in ("-1", "ten"):
+            with pytest.raises(ValueError):
+                admission.parse_content_length(bad)
+
+
+class TestTenantIds:
+    def test_valid_tenant_id(self):
+        assert admission.valid_tenant_id("acme-prod_1")
+        for bad in ("", "a/b", "..", "x" * 129, "tab\there", None, 7):
+            assert not admission.valid_tenant_id(bad)
@@ -0,0 +1,36 @@
+"""
+Unit tests for the archive segment format
+Run with: pytest tests/
+"""
+
+import archive
+
+
+class TestArchiveFormat:
+    def test_round_trip_and_lookup(self):
+        records = [
+            {"log_id": f"log_{i}", "modified_data": "Call [REDACTED] " * 20}
+            for i in range(50)
+        ]
+
+        data = archive.encode_records(records)
+
+        assert archive.decode_records(data) == records
+        assert archive.find_record(data, "log_7") == {
+            "modified_data": records[7]["modified_data"]
+        }
+        assert archive.find_record(data, "missing") is None
+        assert len(data) * 10 < sum(len(str(r)) for r in records)
+
+    def test_segment_ids_are_deterministic_per_day(self):
+        first = archive.segment_id("2024-01-01", ["a", "b"])
+
+        assert first == archive.segment_id("2024-01-01", ["a", "b"])
+        assert first.startswith("2024-01-01-")
+        assert first != archive.segment_id("2024-01-01", ["a", "c"])
+
+    def test_index_buckets(self):
+        buckets = {archive.index_bucket(f"log_{i}") for i in range(5000)}
+
+        assert len(buckets) == archive.INDEX_BUCKETS
+        assert all(len(b) == 2 for b in buckets)
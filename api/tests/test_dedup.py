@@ -0,0 +1,89 @@
+"""
+Unit tests for ingest-side content dedup
+Run with: pytest tests/
+"""
+
+import os
+
+import pytest
+from dedup import DedupWindow, RotatingBloomFilter, content_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestContentKey:
+    def test_key_covers_tenant_source_text_and_fields(self):
+        key = content_key("acme", "json_upload", "hello", {"a": 1, "b": 2})
+
+        assert key == content_key("acme", "json_upload", "hello", {"b": 2, "a": 1})
+        assert key != content_key("beta", "json_upload", "hello", {"a": 1, "b": 2})
+        assert key != content_key("acme", "text_upload", "hello", {"a": 1, "b": 2})
+        assert key != content_key("acme", "json_upload", "hello")
+        # The separator keeps field boundaries unambiguous
+        assert content_key("ab", "c", "d") != content_key("a", "bc", "d")
+
+
+class TestRotatingBloomFilter:
+    def test_remembers_for_the_window_then_forgets(self):
+        clock = FakeClock()
+        bloom = RotatingBloomFilter(100, 1000, 0.01, generations=4, clock=clock)
+        key = content_key("acme", "text_upload", "hello")
+        bloom.add(key)
+
+        clock.now = 99
+        assert key in bloom
+        clock.now = 126
+        assert key not in bloom
+
+    def test_long_idle_period_clears_everything(self):
+        clock = FakeClock()
+        bloom = RotatingBloomFilter(100, 1000, 0.01, generations=4, clock=clock)
+        bloom.add(b"k" * 16)
+
+        clock.now = 10_000
+        assert b"k" * 16 not in bloom
+        assert bloom.stats()["generations"] == 5
+        assert bloom.stats()["items"] == [0] * 5
+
+    def test_false_positive_rate_near_target(self):
+        bloom = RotatingBloomFilter(60, 20_000, 0.01, generations=4)
+        for _ in range(20_000 // 4):
+            bloom.add(os.urandom(16))
+
+        false_positives = sum(os.urandom(16) in bloom for _ in range(20_000))
+
+        assert false_positives / 20_000 < 0.01
+        assert bloom.estimated_false_positive_rate() < 0.01
+
+    def test_invalid_rate(self):
+        with pytest.raises(ValueError):
+            RotatingBloomFilter(60, 100, 0)
+
+
+class TestDedupWindow:
+    def test_duplicate_reports_original_log_id(self):
+        window = DedupWindow(60, 1000, 0.001)
+        key = content_key("acme", "text_upload", "hello")
+
+        assert window.check(key) == (False, None)
+        window.remember(key, "log_1")
+        assert window.check(key) == (True, "log_1")
+
+        stats = window.stats()
+        assert stats["checks"] == 2
+        assert stats["duplicates"] == 1
+        assert stats["memory_bytes"] > 0
+
+    def test_evicted_original_reports_none(self):
+        window = DedupWindow(60, 1000, 0.001, id_cache_size=1)
+        first = content_key("acme", "text_upload", "first")
+        window.remember(first, "log_1")
+        window.remember(content_key("acme", "text_upload", "second"), "log_2")
+
+        assert window.check(first) == (True, None)
@@ -0,0 +1,90 @@
+"""
+Unit tests for profiling hooks
+Run with: pytest tests/
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import diagnostics  # noqa: E402
+
+
+def busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class TestSamplingProfiler:
+    """Test the stack-sampling profiler"""
+
+    def test_disabled_by_default(self):
+        profiler = diagnostics.SamplingProfiler()
+        assert not any(profiler.should_sample() for _ in range(100))
+
+    def test_samples_one_in_n(self):
+        profiler = diagnostics.SamplingProfiler(sample_rate=4)
+        assert sum(profiler.should_sample() for _ in range(100)) == 25
+
+    def test_records_folded_stacks_for_traced_work(self):
+        profiler = diagnostics.SamplingProfiler(sample_rate=1, interval=0.001)
+
+        with profiler.profile():
+            busy_wait(0.1)
+
+        assert profiler.samples > 0
+        folded = profiler.folded()
+        assert "busy_wait (test_diagnostics.py:" in folded
+        stack, count = folded.splitlines()[0].rsplit(" ", 1)
+        assert int(count) > 0
+
+        functions = {f["function"]: f for f in profiler.function_stats()}
+        busy = next(v for k, v in functions.items() if k.startswith("busy_wait"))
+        assert busy["self_seconds"] > 0
+        assert busy["total_seconds"] >= busy["self_seconds"]
+
+    def test_untraced_work_is_not_sampled(self):
+        profiler = diagnostics.SamplingProfiler(sample_rate=0, interval=0.001)
+
+        with profiler.profile():
+            busy_wait(0.02)
+
+        assert profiler.samples == 0
+
+    def test_reset_clears_samples(self):
+        profiler = diagnostics.SamplingProfiler(sample_rate=1, interval=0.001)
+        with profiler.profile():
+            busy_wait(0.02)
+        profiler.reset()
+
+        assert profiler.samples == 0
+        assert profiler.folded() == "\n"
+
+
+class TestAllocationTracing:
+    """Test tracemalloc snapshots"""
+
+    def test_allocations_folded(self):
+        diagnostics.start_allocation_tracing(10)
+        try:
+            blob = [bytearray(1024) for _ in range(100)]  # noqa: F841
+            folded = diagnostics.allocations_folded(limit=50)
+        finally:
+            diagnostics.stop_allocation_tracing()
+
+        assert "test_diagnostics.py:" in folded
+        assert all(line.rsplit(" ", 1)[1].isdigit() for line in folded.splitlines())
+
+    def test_snapshot_requires_tracing(self):
+        diagnostics.stop_allocation_tracing()
+        with pytest.raises(RuntimeError):
+            diagnostics.allocations_folded()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
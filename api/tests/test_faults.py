@@ -0,0 +1,169 @@
+"""
+Unit tests for fault injection
+Run with: pytest tests/
+"""
+
+import asyncio
+from unittest.mock import MagicMock
+
+import faults
+import pytest
+from faults import FaultInjector, FaultSpec, FaultyPublisher, InjectedFault
+
+
+def injector(target="store", **spec):
+    return FaultInjector({target: FaultSpec(**spec)}, seed=1, sleep=lambda s: None)
+
+
+class TestFaultInjector:
+    def test_error_skips_the_call(self):
+        fn = MagicMock()
+
+        with pytest.raises(InjectedFault):
+            injector(error_rate=1).call("store", fn)
+
+        fn.assert_not_called()
+
+    def test_timeout_stalls_then_raises_timeout_error(self):
+        slept = []
+        inj = FaultInjector(
+            {"store": FaultSpec(timeout_rate=1, timeout_ms=250)}, sleep=slept.append
+        )
+
+        with pytest.raises(TimeoutError):
+            inj.call("store", MagicMock())
+
+        assert slept == [0.25]
+
+    def test_partial_failure_applies_then_raises(self):
+        fn = MagicMock()
+
+        with pytest.raises(InjectedFault):
+            injector(partial_failure_rate=1).wrap("store", fn)("a", b=1)
+
+        fn.assert_called_once_with("a", b=1)
+
+    def test_wraps_coroutine_functions(self):
+        async def write(value):
+            return value
+
+        wrapped = injector(partial_failure_rate=1).wrap("store", write)
+
+        with pytest.raises(InjectedFault):
+            asyncio.run(wrapped("a"))
+        assert asyncio.run(injector().wrap("store", write)("a")) == "a"
+
+    def test_rates_and_counts(self):
+        inj = injector(error_rate=0.2)
+        failures = 0
+        for _ in range(2000):
+            try:
+                inj.call("store", lambda: None)
+            except InjectedFault:
+                failures += 1
+
+        assert 300 < failures < 500
+        assert inj.stats()["targets"]["store"] == {
+            "calls": 2000,
+            "errors": failures,
+            "timeouts": 0,
+            "partial": 0,
+        }
+
+    def test_inactive_or_untargeted_calls_pass_through(self):
+        inj = injector(error_rate=1)
+        assert inj.call("publish", lambda: "ok") == "ok"
+        inj.active = False
+        assert inj.call("store", lambda: "ok") == "ok"
+
+
+class TestSubscriberFaults:
+    def test_failed_delivery_is_nacked_unprocessed(self):
+        callback, message = MagicMock(), MagicMock()
+
+        injector("subscribe", error_rate=1).wrap_callback(callback)(message)
+
+        callback.assert_not_called()
+        message.nack.assert_called_once()
+
+    def test_lost_ack_never_reaches_the_message(self):
+        message = MagicMock(data=b"payload")
+
+        def callback(msg):
+            assert msg.data == b"payload"
+            msg.ack()
+
+        injector("subscribe", partial_failure_rate=1).wrap_callback(callback)(message)
+
+        message.ack.assert_not_called()
+
+
+class TestFaultyPublisher:
+    def test_error_does_not_publish(self):
+        inner = MagicMock()
+        publisher = FaultyPublisher(inner, injector("publish", error_rate=1))
+
+        future = publisher.publish("topic", b"data", tenant_id="acme")
+
+        with pytest.raises(InjectedFault):
+            future.result(timeout=1)
+        inner.publish.assert_not_called()
+
+    def test_partial_publishes_but_fails_confirmation(self):
+        inner = MagicMock()
+        publisher = FaultyPublisher(inner, injector("publish", partial_failure_rate=1))
+
+        with pytest.raises(InjectedFault):
+            publisher.publish("topic", b"data", tenant_id="acme").result()
+        inner.publish.assert_called_once_with("topic", b"data", tenant_id="acme")
+
+    def test_stall_longer_than_timeout_times_out(self):
+        inj = FaultInjector(
+            {"publish": FaultSpec(latency_ms=10_000)}, sleep=lambda s: None
+        )
+        future = FaultyPublisher(MagicMock(), inj).publish("topic", b"data")
+
+        with pytest.raises(TimeoutError):
+            future.result(timeout=0.5)
+
+    def test_ok_returns_inner_result_and_delegates(self):
+        inner = MagicMock()
+        inner.publish.return_value.result.return_value = "message-id"
+        publisher = FaultyPublisher(inner, injector("publish"))
+
+        assert publisher.publish("topic", b"data").result(timeout=1) == "message-id"
+        assert publisher.topic_path is inner.topic_path
+
+
+class TestProfiles:
+    def test_presets_are_valid(self):
+        for name in faults.PROFILES:
+            faults.parse_profile(name)
+
+    def test_json_profile(self):
+        specs = faults.parse_profile('{"store": {"latency_ms": 5, "error_rate": 0.1}}')
+
+        assert specs["store"].latency_ms == 5
+        assert specs["store"].error_rate == 0.1
+
+    @pytest.mark.parametrize(
+        "value",
+        [
+            "no_such_preset",
+            '{"firestore": {}}',
+            '{"store": {"error_rate": 2}}',
+            '{"store": {"latency": 5}}',
+            "[]",
+        ],
+    )
+    def test_invalid_profiles(self, value):
+        with pytest.raises(ValueError):
+            faults.parse_profile(value)
+
+    def test_from_env(self, monkeypatch):
+        monkeypatch.delenv("FAULT_INJECTION", raising=False)
+        assert faults.injector_from_env() is None
+
+        monkeypatch.setenv("FAULT_INJECTION", "flaky_store")
+        monkeypatch.setenv("FAULT_INJECTION_SEED", "7")
+        assert faults.injector_from_env().specs["store"].error_rate == 0.1
@@ -155,6 +155,388 @@ class TestTextIngestion:
         assert "X-Tenant-ID header required" in response.json()["detail"]
 
 
+class TestNormalizationRules:
+    """Test per-tenant normalization on /ingest"""
+
+    def test_rule_shapes_text_and_structured_fields(self, client):
+        import normalization
+
+        rules = normalization.compile_rules(
+            {
+                "acme": {
+                    "text_fields": ["message", "user.*"],
+                    "structured_fields": ["severity", "user.id"],
+                    "exclude": ["user.token"],
+                }
+            }
+        )
+        body = {
+            "tenant_id": "acme",
+            "message": "login failed",
+            "severity": "WARN",
+            "user": {"id": 42, "token": "secret"},
+        }
+        with patch("main.normalization_rules", rules), patch(
+            "main.publish_to_pubsub"
+        ) as mock_publish:
+            mock_publish.return_value = "test-message-id"
+            response = client.post("/ingest", json=body)
+
+        assert response.status_code == 202
+        args, kwargs = mock_publish.call_args
+        assert args[2] == "message=login failed\nuser.id=42"
+        assert kwargs["fields"] == {"severity": "WARN", "user": {"id": 42}}
+
+    def test_structured_fields_are_published(self):
+        from main import publish_to_pubsub
+
+        with patch("main.publisher") as mock_pub:
+            mock_pub.publish.return_value.result.return_value = "id"
+            publish_to_pubsub("acme", "log_1", "t", "json_upload", fields={"a": 1})
+
+        message = json.loads(mock_pub.publish.call_args[0][1])
+        assert message["fields"] == {"a": 1}
+
+
+class TestIngestDedup:
+    """Test content dedup on /ingest"""
+
+    @pytest.fixture
+    def dedup_window(self):
+        from dedup import DedupWindow
+
+        window = DedupWindow(60, 1000, 0.001)
+        with patch("main.dedup_window", window), patch("main.DEDUP_TENANTS", {"acme"}):
+            yield window
+
+    def test_duplicate_returns_original_log_id_without_publishing(
+        self, client, dedup_window
+    ):
+        with patch("main.publish_to_pubsub") as mock_publish:
+            mock_publish.return_value = "test-message-id"
+            first = client.post("/ingest", json={"tenant_id": "acme", "text": "hi"})
+            second = client.post(
+                "/ingest", json={"tenant_id": "acme", "log_id": "new", "text": "hi"}
+            )
+
+        assert mock_publish.call_count == 1
+        assert second.status_code == 202
+        assert second.json()["status"] == "duplicate"
+        assert second.json()["log_id"] == first.json()["log_id"]
+
+    def test_other_tenants_are_not_deduped(self, client, dedup_window):
+        with patch("main.publish_to_pubsub") as mock_publish:
+            mock_publish.return_value = "test-message-id"
+            for _ in range(2):
+                client.post("/ingest", json={"tenant_id": "beta", "text": "hi"})
+
+        assert mock_publish.call_count == 2
+        assert dedup_window.checks == 0
+
+    def test_failed_publish_is_not_remembered(self, client, dedup_window):
+        with patch("main.publish_to_pubsub") as mock_publish:
+            mock_publish.side_effect = [Exception("unavailable"), "test-message-id"]
+            failed = client.post("/ingest", json={"tenant_id": "acme", "text": "hi"})
+            retried = client.post("/ingest", json={"tenant_id": "acme", "text": "hi"})
+
+        assert failed.status_code == 500
+        assert retried.json()["status"] == "accepted"
+
+    def test_configurable_status_and_metrics(self, client, dedup_window):
+        with patch("main.publish_to_pubsub") as mock_publish, patch(
+            "main.DEDUP_STATUS_CODE", 409
+        ):
+            mock_publish.return_value = "test-message-id"
+            for _ in range(2):
+                response = client.post(
+                    "/ingest",
+                    content="same line",
+                    headers={"Content-Type": "text/plain", "X-Tenant-ID": "acme"},
+                )
+
+            stats = client.get("/metrics").json()["dedup"]
+
+        assert response.status_code == 409
+        assert stats["duplicates"] == 1
+        assert stats["memory_bytes"] > 0
+        assert 0 <= stats["estimated_false_positive_rate"] < 0.001
+
+
+class TestPublishSpooling:
+    """Test write-ahead spooling of unconfirmed publishes"""
+
+    def test_unconfirmed_publish_is_spooled(self, client):
+        """Test a slow publish is spooled and ingest still returns 202"""
+        with patch("main.publisher") as mock_pub, patch("main.spool") as mock_spool:
+            mock_pub.publish.return_value.result.side_effect = TimeoutError()
+
+            response = client.post(
+                "/ingest",
+                json={"tenant_id": "acme", "text": "hello"},
+                headers={"Content-Type": "application/json"},
+            )
+
+        assert response.status_code == 202
+        data = response.json()
+        assert data["spooled"] is True
+        assert data["message_id"] is None
+        mock_spool.append.assert_called_once()
+        assert mock_spool.append.call_args[0][1] == {
+            "tenant_id": "acme",
+            "source": "json_upload",
+        }
+
+    def test_publish_failure_without_spool_returns_500(self, client):
+        """Test publish failures still surface as 500 when spooling is off"""
+        with patch("main.publisher") as mock_pub, patch("main.spool", None):
+            mock_pub.publish.return_value.result.side_effect = TimeoutError()
+
+            response = client.post(
+                "/ingest",
+                json={"tenant_id": "acme", "text": "hello"},
+                headers={"Content-Type": "application/json"},
+            )
+
+        assert response.status_code == 500
+
+
+class TestOrderedDelivery:
+    """Test per-tenant ordering keys"""
+
+    def test_ordering_key_modes(self):
+        from main import ordering_key_for
+
+        with patch("main.ORDERING_MODE", "off"):
+            assert ordering_key_for("acme", "s1") == ""
+        with patch("main.ORDERING_MODE", "tenant"):
+            assert ordering_key_for("acme", "s1") == "acme"
+        with patch("main.ORDERING_MODE", "tenant_stream"):
+            assert ordering_key_for("acme", "s1") == "acme:s1"
+            assert ordering_key_for("acme") == "acme"
+        with patch("main.ORDERING_MODE", "tenant"), patch(
+            "main.ORDERED_TENANTS", {"beta"}
+        ):
+            assert ordering_key_for("acme") == ""
+            assert ordering_key_for("beta") == "beta"
+
+    def test_stream_header_sets_ordering_key(self, client):
+        with patch("main.ORDERING_MODE", "tenant_stream"), patch(
+            "main.publish_to_pubsub"
+        ) as mock_publish:
+            mock_publish.return_value = "test-message-id"
+            response = client.post(
+                "/ingest",
+                data="ordered line",
+                headers={
+                    "Content-Type": "text/plain",
+                    "X-Tenant-ID": "acme",
+                    "X-Stream-ID": "app-1",
+                },
+            )
+
+        assert response.status_code == 202
+        assert mock_publish.call_args[1]["ordering_key"] == "acme:app-1"
+
+    def test_ordered_publish_failure_resumes_key_and_skips_spool(self, client):
+        """Test failed ordered publishes are not spooled and unpause the key"""
+        from main import publish_to_pubsub
+
+        with patch("main.publisher") as mock_pub, patch("main.spool") as mock_spool:
+            mock_pub.publish.return_value.result.side_effect = TimeoutError()
+
+            with pytest.raises(TimeoutError):
+                publish_to_pubsub(
+                    "acme", "log_1", "text", "json_upload", ordering_key="acme"
+                )
+
+        assert mock_pub.publish.call_args[1]["ordering_key"] == "acme"
+        mock_pub.resume_publish.assert_called_once()
+        mock_spool.append.assert_not_called()
+
+
+class TestTenantSharding:
+    """Test the shard attribute used by per-shard subscriptions"""
+
+    def test_shard_attribute_follows_the_ring(self):
+        from main import publish_to_pubsub
+        from sharding import ShardRing
+
+        ring = ShardRing(4)
+        with patch("main.publisher") as mock_pub, patch("main.shard_ring", ring):
+            mock_pub.publish.return_value.result.return_value = "id"
+            publish_to_pubsub("acme", "log_1", "t", "json_upload")
+
+        attributes = mock_pub.publish.call_args[1]
+        assert attributes["shard"] == str(ring.shard_for("acme"))
+        assert attributes["tenant_id"] == "acme"
+
+    def test_no_shard_attribute_when_disabled(self, client):
+        from main import publish_to_pubsub
+
+        with patch("main.publisher") as mock_pub, patch("main.shard_ring", None):
+            mock_pub.publish.return_value.result.return_value = "id"
+            publish_to_pubsub("acme", "log_1", "t", "json_upload")
+
+        assert "shard" not in mock_pub.publish.call_args[1]
+        assert client.get("/metrics").json()["sharding"] == {"enabled": False}
+
+
+class TestProfilingAdmin:
+    """Test profiling admin endpoints"""
+
+    def test_admin_disabled_without_token(self, client):
+        with patch("main.ADMIN_TOKEN", None):
+            response = client.get("/admin/profiling")
+        assert response.status_code == 404
+
+    def test_admin_rejects_wrong_token(self, client):
+        with patch("main.ADMIN_TOKEN", "secret"):
+            response = client.get(
+                "/admin/profiling", headers={"X-Admin-Token": "wrong"}
+            )
+        assert response.status_code == 403
+
+    def test_configure_and_collect_cpu_profile(self, client):
+        from main import profiler
+
+        headers = {"X-Admin-Token": "secret"}
+        with patch("main.ADMIN_TOKEN", "secret"):
+            response = client.post(
+                "/admin/profiling?sample_rate=1&reset=true", headers=headers
+            )
+            assert response.status_code == 200
+            assert response.json()["sample_rate"] == 1
+
+            client.get("/health")
+            folded = client.get("/admin/profiling/cpu", headers=headers)
+            stats = client.get("/admin/profiling/cpu?format=json", headers=headers)
+            client.post("/admin/profiling?sample_rate=0", headers=headers)
+
+        assert folded.status_code == 200
+        assert folded.headers["content-type"].startswith("text/plain")
+        assert stats.json()["traced_units"] >= 1
+        assert profiler.sample_rate == 0
+
+    def test_allocations_require_tracing(self, client):
+        headers = {"X-Admin-Token": "secret"}
+        with patch("main.ADMIN_TOKEN", "secret"):
+            response = client.get("/admin/profiling/allocations", headers=headers)
+        assert response.status_code == 409
+
+
+class TestCompressedBodies:
+    """Test Content-Encoding support on /ingest"""
+
+    def post_compressed(self, client, body, encoding, content_type):
+        headers = {"Content-Type": content_type, "Content-Encoding": encoding}
+        if content_type == "text/plain":
+            headers["X-Tenant-ID"] = "test_tenant"
+        return client.post("/ingest", content=body, headers=headers)
+
+    def test_gzip_json(self, client):
+        """Test gzip-compressed JSON is decoded"""
+        import gzip
+
+        payload = json.dumps({"tenant_id": "test_tenant", "text": "hello " * 100})
+        with patch("main.publish_to_pubsub") as mock_publish:
+            mock_publish.return_value = "test-message-id"
+            response = self.post_compressed(
+                client, gzip.compress(payload.encode()), "gzip", "application/json"
+            )
+
+        assert response.status_code == 202
+        assert mock_publish.call_args[0][2] == "hello " * 100
+
+    def test_deflate_text_zlib_and_raw(self, client):
+        """Test zlib-wrapped and raw deflate text bodies"""
+        import zlib
+
+        raw = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        raw_body = raw.compress(b"raw deflate text") + raw.flush()
+
+        with patch("main.publish_to_pubsub") as mock_publish:
+            mock_publish.return_value = "test-message-id"
+            for body, text in (
+                (zlib.compress(b"zlib deflate text"), "zlib deflate text"),
+                (raw_body, "raw deflate text"),
+            ):
+                response = self.post_compressed(client, body, "deflate", "text/plain")
+                assert response.status_code == 202
+                assert mock_publish.call_args[0][2] == text
+
+    def test_zstd_text(self, client):
+        """Test zstd-compressed text is decoded"""
+        zstandard = pytest.importorskip("zstandard")
+
+        body = zstandard.ZstdCompressor().compress(b"zstd text body")
+        with patch("main.publish_to_pubsub") as mock_publish:
+            mock_publish.return_value = "test-message-id"
+            response = self.post_compressed(client, body, "zstd", "text/plain")
+
+        assert response.status_code == 202
+        assert mock_publish.call_args[0][2] == "zstd text body"
+
+    def test_decompression_bomb_rejected(self, client):
+        """Test bodies inflating past the limit return 413"""
+        import gzip
+
+        body = gzip.compress(b"a" * 4096)
+        with patch("main.MAX_DECOMPRESSED_BODY_BYTES", 1024), patch(
+            "main.publish_to_pubsub"
+        ) as mock_publish:
+            response = self.post_compressed(client, body, "gzip", "text/plain")
+
+        assert response.status_code == 413
+        mock_publish.assert_not_called()
+
+    def test_zstd_bomb_rejected(self, client):
+        """Test zstd bodies are bounded as well"""
+        zstandard = pytest.importorskip("zstandard")
+
+        body = zstandard.ZstdCompressor().compress(b"a" * 200_000)
+        with patch("main.MAX_DECOMPRESSED_BODY_BYTES", 1024):
+            response = self.post_compressed(client, body, "zstd", "text/plain")
+
+        assert response.status_code == 413
+
+    def test_corrupt_body_rejected(self, client):
+        """Test invalid compressed data returns 400"""
+        response = self.post_compressed(client, b"not gzip", "gzip", "text/plain")
+        assert response.status_code == 400
+
+    def test_truncated_zstd_rejected(self, client):
+        """Test a zstd frame cut short returns 400 instead of partial text"""
+        zstandard = pytest.importorskip("zstandard")
+
+        body = zstandard.ZstdCompressor().compress(b"a" * 600_000)
+        with patch("main.publish_to_pubsub") as mock_publish:
+            response = self.post_compressed(
+                client, body[: len(body) // 2], "zstd", "text/plain"
+            )
+
+        assert response.status_code == 400
+        mock_publish.assert_not_called()
+
+    def test_unsupported_encoding(self, client):
+        """Test unknown encodings return 415"""
+        response = self.post_compressed(client, b"data", "br", "text/plain")
+        assert response.status_code == 415
+
+    def test_compression_ratio_metrics(self, client):
+        """Test /metrics reports compression ratios"""
+        import gzip
+
+        with patch("main.publish_to_pubsub") as mock_publish:
+            mock_publish.return_value = "test-message-id"
+            self.post_compressed(
+                client, gzip.compress(b"x" * 10_000), "gzip", "text/plain"
+            )
+
+        stats = client.get("/metrics").json()["compression"]["gzip"]
+        assert stats["requests"] >= 1
+        assert stats["ratio"] > 1
+
+
 class TestContentTypeHandling:
     """Test content type validation"""
 
@@ -168,6 +550,147 @@ class TestContentTypeHandling:
         assert "Unsupported content type" in response.json()["detail"]
 
 
+class TestIngestPrevalidation:
+    """Test /ingest rejections before (or while) the body is read"""
+
+    @pytest.fixture
+    def limits(self):
+        import admission
+
+        limits = admission.BodyLimits(1000, {"small": 50})
+        with patch("main.body_limits", limits):
+            yield limits
+
+    def test_oversized_content_length_rejected_before_body(self, client, limits):
+        """Test Content-Length over the global limit returns 413 unread"""
+        import main
+
+        before = main.admission_stats["rejected_before_body"]
+        with patch("main.read_request_body") as mock_read, patch(
+            "main.publish_to_pubsub"
+        ) as mock_publish:
+            response = client.post(
+                "/ingest",
+                content=b"x" * 2000,
+                headers={"Content-Type": "text/plain", "X-Tenant-ID": "acme"},
+            )
+
+        assert response.status_code == 413
+        mock_read.assert_not_called()
+        mock_publish.assert_not_called()
+        assert main.admission_stats["rejected_before_body"] == before + 1
+        assert client.get("/metrics").json()["admission"]["rejected"]["too_large"]
+
+    def test_per_tenant_limits(self, client, limits):
+        """Test tenant limits apply to the header and to the scanned tenant_id"""
+        text = {"Content-Type": "text/plain"}
+        payload = json.dumps({"tenant_id": "small", "text": "x" * 100})
+
+        with patch("main.publish_to_pubsub") as mock_publish:
+            mock_publish.return_value = "test-message-id"
+            small = client.post(
+                "/ingest", content="x" * 100, headers={**text, "X-Tenant-ID": "small"}
+            )
+            other = client.post(
+                "/ingest", content="x" * 100, headers={**text, "X-Tenant-ID": "acme"}
+            )
+            scanned = client.post(
+                "/ingest",
+                content=payload,
+                headers={"Content-Type": "application/json"},
+            )
+
+        assert small.status_code == 413
+        assert other.status_code == 202
+        assert scanned.status_code == 413
+        assert mock_publish.call_count == 1
+
+    def test_streamed_body_without_content_length(self, limits):
+        """Test chunked bodies are cut off once they pass the limit"""
+        import asyncio
+
+        import main
+
+        request, consumed = self.streaming_request([b"x" * 400] * 10, "text/plain")
+        guard = main.IngestGuard("acme")
+
+        with pytest.raises(main.HTTPException) as exc:
+            asyncio.run(main.read_request_body(request, guard))
+
+        assert exc.value.status_code == 413
+        assert len(consumed) == 3
+
+    def test_json_without_tenant_id_rejected_mid_stream(self, limits):
+        """Test the tenant_id scan rejects before the rest of the body arrives"""
+        import asyncio
+
+        import admission
+        import main
+
+        chunks = [b'{"log_id": "a", "nested": {"tenant_id": "x"}}', b" " * 100]
+        request, consumed = self.streaming_request(chunks, "application/json")
+        guard = main.IngestGuard(scanner=admission.TenantIdScanner())
+
+        with pytest.raises(main.HTTPException) as exc:
+            asyncio.run(main.read_request_body(request, guard))
+
+        assert exc.value.status_code == 400
+        assert "tenant_id required" in exc.value.detail
+        assert len(consumed) == 1
+
+    def test_json_with_utf8_bom_accepted(self, client):
+        """Test a leading UTF-8 BOM does not fail the tenant_id scan"""
+        body = b"\xef\xbb\xbf" + json.dumps({"tenant_id": "acme", "text": "x"}).encode()
+
+        with patch("main.publish_to_pubsub") as mock_publish:
+            mock_publish.return_value = "test-message-id"
+            response = client.post(
+                "/ingest", content=body, headers={"Content-Type": "application/json"}
+            )
+
+        assert response.status_code == 202
+        assert mock_publish.call_args[0][0] == "acme"
+
+    def test_invalid_tenants_rejected(self, client):
+        """Test bad tenant ids in headers and bodies return 400"""
+        with patch("main.publish_to_pubsub") as mock_publish:
+            header = client.post(
+                "/ingest",
+                content="hello",
+                headers={"Content-Type": "text/plain", "X-Tenant-ID": "a/b"},
+            )
+            not_a_string = client.post("/ingest", json={"tenant_id": 7, "text": "x"})
+            conflicting = client.post(
+                "/ingest",
+                content='{"tenant_id": "acme", "text": "x", "tenant_id": "other"}',
+                headers={"Content-Type": "application/json"},
+            )
+            not_an_object = client.post("/ingest", json=["acme"])
+
+        assert header.status_code == 400
+        assert header.json()["detail"] == "Invalid X-Tenant-ID header"
+        assert not_a_string.status_code == 400
+        assert conflicting.status_code == 400
+        assert conflicting.json()["detail"] == "Conflicting tenant_id values"
+        assert not_an_object.status_code == 400
+        mock_publish.assert_not_called()
+
+    @staticmethod
+    def streaming_request(chunks, content_type):
+        """Request stand-in whose body arrives chunk by chunk"""
+        consumed = []
+
+        async def stream():
+            for chunk in chunks:
+                consumed.append(chunk)
+                yield chunk
+
+        request = MagicMock()
+        request.headers = {"content-type": content_type}
+        request.stream = stream
+        return request, consumed
+
+
 class TestHelperFunctions:
     """Test helper functions"""
 
@@ -189,5 +712,259 @@ class TestHelperFunctions:
         assert "field1" in result
 
 
+def make_snapshot(log_id, data):
+    """Build a Firestore snapshot stand-in"""
+    snapshot = MagicMock()
+    snapshot.id = log_id
+    snapshot.exists = data is not None
+    snapshot.to_dict.return_value = data
+    return snapshot
+
+
+def make_query(snapshots):
+    """Build a chainable Firestore query stand-in returning snapshots"""
+    query = MagicMock()
+    for method in ("where", "order_by", "select", "start_after", "limit"):
+        getattr(query, method).return_value = query
+    query.stream.return_value = iter(snapshots)
+    return query
+
+
+class TestLogQueries:
+    """Test tenant log read endpoints"""
+
+    def test_list_logs_paginates_with_cursor(self, client):
+        """Test that a full page returns a cursor for the next page"""
+        snapshots = [
+            make_snapshot(f"log_{i}", {"processed_at": f"2024-01-01T00:00:0{i}"})
+            for i in range(3)
+        ]
+        query = make_query(snapshots)
+
+        with patch("main.processed_logs_collection", return_value=query):
+            response = client.get("/tenants/acme/logs?limit=2")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["count"] == 2
+        assert [log["log_id"] for log in data["logs"]] == ["log_0", "log_1"]
+        query.limit.assert_called_with(3)
+
+        from main import decode_cursor
+
+        assert decode_cursor(data["next_cursor"]) == ("2024-01-01T00:00:01", "log_1")
+
+        query = make_query([])
+        with patch("main.processed_logs_collection", return_value=query):
+            response = client.get(
+                f"/tenants/acme/logs?limit=2&cursor={data['next_cursor']}"
+            )
+
+        assert response.status_code == 200
+        assert response.json()["next_cursor"] is None
+        query.start_after.assert_called_once_with(
+            {"processed_at": "2024-01-01T00:00:01", "__name__": "log_1"}
+        )
+
+    def test_list_logs_projection_and_time_range(self, client):
+        """Test exclude projection and processed_at filters"""
+        query = make_query(
+            [make_snapshot("log_1", {"processed_at": "2024-01-01T00:00:00"})]
+        )
+
+        with patch("main.processed_logs_collection", return_value=query):
+            response = client.get(
+                "/tenants/acme/logs?exclude=original_text"
+                "&processed_after=2024-01-01T00:00:00Z"
+            )
+
+        assert response.status_code == 200
+        selected = query.select.call_args[0][0]
+        assert "original_text" not in selected
+        assert "`delivery_attempt(s)`" in selected
+        assert query.where.call_count == 1
+
+    def test_list_logs_invalid_cursor(self, client):
+        """Test malformed cursor returns 400"""
+        with patch("main.processed_logs_collection", return_value=make_query([])):
+            response = client.get("/tenants/acme/logs?cursor=not-a-cursor")
+
+        assert response.status_code == 400
+
+    def test_list_logs_empty_field_path(self, client):
+        """Test empty field path components return 400"""
+        with patch("main.processed_logs_collection", return_value=make_query([])):
+            for fields in (".", "a..b", "source,fields."):
+                response = client.get(f"/tenants/acme/logs?fields={fields}")
+                assert response.status_code == 400
+                assert response.json()["detail"] == "Invalid field path"
+
+    def test_get_log_uses_cache(self, client):
+        """Test single log lookups are served from the read-through cache"""
+        from main import log_cache
+
+        collection = MagicMock()
+        collection.document.return_value.get.return_value = make_snapshot(
+            "log_cached", {"modified_data": "[REDACTED]", "original_text": "secret"}
+        )
+
+        with patch("main.processed_logs_collection", return_value=collection):
+            first = client.get("/tenants/acme/logs/log_cached?fields=modified_data")
+            second = client.get("/tenants/acme/logs/log_cached")
+
+        assert first.status_code == 200
+        assert first.json() == {
+            "tenant_id": "acme",
+            "log_id": "log_cached",
+            "modified_data": "[REDACTED]",
+        }
+        assert second.json()["original_text"] == "secret"
+        assert collection.document.return_value.get.call_count == 1
+        log_cache.invalidate(("acme", "log_cached"))
+
+    def test_get_log_rebuilds_chunked_text(self, client):
+        """Test chunked logs are read back with their text joined in order"""
+        from main import log_cache
+
+        collection = MagicMock()
+        parent = collection.document.return_value
+        parent.get.return_value = make_snapshot(
+            "log_big", {"source": "app", "chunked": True, "chunk_count": 2}
+        )
+        chunks = make_query(
+            [
+                make_snapshot("000000", {"index": 0, "modified_data": "call "}),
+                make_snapshot("000001", {"index": 1, "modified_data": "[PHONE]"}),
+            ]
+        )
+        parent.collection.return_value = chunks
+
+        with patch("main.processed_logs_collection", return_value=collection):
+            response = client.get(
+                "/tenants/acme/logs/log_big?fields=modified_data,chunk_count"
+            )
+            metadata = client.get("/tenants/acme/logs/log_big?fields=source")
+
+        assert response.status_code == 200
+        assert response.json() == {
+            "tenant_id": "acme",
+            "log_id": "log_big",
+            "modified_data": "call [PHONE]",
+            "chunk_count": 2,
+        }
+        parent.collection.assert_called_once_with("chunks")
+        chunks.order_by.assert_called_once_with("index")
+        chunks.select.assert_called_once_with(["modified_data"])
+        assert metadata.json() == {
+            "tenant_id": "acme",
+            "log_id": "log_big",
+            "source": "app",
+        }
+        log_cache.invalidate(("acme", "log_big"))
+
+    def test_get_log_not_found(self, client):
+        """Test missing log returns 404"""
+        collection = MagicMock()
+        collection.document.return_value.get.return_value = make_snapshot(
+            "missing", None
+        )
+
+        with patch("main.processed_logs_collection", return_value=collection), patch(
+            "main.archive_collection", return_value=collection
+        ):
+            response = client.get("/tenants/acme/logs/missing")
+
+        assert response.status_code == 404
+
+    def test_get_log_falls_back_to_archive(self, client):
+        """Test compacted logs are found through the archive index"""
+        import archive
+        from main import log_cache
+
+        records = [
+            {"log_id": "log_old", "modified_data": "[REDACTED]"},
+            {"log_id": "log_other", "modified_data": "x"},
+        ]
+        live, index, archives = MagicMock(), MagicMock(), MagicMock()
+        live.document.return_value.get.return_value = make_snapshot("log_old", None)
+        index.document.return_value.get.return_value = make_snapshot(
+            "00", {"entries": {"log_old": "2024-01-01-abc"}}
+        )
+        segment = make_snapshot("2024-01-01-abc", {})
+        segment.get.return_value = archive.encode_records(records)
+        archives.document.return_value.get.return_value = segment
+        collections = {
+            archive.INDEX_COLLECTION: index,
+            archive.ARCHIVES_COLLECTION: archives,
+        }
+
+        with patch("main.processed_logs_collection", return_value=live), patch(
+            "main.archive_collection", side_effect=lambda t, name: collections[name]
+        ):
+            response = client.get("/tenants/acme/logs/log_old")
+
+        assert response.status_code == 200
+        assert response.json() == {
+            "tenant_id": "acme",
+            "log_id": "log_old",
+            "modified_data": "[REDACTED]",
+            "archive_segment": "2024-01-01-abc",
+        }
+        index.document.assert_called_once_with(archive.index_bucket("log_old"))
+        archives.document.assert_called_once_with("2024-01-01-abc")
+        log_cache.invalidate(("acme", "log_old"))
+
+
+class TestAggregates:
+    """Test per-tenant aggregate endpoint"""
+
+    def test_sums_counter_shards(self, client):
+        """Test totals are summed across shard documents"""
+        with patch("main.db") as mock_db:
+            shards = mock_db.collection.return_value.document.return_value.collection
+            shards.return_value.stream.return_value = [
+                make_snapshot("0", {"messages": 2, "characters": 40, "redactions": 1}),
+                make_snapshot("3", {"messages": 1, "characters": 10}),
+            ]
+
+            response = client.get("/tenants/acme/aggregates")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["shards"] == 2
+        assert data["totals"] == {
+            "messages": 3,
+            "characters": 50,
+            "redactions": 1,
+            "delivery_attempts": 0,
+        }
+        shards.assert_called_with("aggregate_shards")
+
+
+class TestTTLCache:
+    """Test the bounded TTL cache"""
+
+    def test_evicts_least_recently_used(self):
+        from main import TTLCache
+
+        cache = TTLCache(max_entries=2, ttl_seconds=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+    def test_entries_expire(self):
+        from main import TTLCache
+
+        cache = TTLCache(max_entries=2, ttl_seconds=0)
+        cache.set("a", 1)
+
+        assert cache.get("a") is None
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
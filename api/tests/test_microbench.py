@@ -0,0 +1,98 @@
+"""
+Unit tests for the microbenchmark harness
+Run with: pytest tests/
+"""
+
+import microbench
+import pytest
+
+
+@pytest.fixture
+def benchmarks(monkeypatch):
+    registry = {}
+    monkeypatch.setattr(microbench, "BENCHMARKS", registry)
+    return registry
+
+
+def baseline(calibration=1.0, **bests):
+    return {
+        "calibration": calibration,
+        "results": {name: {"best": best} for name, best in bests.items()},
+    }
+
+
+class TestMeasure:
+    def test_scales_loops_to_min_time(self):
+        calls = []
+        result = microbench.measure(lambda: calls.append(1), repeat=3, min_time=0.001)
+
+        assert result["loops"] > 1
+        assert result["best"] <= result["median"]
+        assert len(calls) >= result["loops"] * 3
+
+
+class TestCompare:
+    def test_flags_gated_regressions_only(self):
+        results = {"fast": {"best": 1.0}, "slow": {"best": 3.0}, "other": {"best": 3.0}}
+
+        regressions = microbench.compare(
+            results,
+            1.0,
+            baseline(fast=1.0, slow=1.0, other=1.0),
+            threshold=1.5,
+            gates=["slow"],
+        )
+
+        assert regressions == ["slow"]
+
+    def test_normalizes_by_calibration(self):
+        # Twice as slow, but on a machine that is twice as slow
+        results = {"bench": {"best": 2.0}}
+
+        assert microbench.compare(results, 2.0, baseline(bench=1.0), 1.5) == []
+        assert microbench.compare(
+            results, 2.0, baseline(bench=1.0), 1.5, normalize=False
+        ) == ["bench"]
+
+    def test_new_benchmarks_are_not_regressions(self):
+        assert microbench.compare({"new": {"best": 9.0}}, 1.0, baseline(), 1.5) == []
+
+
+class TestMain:
+    def test_save_then_compare(self, benchmarks, tmp_path, capsys):
+        path = str(tmp_path / "baseline.json")
+        microbench.register("noop", lambda: None)
+        argv = ["--repeat", "2", "--min-time", "0.001"]
+
+        assert microbench.main("Bench", path, argv + ["--save"]) == 0
+        # A noop is all timer noise; only the save/compare plumbing is tested
+        compare = argv + ["--compare", "--threshold", "1000"]
+        assert microbench.main("Bench", path, compare) == 0
+        assert "No gated benchmark regressed" in capsys.readouterr().out
+
+    def test_regression_exits_nonzero(self, benchmarks, tmp_path):
+        path = str(tmp_path / "baseline.json")
+        microbench.register("work", lambda: None)
+        microbench.save_baseline(path, {"work": {"best": 1e-12}}, 1.0)
+
+        assert (
+            microbench.main(
+                "Bench", path, ["--compare", "--no-normalize", "--min-time", "0.001"]
+            )
+            == 1
+        )
+
+    def test_missing_baseline(self, benchmarks, tmp_path):
+        path = str(tmp_path / "missing.json")
+        assert microbench.main("Bench", path, ["--compare", "--min-time", "0.001"]) == 2
+
+    def test_filter_selects_benchmarks(self, benchmarks, tmp_path):
+        path = str(tmp_path / "baseline.json")
+        microbench.register("redact[a]", lambda: None)
+        microbench.register("ingest[a]", lambda: None)
+
+        microbench.main(
+            "Bench", path, ["--save", "-k", "redact*", "--min-time", "0.001"]
+        )
+
+        assert list(microbench.load_baseline(path)["results"]) == ["redact[a]"]
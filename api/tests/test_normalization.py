@@ -0,0 +1,113 @@
+"""
+Unit tests for per-tenant JSON normalization rules
+Run with: pytest tests/
+"""
+
+import json
+
+import pytest
+from normalization import NormalizationRule, compile_rules, load_rules, rule_for
+
+BODY = {
+    "tenant_id": "acme",
+    "log_id": "log_1",
+    "message": "login failed",
+    "severity": "WARN",
+    "user": {"id": 42, "email": "a@example.com", "token": "secret"},
+    "http": {"status": 401, "headers": {"ua": "curl"}},
+    "tags": ["auth", "edge"],
+    "password": "hunter2",
+}
+
+
+class TestDefaultRule:
+    def test_text_field_is_used_as_is(self):
+        assert NormalizationRule().text({"text": "hello", "other": 1}) == "hello"
+
+    def test_flattens_instead_of_repr(self):
+        text = NormalizationRule().text(BODY)
+
+        assert "message=login failed" in text.splitlines()
+        assert "user.id=42" in text.splitlines()
+        assert "tags.1=edge" in text.splitlines()
+        assert "tenant_id" not in text
+        assert "{'" not in text
+        assert len(text) < len(str(BODY))
+
+    def test_no_structured_fields(self):
+        assert NormalizationRule().structured(BODY) is None
+
+
+class TestTenantRules:
+    def test_text_fields_in_rule_order(self):
+        rule = NormalizationRule(text_fields=["severity", "message", "http.status"])
+
+        assert rule.text(BODY) == "severity=WARN\nmessage=login failed\nhttp.status=401"
+
+    def test_wildcards_and_exclude(self):
+        rule = NormalizationRule(text_fields=["user.*"], exclude=["*.token"])
+
+        assert rule.text(BODY) == "user.id=42\nuser.email=a@example.com"
+
+    def test_structured_fields_keep_nesting(self):
+        rule = NormalizationRule(
+            structured_fields=["severity", "user", "http.status", "missing.path"],
+            exclude=["user.token"],
+        )
+
+        assert rule.structured(BODY) == {
+            "severity": "WARN",
+            "user": {"id": 42, "email": "a@example.com"},
+            "http": {"status": 401},
+        }
+
+    def test_max_depth_renders_compact_json(self):
+        rule = NormalizationRule(text_fields=["http"], max_depth=2)
+
+        assert rule.text(BODY) == 'http.status=401\nhttp.headers={"ua":"curl"}'
+
+    def test_separator(self):
+        rule = NormalizationRule(text_fields=["user.id"], separator="/")
+
+        assert rule.text(BODY) == "user/id=42"
+
+    def test_text_fields_override_text(self):
+        rule = NormalizationRule(text_fields=["severity"])
+
+        assert rule.text({"text": "ignored", "severity": "INFO"}) == "severity=INFO"
+
+
+class TestCompile:
+    def test_rule_for_falls_back_to_wildcard_then_default(self):
+        rules = compile_rules(
+            {"acme": {"text_fields": ["message"]}, "*": {"exclude": ["password"]}}
+        )
+
+        assert rule_for(rules, "acme").text(BODY) == "message=login failed"
+        assert "password" not in rule_for(rules, "other").text(BODY)
+        assert rule_for({}, "acme").text({"text": "t"}) == "t"
+
+    @pytest.mark.parametrize(
+        "spec",
+        [
+            {"acme": {"text_field": ["x"]}},
+            {"acme": {"text_fields": "message"}},
+            {"acme": {"exclude": ["a..b"]}},
+            {"acme": {"max_depth": 0}},
+            {"acme": []},
+        ],
+    )
+    def test_invalid_rules_raise(self, spec):
+        with pytest.raises(ValueError):
+            compile_rules(spec)
+
+    def test_inline_overrides_file(self, tmp_path):
+        path = tmp_path / "rules.json"
+        path.write_text(
+            json.dumps({"acme": {"text_fields": ["a"]}, "beta": {"text_fields": ["b"]}})
+        )
+
+        rules = load_rules(json.dumps({"acme": {"text_fields": ["c"]}}), str(path))
+
+        assert rules["acme"].text({"a": 1, "c": 3}) == "c=3"
+        assert rules["beta"].text({"b": 2}) == "b=2"
@@ -0,0 +1,83 @@
+"""
+Unit tests for the production server entry point
+Run with: pytest tests/
+"""
+
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import serve  # noqa: E402
+
+
+class TestServeConfig:
+    """Test uvicorn settings derived from CLI/env"""
+
+    def test_cli_overrides(self):
+        args = serve.parse_args(
+            ["--workers", "3", "--keep-alive", "90", "--backlog", "4096"]
+        )
+        config = serve.build_config(args)
+
+        assert config["workers"] == 3
+        assert config["timeout_keep_alive"] == 90
+        assert config["backlog"] == 4096
+        assert config["limit_concurrency"] is None
+
+    def test_workers_from_environment(self):
+        with patch.dict(os.environ, {"WEB_CONCURRENCY": "5"}):
+            args = serve.parse_args([])
+
+        assert serve.build_config(args)["workers"] == 5
+
+    def test_at_least_one_worker(self):
+        args = serve.parse_args(["--workers", "0"])
+        assert serve.build_config(args)["workers"] == 1
+
+    def test_fast_loop_and_parser_fallback(self):
+        with patch("importlib.util.find_spec", return_value=None):
+            assert serve.pick_loop() == "asyncio"
+            assert serve.pick_http() == "h11"
+
+    def test_main_runs_uvicorn_with_import_string(self):
+        with patch("serve.uvicorn.run") as mock_run:
+            serve.main(["--workers", "2", "--port", "9000"])
+
+        app, kwargs = mock_run.call_args[0][0], mock_run.call_args[1]
+        assert app == "main:app"
+        assert kwargs["workers"] == 2
+        assert kwargs["port"] == 9000
+
+
+class TestPublisherWarmup:
+    """Test each server process opens its Pub/Sub channel at startup"""
+
+    def test_waits_for_channel_with_configured_timeout(self):
+        import main
+
+        with patch("main.publisher") as mock_publisher, patch(
+            "main.PUBLISHER_WARMUP_TIMEOUT_SECONDS", 2.5
+        ), patch("main.grpc.channel_ready_future") as mock_ready:
+            main.warm_publisher()
+
+        mock_ready.assert_called_once_with(mock_publisher.transport.grpc_channel)
+        mock_ready.return_value.result.assert_called_once_with(timeout=2.5)
+
+    def test_startup_continues_when_channel_is_not_ready(self):
+        import main
+
+        with patch("main.publisher"), patch(
+            "main.grpc.channel_ready_future"
+        ) as mock_ready, patch("main.logger") as mock_logger:
+            mock_ready.return_value.result.side_effect = TimeoutError()
+            main.warm_publisher()
+
+        mock_logger.warning.assert_called_once()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
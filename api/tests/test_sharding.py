@@ -0,0 +1,76 @@
+"""
+Unit tests for tenant-affinity sharding
+Run with: pytest tests/
+"""
+
+import io
+from collections import Counter
+
+import pytest
+import sharding
+from sharding import ShardRing
+
+TENANTS = [f"tenant-{i}" for i in range(5000)]
+
+
+class TestShardRing:
+    def test_stable_and_in_range(self):
+        ring, rebuilt = ShardRing(8), ShardRing(8)
+
+        shards = [ring.shard_for(t) for t in TENANTS]
+
+        assert shards == [rebuilt.shard_for(t) for t in TENANTS]
+        assert set(shards) == set(range(8))
+
+    def test_tenants_spread_evenly(self):
+        ring = ShardRing(8)
+        counts = Counter(ring.shard_for(t) for t in TENANTS)
+
+        assert max(counts.values()) < 1.5 * len(TENANTS) / 8
+        assert min(counts.values()) > 0.5 * len(TENANTS) / 8
+
+    def test_growing_only_moves_tenants_to_the_new_shard(self):
+        moves = sharding.rebalance_plan(TENANTS, 8, 9)
+
+        assert {after for _, after in moves.values()} == {8}
+        assert 0.05 < len(moves) / len(TENANTS) < 0.2
+
+    def test_shrinking_only_moves_the_removed_shards_tenants(self):
+        moves = sharding.rebalance_plan(TENANTS, 9, 8)
+
+        assert {before for before, _ in moves.values()} == {8}
+
+    def test_single_shard_and_invalid_counts(self):
+        assert ShardRing(1).shard_for("acme") == 0
+        with pytest.raises(ValueError):
+            ShardRing(0)
+
+
+class TestShardConfig:
+    def test_ring_from_env(self, monkeypatch):
+        monkeypatch.delenv("SHARD_COUNT", raising=False)
+        assert sharding.ring_from_env() is None
+
+        monkeypatch.setenv("SHARD_COUNT", "3")
+        assert sharding.ring_from_env().shards == 3
+
+    def test_names_match_terraform(self):
+        assert sharding.subscription_name("data-ingestion-sub", 2) == (
+            "data-ingestion-sub-shard-2"
+        )
+        assert sharding.subscription_filter(2) == 'attributes.shard = "2"'
+        assert sharding.sharded_topic_name("data-ingestion") == (
+            "data-ingestion-sharded"
+        )
+        assert sharding.sharded_topic_name("data-ingestion-sharded") == (
+            "data-ingestion-sharded"
+        )
+
+    def test_cli_plan(self):
+        out = io.StringIO()
+
+        sharding.main_cli(["--shards", "2", "--to", "3", *TENANTS[:100]], out=out)
+
+        lines = out.getvalue().splitlines()
+        assert lines[0] == '# new shard 2: filter attributes.shard = "2"'
+        assert lines[-1].startswith(f"# {len(lines) - 2}/100 tenants move")
@@ -0,0 +1,141 @@
+"""
+Unit tests for the write-ahead spool
+Run with: pytest tests/
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from spool import RECORD_HEADER, WriteAheadSpool, claim_spool_directory  # noqa: E402
+
+
+@pytest.fixture
+def spool(tmp_path):
+    """Create a spool in a temporary directory"""
+    spool = WriteAheadSpool(str(tmp_path), segment_max_bytes=256)
+    yield spool
+    spool.close()
+
+
+class TestSpoolAppendReplay:
+    """Test append/replay round trips"""
+
+    def test_replay_drains_in_order_and_deletes_segments(self, spool):
+        """Test records replay in append order across segments"""
+        for i in range(10):
+            spool.append(f'{{"n": {i}}}'.encode(), {"tenant_id": "acme"})
+        assert spool.pending_records == 10
+        assert len(spool.segments()) > 1
+
+        published = []
+        replayed = spool.replay(lambda batch: published.extend(batch), batch_size=3)
+
+        assert replayed == 10
+        assert [r["data"] for r in published] == [f'{{"n": {i}}}' for i in range(10)]
+        assert published[0]["attributes"] == {"tenant_id": "acme"}
+        assert spool.segments() == []
+        assert spool.stats()["pending_records"] == 0
+
+    def test_failed_batch_resumes_from_checkpoint(self, spool):
+        """Test a failed publish keeps unconfirmed records for the next replay"""
+        for i in range(4):
+            spool.append(f"m{i}".encode())
+
+        calls = []
+
+        def flaky(batch):
+            calls.append(len(batch))
+            if len(calls) == 2:
+                raise RuntimeError("pubsub unavailable")
+
+        with pytest.raises(RuntimeError):
+            spool.replay(flaky, batch_size=2)
+        assert spool.pending_records == 2
+
+        published = []
+        spool.replay(lambda batch: published.extend(batch), batch_size=2)
+        assert [r["data"] for r in published] == ["m2", "m3"]
+
+    def test_pending_records_recovered_after_restart(self, tmp_path):
+        """Test a new spool instance picks up existing segments"""
+        first = WriteAheadSpool(str(tmp_path))
+        first.append(b"a")
+        first.append(b"b")
+        first.close()
+
+        second = WriteAheadSpool(str(tmp_path))
+        second.append(b"c")
+
+        assert second.pending_records == 3
+        published = []
+        second.replay(lambda batch: published.extend(batch))
+        assert [r["data"] for r in published] == ["a", "b", "c"]
+
+
+class TestSpoolIntegrity:
+    """Test CRC checking and torn writes"""
+
+    def test_torn_tail_is_ignored(self, spool):
+        spool.append(b"complete")
+        spool.close()
+        with open(spool.segments()[0], "ab") as f:
+            f.write(RECORD_HEADER.pack(100, 0) + b"partial")
+
+        published = []
+        spool.replay(lambda batch: published.extend(batch))
+        assert [r["data"] for r in published] == ["complete"]
+
+    def test_corrupt_segment_is_quarantined(self, spool, tmp_path):
+        spool.append(b"payload")
+        spool.close()
+        path = spool.segments()[0]
+        with open(path, "r+b") as f:
+            f.seek(RECORD_HEADER.size + 2)
+            f.write(b"X")
+
+        assert spool.replay(lambda batch: None) == 0
+        assert os.path.exists(path + ".corrupt")
+        assert spool.segments() == []
+        assert spool.stats()["pending_records"] == 0
+
+    def test_stats_report_replay_lag(self, spool):
+        assert spool.stats()["replay_lag_seconds"] == 0.0
+        spool.append(b"waiting")
+        stats = spool.stats()
+        assert stats["pending_records"] == 1
+        assert stats["segments"] == 1
+        assert stats["replay_lag_seconds"] >= 0.0
+
+    def test_stats_tolerate_segments_removed_by_replay(self, spool, monkeypatch):
+        spool.append(b"draining")
+        spool.close()
+        listed = spool.segments()
+        spool.replay(lambda batch: None)
+        monkeypatch.setattr(spool, "segments", lambda: listed)
+
+        assert spool.stats()["bytes"] == 0
+
+
+class TestSpoolDirectoryClaims:
+    """Test per-process spool directories"""
+
+    def test_claims_are_exclusive(self, tmp_path):
+        first_dir, first_lock = claim_spool_directory(str(tmp_path))
+        second_dir, second_lock = claim_spool_directory(str(tmp_path))
+
+        assert first_dir != second_dir
+
+        first_lock.close()
+        reclaimed_dir, reclaimed_lock = claim_spool_directory(str(tmp_path))
+        assert reclaimed_dir == first_dir
+
+        second_lock.close()
+        reclaimed_lock.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
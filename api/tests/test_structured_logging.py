@@ -0,0 +1,115 @@
+"""
+Unit tests for structured logging
+Run with: pytest tests/
+"""
+
+import json
+import logging
+import os
+import queue
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import structured_logging  # noqa: E402
+
+
+class CountingArg:
+    """Argument whose formatting can be observed"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __str__(self):
+        self.calls += 1
+        return "formatted"
+
+
+def make_record(msg="hello %s", args=("world",), **extra):
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, msg, args, None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+class TestJsonFormatter:
+    """Test JSON output"""
+
+    def test_formats_structured_fields(self):
+        record = make_record(event="published", fields={"tenant_id": "acme"})
+        entry = json.loads(structured_logging.JsonFormatter().format(record))
+
+        assert entry["severity"] == "INFO"
+        assert entry["message"] == "hello world"
+        assert entry["event"] == "published"
+        assert entry["tenant_id"] == "acme"
+
+    def test_includes_exception(self):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = make_record()
+            record.exc_info = sys.exc_info()
+
+        entry = json.loads(structured_logging.JsonFormatter().format(record))
+        assert "ValueError: boom" in entry["exception"]
+
+
+class TestNonBlockingQueueHandler:
+    """Test the caller-side handler"""
+
+    def test_does_not_format_in_caller(self):
+        arg = CountingArg()
+        handler = structured_logging.NonBlockingQueueHandler(queue.Queue())
+
+        handler.handle(make_record(args=(arg,)))
+
+        assert arg.calls == 0
+        assert handler.queue.get_nowait().getMessage() == "hello formatted"
+
+    def test_drops_when_queue_full(self):
+        handler = structured_logging.NonBlockingQueueHandler(queue.Queue(maxsize=1))
+        before = structured_logging.dropped_records()
+
+        handler.handle(make_record())
+        handler.handle(make_record())
+
+        assert structured_logging.dropped_records() == before + 1
+
+
+class TestLogEvent:
+    """Test level checks and per-event sampling"""
+
+    def test_sampled_out_events_build_no_record(self):
+        logger = logging.getLogger("test.sampled")
+        logger.setLevel(logging.INFO)
+        with patch.dict(structured_logging._sample_rates, {"noisy": 0.0}), patch.object(
+            logger, "log"
+        ) as mock_log:
+            structured_logging.log_event(logger, logging.INFO, "noisy", "msg")
+            structured_logging.log_event(logger, logging.INFO, "other", "msg", a=1)
+
+        mock_log.assert_called_once_with(
+            logging.INFO, "msg", extra={"event": "other", "fields": {"a": 1}}
+        )
+
+    def test_disabled_level_is_skipped(self):
+        logger = logging.getLogger("test.level")
+        logger.setLevel(logging.WARNING)
+        with patch.object(logger, "log") as mock_log:
+            structured_logging.log_event(logger, logging.INFO, "event", "msg")
+
+        mock_log.assert_not_called()
+
+    def test_parse_sample_rates(self):
+        assert structured_logging.parse_sample_rates("a=0.5, b=0") == {
+            "a": 0.5,
+            "b": 0.0,
+        }
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -4,7 +4,7 @@
  */
 
 terraform {
-  required_version = ">= 1.0"
+  required_version = ">= 1.2" # lifecycle preconditions
 
   required_providers {
     google = {
@@ -58,6 +58,10 @@ resource "google_pubsub_subscription" "data_ingestion_sub" {
   message_retention_duration = "604800s" # 7 days
   retain_acked_messages      = false
 
+  # Deliver messages sharing an ordering key in publish order
+  # (changing this recreates the subscription)
+  enable_message_ordering = var.enable_message_ordering
+
   expiration_policy {
     ttl = "" # Never expire
   }
@@ -76,11 +80,79 @@ resource "google_pubsub_subscription" "data_ingestion_sub" {
   depends_on = [google_project_service.required_apis]
 }
 
+# Tenant-affinity sharding (shard_count > 0): the API publishes to a separate
+# topic with a `shard` attribute (api/sharding.py), and each shard has its own
+# filtered subscription and worker service, so per-tenant state stays on one
+# instance group. A separate topic keeps data-ingestion-sub unfiltered: it
+# drains with the unsharded worker and never sees sharded messages
+locals {
+  routed_shard_count   = coalesce(var.routed_shard_count, var.shard_count)
+  sharded_topic_suffix = "-sharded" # sharding.SHARDED_TOPIC_SUFFIX
+  api_topic_name       = (
+    local.routed_shard_count > 0
+    ? one(google_pubsub_topic.data_ingestion_sharded[*].name)
+    : google_pubsub_topic.data_ingestion.name
+  )
+}
+
+resource "google_pubsub_topic" "data_ingestion_sharded" {
+  count = var.shard_count > 0 ? 1 : 0
+  name  = "${var.pubsub_topic_name}${local.sharded_topic_suffix}"
+
+  message_retention_duration = "604800s" # 7 days
+
+  depends_on = [google_project_service.required_apis]
+}
+
+resource "google_pubsub_subscription" "data_ingestion_shard" {
+  count = var.shard_count
+  name  = "${var.pubsub_subscription_name}-shard-${count.index}"
+  topic = google_pubsub_topic.data_ingestion_sharded[0].name
+
+  # Filters are immutable; rebalancing adds or removes whole shards
+  filter = "attributes.shard = \"${count.index}\""
+
+  ack_deadline_seconds       = 600
+  message_retention_duration = "604800s" # 7 days
+  retain_acked_messages      = false
+  enable_message_ordering    = var.enable_message_ordering
+
+  expiration_policy {
+    ttl = "" # Never expire
+  }
+
+  retry_policy {
+    minimum_backoff = "10s"
+    maximum_backoff = "600s"
+  }
+
+  dead_letter_policy {
+    dead_letter_topic     = google_pubsub_topic.data_ingestion_dlq.id
+    max_delivery_attempts = 20
+  }
+
+  depends_on = [google_project_service.required_apis]
+}
+
 # Pub/Sub Dead Letter Topic for failed messages
 resource "google_pubsub_topic" "data_ingestion_dlq" {
   name = "${var.pubsub_topic_name}-dlq" # "data-ingestion-dlq" by default
 }
 
+# Subscription that keeps dead-lettered messages for inspection and replay
+# (worker/dlq_replay.py); a topic without subscriptions discards messages
+resource "google_pubsub_subscription" "data_ingestion_dlq_sub" {
+  name  = "${var.pubsub_topic_name}-dlq-sub" # "data-ingestion-dlq-sub" by default
+  topic = google_pubsub_topic.data_ingestion_dlq.name
+
+  ack_deadline_seconds       = 600
+  message_retention_duration = "604800s" # 7 days
+
+  expiration_policy {
+    ttl = "" # Never expire
+  }
+}
+
 # Service Account for Cloud Run Services
 resource "google_service_account" "cloud_run_sa" {
   account_id   = "cloud-run-service-account"
@@ -149,7 +221,22 @@ resource "google_cloud_run_service" "api" {
 
         env {
           name  = "PUBSUB_TOPIC_ID"
-          value = google_pubsub_topic.data_ingestion.name
+          value = local.api_topic_name
+        }
+
+        env {
+          name  = "SHARD_COUNT"
+          value = tostring(local.routed_shard_count)
+        }
+
+        env {
+          name  = "ORDERING_MODE"
+          value = var.enable_message_ordering ? var.ordering_mode : "off"
+        }
+
+        env {
+          name  = "ORDERED_TENANTS"
+          value = var.ordered_tenants
         }
       }
 
@@ -186,6 +273,13 @@ resource "google_cloud_run_service" "api" {
       template[0].metadata[0].annotations["run.googleapis.com/client-name"],
       template[0].metadata[0].annotations["run.googleapis.com/client-version"],
     ]
+
+    # Routing to a shard without a subscription would drop its tenants, and
+    # with shard_count = 0 there is no sharded topic to publish to
+    precondition {
+      condition     = local.routed_shard_count <= var.shard_count
+      error_message = "routed_shard_count must not exceed shard_count."
+    }
   }
 }
 
@@ -217,6 +311,11 @@ resource "google_cloud_run_service" "worker" {
           name  = "PUBSUB_SUBSCRIPTION_ID"
           value = google_pubsub_subscription.data_ingestion_sub.name
         }
+
+        env {
+          name  = "DEAD_LETTER_TOPIC_ID"
+          value = google_pubsub_topic.data_ingestion_dlq.name
+        }
       }
 
       container_concurrency = 1
@@ -254,6 +353,88 @@ resource "google_cloud_run_service" "worker" {
   }
 }
 
+# Cloud Run Service - one worker per shard, bound by WORKER_SHARD to
+# <pubsub_subscription_name>-shard-<n>
+resource "google_cloud_run_service" "worker_shard" {
+  count    = var.shard_count
+  name     = "${var.worker_service_name}-shard-${count.index}"
+  location = var.region
+
+  template {
+    spec {
+      service_account_name = google_service_account.cloud_run_sa.email
+
+      containers {
+        image = "${var.region}-docker.pkg.dev/${var.project_id}/${var.artifact_registry_repository}/${var.worker_service_name}:latest"
+
+        resources {
+          limits = {
+            cpu    = var.worker_cpu
+            memory = var.worker_memory
+          }
+        }
+
+        env {
+          name  = "GCP_PROJECT_ID"
+          value = var.project_id
+        }
+
+        env {
+          name  = "PUBSUB_SUBSCRIPTION_ID"
+          value = var.pubsub_subscription_name
+        }
+
+        env {
+          name  = "WORKER_SHARD"
+          value = tostring(count.index)
+        }
+
+        env {
+          name  = "SHARD_COUNT"
+          value = tostring(local.routed_shard_count)
+        }
+
+        env {
+          name  = "DEAD_LETTER_TOPIC_ID"
+          value = google_pubsub_topic.data_ingestion_dlq.name
+        }
+      }
+
+      container_concurrency = 1
+      timeout_seconds       = 600
+    }
+
+    metadata {
+      annotations = {
+        "autoscaling.knative.dev/minScale"  = tostring(var.worker_shard_min_instances)
+        "autoscaling.knative.dev/maxScale"  = tostring(var.worker_shard_max_instances)
+        "run.googleapis.com/cpu-throttling" = "false"
+      }
+    }
+  }
+
+  traffic {
+    percent         = 100
+    latest_revision = true
+  }
+
+  autogenerate_revision_name = true
+
+  depends_on = [
+    google_project_service.required_apis,
+    google_pubsub_subscription.data_ingestion_shard,
+    google_artifact_registry_repository.docker_repo,
+  ]
+
+  lifecycle {
+    ignore_changes = [
+      template[0].spec[0].containers[0].image,
+      template[0].metadata[0].annotations["run.googleapis.com/client-name"],
+      template[0].metadata[0].annotations["run.googleapis.com/client-version"],
+    ]
+  }
+}
+
 # IAM policy to allow unauthenticated access to API (for testing)
 resource "google_cloud_run_service_iam_member" "api_public_access" {
   count    = var.enable_public_access ? 1 : 0
@@ -273,6 +454,20 @@ resource "google_firestore_database" "database" {
   depends_on = [google_project_service.required_apis]
 }
 
+# Archive index buckets (worker/compaction.py) are maps of up to ~20k log_ids
+# that are only read by document id. Without this exemption every map key gets
+# its own automatic index entries, which hit the per-document index entry
+# limit long before the bucket is full and make each merge write slower
+resource "google_firestore_field" "archive_index_entries" {
+  project    = var.project_id
+  database   = google_firestore_database.database.name
+  collection = "archive_index"
+  field      = "entries"
+
+  # Empty: no single-field indexes
+  index_config {}
+}
+
 # Service Account for GitHub Actions
 resource "google_service_account" "github_actions" {
   account_id   = "github-actions-deployer"
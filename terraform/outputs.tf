@@ -33,6 +33,21 @@ output "pubsub_subscription_id" {
   value       = google_pubsub_subscription.data_ingestion_sub.id
 }
 
+output "pubsub_shard_subscription_ids" {
+  description = "Full IDs of the per-shard subscriptions (empty unless shard_count > 0)"
+  value       = google_pubsub_subscription.data_ingestion_shard[*].id
+}
+
+output "worker_shard_service_names" {
+  description = "Names of the per-shard worker services"
+  value       = google_cloud_run_service.worker_shard[*].name
+}
+
+output "pubsub_dlq_subscription_id" {
+  description = "Full ID of the dead-letter subscription (used by dlq_replay.py)"
+  value       = google_pubsub_subscription.data_ingestion_dlq_sub.id
+}
+
 output "artifact_registry_repository_url" {
   description = "URL of the Artifact Registry repository"
   value       = "${var.region}-docker.pkg.dev/${var.project_id}/${google_artifact_registry_repository.docker_repo.name}"
@@ -108,4 +108,56 @@ variable "enable_public_access" {
   description = "Allow unauthenticated access to API (for testing)"
   type        = bool
   default     = true
-}
\ No newline at end of file
+}
+
+variable "enable_message_ordering" {
+  description = "Enable per-key ordered delivery on the ingestion subscription"
+  type        = bool
+  default     = false
+}
+
+variable "ordering_mode" {
+  description = "API ordering key: tenant or tenant_stream (used when ordering is enabled)"
+  type        = string
+  default     = "tenant"
+}
+
+variable "ordered_tenants" {
+  description = "Comma-separated tenant IDs that get ordered delivery, or * for all"
+  type        = string
+  default     = "*"
+}
+
+variable "shard_count" {
+  description = "Tenant-affinity shards: one filtered subscription and worker service each (0 disables)"
+  type        = number
+  default     = 0
+
+  validation {
+    condition     = var.shard_count >= 0 && floor(var.shard_count) == var.shard_count
+    error_message = "shard_count must be a whole number >= 0."
+  }
+}
+
+variable "routed_shard_count" {
+  description = "Shards the API routes tenants to; defaults to shard_count (set it separately while rebalancing, at most shard_count)"
+  type        = number
+  default     = null
+
+  validation {
+    condition     = var.routed_shard_count == null ? true : var.routed_shard_count >= 0
+    error_message = "routed_shard_count must be >= 0."
+  }
+}
+
+variable "worker_shard_min_instances" {
+  description = "Minimum number of instances per shard worker"
+  type        = number
+  default     = 1
+}
+
+variable "worker_shard_max_instances" {
+  description = "Maximum number of instances per shard worker"
+  type        = number
+  default     = 10
+}
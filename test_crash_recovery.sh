@@ -53,7 +53,7 @@ for i in {1..6}; do
     gcloud run services logs read data-processor-worker \
       --region=$REGION \
       --limit=10 \
-      --format="value(textPayload)" | grep -E "(Attempt|CRASH|Success)" | tail -5
+      --format="value(textPayload,jsonPayload.message)" | grep -E "(Attempt|CRASH|PASSED|Processed)" | tail -5
     echo ""
 done
 
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+Backfill: re-run redact_pii over stored processed_logs
+Scans every tenant (or one tenant, optionally within a processed_at range)
+page by page, redacts in a process pool and writes changed modified_data
+and structured fields back with batched writes. Progress is checkpointed
+after every page, so a rerun with the same checkpoint file resumes where the
+last one stopped
+
+Usage:
+    python backfill.py --dry-run --tenant acme
+    python backfill.py --workers 8 --checkpoint backfill.json
+    python backfill.py --tenant acme --processed-after 2024-01-01 --processed-before 2024-02-01
+"""
+
+import argparse
+import difflib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Tuple
+
+from google.api_core import exceptions as gcp_exceptions
+from google.cloud import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+from redaction import redact_pii, redact_structured
+
+# Firestore allows at most 500 writes per batch and 10 MiB per request
+FIRESTORE_MAX_BATCH_WRITES = 500
+MAX_BATCH_BYTES = 8 * 1024 * 1024
+
+READ_FIELDS = ["original_text", "modified_data", "processed_at", "chunked", "fields"]
+
+# (document path, original_text, modified_data, fields); original_text is
+# None for a chunked parent (its text is in the chunks), fields is None when
+# the document has no structured fields
+Record = Tuple[str, Optional[str], Optional[str], Optional[dict]]
+# (document path, stored values, re-redacted values) of the changed fields
+Change = Tuple[str, dict, dict]
+
+
+def redact_records(records: List[Record]) -> List[Change]:
+    """
+    Pool task: re-redact original_text, and the already redacted structured
+    fields (only the redacted copy is stored, so a stronger detector can
+    still catch what an older one missed)
+    Returns a Change for every changed document
+    """
+    changed = []
+    for path, original, modified, fields in records:
+        old, new = {}, {}
+        if original is not None:
+            redacted = redact_pii(original)
+            if redacted != modified:
+                old["modified_data"], new["modified_data"] = modified, redacted
+        if fields is not None:
+            redacted_fields = redact_structured(fields)
+            if redacted_fields != fields:
+                old["fields"], new["fields"] = fields, redacted_fields
+        if new:
+            changed.append((path, old, new))
+    return changed
+
+
+def iso_timestamp(value: str) -> str:
+    """
+    argparse type for --processed-after/--processed-before: render the bound
+    like the worker's processed_at (naive UTC isoformat) so the string range
+    filter compares correctly
+    """
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid ISO-8601 timestamp: {value!r}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.isoformat()
+
+
+def split(records: list, parts: int) -> List[list]:
+    """Split records into at most `parts` contiguous, similar-sized slices"""
+    size = max(1, -(-len(records) // max(1, parts)))
+    return [records[i : i + size] for i in range(0, len(records), size)]
+
+
+# ---- checkpoints ---------------------------------------------------------
+
+
+def load_checkpoint(path: Optional[str], filters: dict) -> dict:
+    state = {"filters": filters, "done": [], "tenant": None, "after": None}
+    if not path or not os.path.exists(path):
+        return state
+    with open(path) as f:
+        saved = json.load(f)
+    if saved.get("filters") != filters:
+        raise SystemExit(
+            f"Checkpoint {path} was written for {saved.get('filters')}, "
+            f"not {filters}; use another --checkpoint file"
+        )
+    return saved
+
+
+def save_checkpoint(path: Optional[str], state: dict):
+    if not path:
+        return
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+# ---- reads ---------------------------------------------------------------
+
+
+def list_tenants(db) -> List[str]:
+    # Tenant documents are never written, only their subcollections;
+    # list_documents() also returns these "missing" parents
+    return sorted(ref.id for ref in db.collection("tenants").list_documents())
+
+
+def fetch_page(
+    db,
+    tenant_id: str,
+    after: Optional[list],
+    page_size: int,
+    processed_after: Optional[str] = None,
+    processed_before: Optional[str] = None,
+):
+    """One page of processed_logs ordered by (processed_at, id), plus one extra"""
+    query = db.collection("tenants").document(tenant_id).collection("processed_logs")
+    if processed_after:
+        query = query.where(
+            filter=firestore.FieldFilter("processed_at", ">=", processed_after)
+        )
+    if processed_before:
+        query = query.where(
+            filter=firestore.FieldFilter("processed_at", "<", processed_before)
+        )
+    query = query.order_by("processed_at").order_by(FieldPath.document_id())
+    query = query.select(READ_FIELDS)
+    if after:
+        query = query.start_after({"processed_at": after[0], "__name__": after[1]})
+    return list(query.limit(page_size + 1).stream())
+
+
+def records_for(snapshots) -> List[Record]:
+    """Redaction inputs for a page; chunked logs contribute their chunks"""
+    records = []
+    for snapshot in snapshots:
+        data = snapshot.to_dict() or {}
+        if data.get("chunked"):
+            chunks = snapshot.reference.collection("chunks").order_by("index")
+            for chunk in chunks.stream():
+                chunk_data = chunk.to_dict() or {}
+                records.append(
+                    (
+                        chunk.reference.path,
+                        chunk_data.get("original_text") or "",
+                        chunk_data.get("modified_data") or "",
+                        None,
+                    )
+                )
+            if data.get("fields") is not None:
+                records.append((snapshot.reference.path, None, None, data["fields"]))
+        elif data.get("original_text") is not None or data.get("fields") is not None:
+            original = data.get("original_text")
+            records.append(
+                (
+                    snapshot.reference.path,
+                    original,
+                    None if original is None else data.get("modified_data") or "",
+                    data.get("fields"),
+                )
+            )
+    return records
+
+
+def iter_pages(db, tenants: List[str], state: dict, args) -> Iterator[tuple]:
+    """Yield (tenant_id, snapshots, next_after, tenant_done), resuming from state"""
+    for tenant_id in tenants:
+        if tenant_id in state["done"]:
+            continue
+        after = state["after"] if state["tenant"] == tenant_id else None
+        while True:
+            snapshots = fetch_page(
+                db,
+                tenant_id,
+                after,
+                args.page_size,
+                args.processed_after,
+                args.processed_before,
+            )
+            page = snapshots[: args.page_size]
+            if page:
+                last = page[-1].to_dict() or {}
+                after = [last.get("processed_at"), page[-1].id]
+            done = len(snapshots) <= args.page_size
+            yield tenant_id, page, after, done
+            if done:
+                break
+
+
+# ---- writes --------------------------------------------------------------
+
+
+def commit_updates(db, updates: List[tuple]) -> Tuple[int, int]:
+    """
+    Commit one batch of (ref, data) updates. A document deleted since it was
+    read (compaction, retention) fails the whole batch with NotFound; the
+    batch is then retried without the documents that no longer exist
+    Returns (written, gone)
+    """
+    gone = 0
+    while updates:
+        batch = db.batch()
+        for ref, data in updates:
+            batch.update(ref, data)
+        try:
+            batch.commit()
+            return len(updates), gone
+        except gcp_exceptions.NotFound:
+            refs = [ref for ref, _ in updates]
+            existing = {
+                snapshot.reference.path
+                for snapshot in db.get_all(refs, field_paths=[])
+                if snapshot.exists
+            }
+            remaining = [(ref, data) for ref, data in updates if ref.path in existing]
+            if len(remaining) == len(updates):
+                raise
+            gone += len(updates) - len(remaining)
+            updates = remaining
+    return 0, gone
+
+
+def write_changes(db, changes: List[Change]) -> Tuple[int, int]:
+    """
+    Batched updates of the changed modified_data/fields
+    Returns (written, gone): documents written, and documents skipped because
+    they were deleted after being read
+    """
+    backfilled_at = datetime.utcnow().isoformat()
+    updates, size, written, gone = [], 0, 0, 0
+    for path, _, new in changes:
+        updates.append(
+            (db.document(path), {**new, "redaction_backfilled_at": backfilled_at})
+        )
+        size += len(json.dumps(new, ensure_ascii=False).encode("utf-8"))
+        if len(updates) >= FIRESTORE_MAX_BATCH_WRITES or size >= MAX_BATCH_BYTES:
+            batch_written, batch_gone = commit_updates(db, updates)
+            written, gone = written + batch_written, gone + batch_gone
+            updates, size = [], 0
+    if updates:
+        batch_written, batch_gone = commit_updates(db, updates)
+        written, gone = written + batch_written, gone + batch_gone
+    return written, gone
+
+
+def diff_lines(value) -> List[str]:
+    if isinstance(value, str):
+        return value.splitlines()
+    return json.dumps(value, indent=2, sort_keys=True, ensure_ascii=False).splitlines()
+
+
+def print_diff(path: str, old: dict, new: dict, out=sys.stdout):
+    for name in new:
+        label = path if name == "modified_data" else f"{path} [{name}]"
+        diff = difflib.unified_diff(
+            diff_lines(old[name]),
+            diff_lines(new[name]),
+            fromfile=f"{label} (stored)",
+            tofile=f"{label} (re-redacted)",
+            lineterm="",
+        )
+        print("\n".join(diff), file=out)
+
+
+# ---- report --------------------------------------------------------------
+
+
+class Throughput:
+    """Running totals per tenant and overall"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.tenants = defaultdict(lambda: defaultdict(int))
+
+    def add(self, tenant_id: str, **counts):
+        for name, value in counts.items():
+            self.tenants[tenant_id][name] += value
+
+    def total(self, name: str) -> int:
+        return sum(counts[name] for counts in self.tenants.values())
+
+    def line(self) -> str:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        scanned = self.total("scanned")
+        return (
+            f"scanned={scanned} changed={self.total('changed')} "
+            f"written={self.total('written')} gone={self.total('gone')} "
+            f"elapsed={elapsed:.1f}s {scanned / elapsed:.1f} docs/s "
+            f"{self.total('characters') / elapsed / 1e6:.2f} Mchars/s"
+        )
+
+    def report(self, out=sys.stdout):
+        print("=" * 70, file=out)
+        print("🧹 BACKFILL REPORT", file=out)
+        print("=" * 70, file=out)
+        print(
+            f"{'tenant':<24} {'scanned':>9} {'changed':>9} {'written':>9} "
+            f"{'gone':>9}",
+            file=out,
+        )
+        for tenant_id, counts in sorted(self.tenants.items()):
+            print(
+                f"{tenant_id:<24} {counts['scanned']:>9} "
+                f"{counts['changed']:>9} {counts['written']:>9} {counts['gone']:>9}",
+                file=out,
+            )
+        print(self.line(), file=out)
+
+
+# ---- driver --------------------------------------------------------------
+
+
+def run_backfill(db, args, executor, out=sys.stdout) -> Throughput:
+    """
+    Pipeline: while the pool redacts page N, page N+1 is read from Firestore;
+    page N is then written and checkpointed before page N+1 is handed over
+    """
+    filters = {
+        "tenant": args.tenant,
+        "processed_after": args.processed_after,
+        "processed_before": args.processed_before,
+    }
+    state = load_checkpoint(args.checkpoint, filters)
+    tenants = [args.tenant] if args.tenant else list_tenants(db)
+    stats = Throughput()
+    diffs_shown = 0
+    last_report = time.perf_counter()
+
+    def finish(tenant_id, records, futures, after, done):
+        nonlocal diffs_shown, last_report
+        changes = [change for future in futures for change in future.result()]
+        if args.dry_run:
+            for path, old, new in changes:
+                if diffs_shown < args.diff_limit:
+                    print_diff(path, old, new, out)
+                    diffs_shown += 1
+            written = gone = 0
+        else:
+            written, gone = write_changes(db, changes)
+        stats.add(
+            tenant_id,
+            scanned=len(records),
+            changed=len(changes),
+            written=written,
+            gone=gone,
+            characters=sum(len(record[1] or "") for record in records),
+        )
+        if not args.dry_run:
+            state["tenant"], state["after"] = tenant_id, after
+            if done:
+                state["done"].append(tenant_id)
+                state["tenant"], state["after"] = None, None
+            save_checkpoint(args.checkpoint, state)
+        if time.perf_counter() - last_report >= args.report_every:
+            print(f"[{tenant_id}] {stats.line()}", file=out)
+            last_report = time.perf_counter()
+
+    pending = None
+    for tenant_id, page, after, done in iter_pages(db, tenants, state, args):
+        records = records_for(page)
+        futures = [
+            executor.submit(redact_records, part)
+            for part in split(records, args.workers)
+        ]
+        if pending:
+            finish(*pending)
+        pending = (tenant_id, records, futures, after, done)
+    if pending:
+        finish(*pending)
+
+    return stats
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--project", default=os.getenv("GCP_PROJECT_ID"))
+    parser.add_argument("--tenant", help="Only this tenant (default: all)")
+    parser.add_argument(
+        "--processed-after", type=iso_timestamp, help="ISO timestamp, inclusive"
+    )
+    parser.add_argument(
+        "--processed-before", type=iso_timestamp, help="ISO timestamp, exclusive"
+    )
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--checkpoint", help="JSON file to resume from and record progress in"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Print diffs, write nothing"
+    )
+    parser.add_argument("--diff-limit", type=int, default=20)
+    parser.add_argument(
+        "--report-every", type=float, default=10, help="Progress line interval (s)"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    db = firestore.Client(project=args.project)
+    # spawn: pool processes must not inherit the Firestore client's gRPC state
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context) as pool:
+        stats = run_backfill(db, args, pool)
+    stats.report()
+
+
+if __name__ == "__main__":
+    main()
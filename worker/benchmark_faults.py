@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Throughput under failure for each fault profile (see faults.py)
+Drives process_message through an in-memory Pub/Sub simulation: an open-loop
+producer publishes through FaultyPublisher (retrying failed publishes), the
+subscription redelivers nacked messages and messages whose ack was lost,
+and Firestore writes go through the "store" faults. Faults are only active
+between --fault-start and --fault-start + --fault-duration
+
+Reports per profile:
+- goodput: unique messages acknowledged per second
+- amplification: deliveries and publish attempts per unique message
+- p50/p99: publish start to first successful ack
+- recovery: time from the end of the fault window until the backlog of
+  unacknowledged messages is back to its pre-fault peak
+
+Usage:
+    python benchmark_faults.py --profiles none flaky_store lost_acks
+    python benchmark_faults.py --rate 500 --duration 6 --fault-start 2
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import faults
+
+# Injected failures are logged per message; keep them out of the output
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+
+# Mock GCP clients BEFORE importing main (no credentials needed)
+with patch("google.cloud.firestore.Client", return_value=MagicMock()), patch(
+    "google.cloud.pubsub_v1.SubscriberClient", return_value=MagicMock()
+):
+    import main
+
+STORE_FUNCTIONS = (main.store_in_firestore, main.store_chunked_in_firestore)
+
+
+class StubDocument:
+    """Firestore document/collection chain whose writes just take store_ms"""
+
+    def __init__(self, store_seconds: float):
+        self.store_seconds = store_seconds
+
+    def collection(self, name):
+        return self
+
+    def document(self, name):
+        return self
+
+    def set(self, data):
+        time.sleep(self.store_seconds)
+
+
+class SimulatedSubscription:
+    """
+    At-least-once delivery onto a thread pool (like streaming pull):
+    nacked messages come back after redelivery_seconds, messages neither
+    acked nor nacked come back after ack_deadline_seconds
+    """
+
+    def __init__(self, callback, threads, redelivery_seconds, ack_deadline_seconds):
+        self.callback = callback
+        self.redelivery_seconds = redelivery_seconds
+        self.ack_deadline_seconds = ack_deadline_seconds
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+        self.deliveries = 0
+        self.acked = {}
+        self._lock = threading.Lock()
+        self._timers = []
+        self._sequence = itertools.count()
+        self._wakeup = threading.Condition(self._lock)
+        self._stopped = False
+        self._scheduler = threading.Thread(target=self._run_timers, daemon=True)
+        self._scheduler.start()
+
+    def publish(self, log_id: str, data: bytes):
+        self._deliver(log_id, data, 1)
+
+    def _deliver(self, log_id: str, data: bytes, attempt: int):
+        with self._lock:
+            if self._stopped:
+                return
+            self.deliveries += 1
+        self.pool.submit(self._dispatch, SimulatedMessage(self, log_id, data, attempt))
+
+    def _dispatch(self, message):
+        self.callback(message)
+        if message.outcome is None:
+            self._schedule(self.ack_deadline_seconds, message)
+
+    def _schedule(self, delay: float, message):
+        with self._lock:
+            heapq.heappush(
+                self._timers,
+                (time.monotonic() + delay, next(self._sequence), message),
+            )
+            self._wakeup.notify()
+
+    def _run_timers(self):
+        with self._lock:
+            while not self._stopped:
+                if not self._timers:
+                    self._wakeup.wait()
+                    continue
+                due, _, message = self._timers[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._wakeup.wait(wait)
+                    continue
+                heapq.heappop(self._timers)
+                self._lock.release()
+                try:
+                    self._deliver(
+                        message.log_id, message.data, message.delivery_attempt + 1
+                    )
+                finally:
+                    self._lock.acquire()
+
+    def ack(self, message):
+        with self._lock:
+            self.acked.setdefault(message.log_id, time.monotonic())
+
+    def nack(self, message):
+        self._schedule(self.redelivery_seconds, message)
+
+    def stop(self):
+        with self._lock:
+            self._stopped = True
+            self._wakeup.notify()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class SimulatedMessage:
+    """Just enough of a Pub/Sub message for process_message"""
+
+    ordering_key = ""
+
+    def __init__(self, subscription, log_id: str, data: bytes, attempt: int):
+        self.subscription = subscription
+        self.log_id = log_id
+        self.message_id = log_id
+        self.data = data
+        self.delivery_attempt = attempt
+        self.outcome = None
+
+    def ack(self):
+        self.outcome = "ack"
+        self.subscription.ack(self)
+
+    def nack(self):
+        self.outcome = "nack"
+        self.subscription.nack(self)
+
+
+class SimulatedPublisher:
+    """PublisherClient stand-in that delivers straight into the subscription"""
+
+    def __init__(self, subscription):
+        self.subscription = subscription
+
+    def publish(self, topic, data, log_id=None, **attributes):
+        self.subscription.publish(log_id, data)
+        future = Future()
+        future.set_result(log_id)
+        return future
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def recovery_time(samples, fault_start: float, fault_end: float):
+    """
+    Seconds after fault_end until the backlog is back to its pre-fault peak
+    samples: [(elapsed_seconds, backlog)]; None if it never recovered
+    """
+    baseline = max((b for t, b in samples if t < fault_start), default=0)
+    for elapsed, backlog in samples:
+        if elapsed >= fault_end and backlog <= baseline:
+            return elapsed - fault_end
+    return None
+
+
+def run_profile(profile: str, args) -> dict:
+    """Run one fault profile through the simulation and summarize it"""
+    injector = faults.FaultInjector(faults.parse_profile(profile), seed=args.seed)
+    injector.active = False
+    subscription = SimulatedSubscription(
+        injector.wrap_callback(main.callback),
+        args.threads,
+        args.redelivery_ms / 1000,
+        args.ack_deadline_ms / 1000,
+    )
+    publisher = faults.FaultyPublisher(SimulatedPublisher(subscription), injector)
+    main.db = StubDocument(args.store_ms / 1000)
+    main.store_in_firestore, main.store_chunked_in_firestore = (
+        injector.wrap("store", fn) for fn in STORE_FUNCTIONS
+    )
+    main.simulate_heavy_processing = lambda text: time.sleep(args.work_ms / 1000)
+
+    total = int(args.rate * args.duration)
+    published = {}
+    publish_attempts = [0]
+    attempts_lock = threading.Lock()
+    stopped = threading.Event()
+
+    def publish_with_retry(index: int):
+        log_id = f"log_{index:07d}"
+        data = json.dumps(
+            {"tenant_id": "bench", "log_id": log_id, "text": "x" * 64}
+        ).encode("utf-8")
+        published[log_id] = time.monotonic()
+        while not stopped.is_set():
+            with attempts_lock:
+                publish_attempts[0] += 1
+            try:
+                publisher.publish("topic", data, log_id=log_id).result(
+                    timeout=args.publish_timeout_ms / 1000
+                )
+                return
+            except Exception:
+                time.sleep(args.publish_retry_ms / 1000)
+
+    producers = ThreadPoolExecutor(max_workers=args.threads)
+    samples = []
+    start = time.monotonic()
+    deadline = start + args.duration + args.drain_timeout
+    fault_start, fault_end = args.fault_start, args.fault_start + args.fault_duration
+    next_index = 0
+    while time.monotonic() < deadline:
+        elapsed = time.monotonic() - start
+        injector.active = fault_start <= elapsed < fault_end
+        due = min(total, int(elapsed * args.rate))
+        for index in range(next_index, due):
+            producers.submit(publish_with_retry, index)
+        next_index = due
+        acked = len(subscription.acked)
+        samples.append((elapsed, next_index - acked))
+        if next_index == total and acked == total:
+            break
+        time.sleep(0.01)
+    finished = time.monotonic()
+    stopped.set()
+    subscription.stop()
+    producers.shutdown(wait=False, cancel_futures=True)
+
+    acked = dict(subscription.acked)
+    latencies = [
+        (acked_at - published[log_id]) * 1000
+        for log_id, acked_at in acked.items()
+        if log_id in published
+    ]
+    last_ack = max(acked.values(), default=finished)
+    return {
+        "profile": profile,
+        "messages": total,
+        "acked": len(acked),
+        "goodput": len(acked) / max(last_ack - start, 1e-9),
+        "deliveries_per_message": subscription.deliveries / max(len(acked), 1),
+        "publishes_per_message": publish_attempts[0] / max(total, 1),
+        "p50_ms": percentile(latencies, 0.5),
+        "p99_ms": percentile(latencies, 0.99),
+        "recovery_seconds": recovery_time(samples, fault_start, fault_end),
+        "faults": injector.stats()["targets"],
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--profiles",
+        nargs="+",
+        default=list(faults.PROFILES),
+        help="Preset names or JSON fault profiles",
+    )
+    parser.add_argument("--rate", type=float, default=200, help="Messages/sec")
+    parser.add_argument("--duration", type=float, default=4, help="Seconds")
+    parser.add_argument("--fault-start", type=float, default=1)
+    parser.add_argument("--fault-duration", type=float, default=2)
+    parser.add_argument(
+        "--threads", type=int, default=100, help="Matches FlowControl.max_messages"
+    )
+    parser.add_argument("--work-ms", type=float, default=5)
+    parser.add_argument("--store-ms", type=float, default=2)
+    parser.add_argument("--redelivery-ms", type=float, default=100)
+    parser.add_argument("--ack-deadline-ms", type=float, default=1000)
+    parser.add_argument("--publish-timeout-ms", type=float, default=500)
+    parser.add_argument("--publish-retry-ms", type=float, default=100)
+    parser.add_argument("--drain-timeout", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print JSON results")
+    return parser.parse_args(argv)
+
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    results = []
+    if not args.json:
+        print("=" * 86)
+        print("💥 WORKER GOODPUT UNDER FAULTS")
+        print(
+            f"   {args.rate:g} msg/s for {args.duration:g}s, faults active "
+            f"{args.fault_start:g}s-{args.fault_start + args.fault_duration:g}s"
+        )
+        print("=" * 86)
+        print(
+            f"{'profile':<18} {'goodput/s':>10} {'acked':>11} {'deliv/msg':>10} "
+            f"{'pub/msg':>8} {'p50 ms':>8} {'p99 ms':>8} {'recovery':>9}"
+        )
+    for profile in args.profiles:
+        result = run_profile(profile, args)
+        results.append(result)
+        if args.json:
+            continue
+        recovery = result["recovery_seconds"]
+        print(
+            f"{profile[:18]:<18} {result['goodput']:>10.1f} "
+            f"{result['acked']:>5}/{result['messages']:<5} "
+            f"{result['deliveries_per_message']:>10.2f} "
+            f"{result['publishes_per_message']:>8.2f} "
+            f"{result['p50_ms']:>8.1f} {result['p99_ms']:>8.1f} "
+            f"{'never' if recovery is None else f'{recovery:.2f}s':>9}"
+        )
+    if args.json:
+        print(json.dumps(results, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Threads vs. asyncio I/O core throughput for I/O-bound messages
+Feeds synthetic messages through process_message (a thread pool sized like
+flow control) and through AsyncCore (one event loop), with Firestore writes
+and simulate_heavy_processing replaced by sleeps of the given length
+
+Usage:
+    python benchmark_io_modes.py --messages 5000 --store-ms 50 --threads 100
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+# Mock GCP clients BEFORE importing main (no credentials needed)
+with patch("google.cloud.firestore.Client", return_value=MagicMock()), patch(
+    "google.cloud.pubsub_v1.SubscriberClient", return_value=MagicMock()
+):
+    import main
+
+
+class StubMessage:
+    """Just enough of a Pub/Sub message; counts acks"""
+
+    message_id = "bench"
+    delivery_attempt = 1
+    ordering_key = ""
+
+    def __init__(self, data: bytes, done: threading.Semaphore):
+        self.data = data
+        self._done = done
+
+    def ack(self):
+        self._done.release()
+
+    def nack(self):
+        raise RuntimeError("process_message failed during benchmark")
+
+
+def run_threads(messages, store_seconds, work_seconds, threads):
+    main.store_in_firestore = lambda *args: time.sleep(store_seconds)
+    main.simulate_heavy_processing = lambda text: time.sleep(work_seconds)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for message in messages:
+            pool.submit(main.process_message, message)
+    return time.perf_counter() - start
+
+
+def run_async(messages, store_seconds, work_seconds, done):
+    """messages must ack into done"""
+
+    async def store(*args):
+        await asyncio.sleep(store_seconds)
+
+    async def work(text):
+        await asyncio.sleep(work_seconds)
+
+    main.store_in_firestore_async = store
+    main.simulate_heavy_processing_async = work
+    main.async_db = MagicMock()
+    core = main.AsyncCore()
+    core.start()
+    start = time.perf_counter()
+    for message in messages:
+        core.submit(message)
+    for _ in messages:
+        done.acquire()
+    elapsed = time.perf_counter() - start
+    core.stop()
+    return elapsed
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--store-ms", type=float, default=50)
+    parser.add_argument("--work-ms", type=float, default=10)
+    parser.add_argument(
+        "--threads", type=int, default=100, help="Matches FlowControl.max_messages"
+    )
+    args = parser.parse_args()
+
+    data = json.dumps(
+        {"tenant_id": "acme", "log_id": "bench", "text": "Call 555-0199 " * 8}
+    ).encode("utf-8")
+    done = threading.Semaphore(0)
+    store_seconds, work_seconds = args.store_ms / 1000, args.work_ms / 1000
+
+    print("=" * 70)
+    print("⚡ THREADS vs ASYNC I/O CORE")
+    print(
+        f"   {args.messages} messages, {args.store_ms:g}ms store, {args.work_ms:g}ms work"
+    )
+    print("=" * 70)
+    messages = [StubMessage(data, threading.Semaphore(0)) for _ in range(args.messages)]
+    threaded = run_threads(messages, store_seconds, work_seconds, args.threads)
+    print(f"threads ({args.threads:>4}): {args.messages / threaded:>10.1f} msg/s")
+    messages = [StubMessage(data, done) for _ in range(args.messages)]
+    asynced = run_async(messages, store_seconds, work_seconds, done)
+    print(f"async (1 loop): {args.messages / asynced:>10.1f} msg/s")
+    print(f"speedup:        {threaded / asynced:>10.2f}x")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the worker hot paths
+redact_pii across text sizes and PII densities, chunked redaction, and
+process_message with stub clients and simulate_heavy_processing disabled
+
+Usage:
+    python benchmark_micro.py --save               # write .benchmarks/baseline.json
+    python benchmark_micro.py --compare            # exit 1 on a >1.5x regression
+    python benchmark_micro.py --compare --gate 'redact_pii*' -k 'redact*'
+"""
+
+import json
+import os
+import random
+import sys
+from unittest.mock import MagicMock, patch
+
+import microbench
+from redaction import iter_windows, redact_pii, redact_pii_chunked
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Keep the per-message summary records out of the measurements and the output
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+# Mock GCP clients BEFORE importing main (no credentials needed)
+with patch("google.cloud.firestore.Client", return_value=MagicMock()), patch(
+    "google.cloud.pubsub_v1.SubscriberClient", return_value=MagicMock()
+):
+    import main
+
+WORDS = "user accessed the system from ip 192.168.1.1 at login portal ok".split()
+PHONES = ["555-0199", "555-123-4567", "(555) 123-4567", "+1 555 123 4567"]
+SIZES = {"1k": 1_000, "64k": 64_000, "1m": 1_000_000}
+# Average characters between phone numbers (None = no PII)
+DENSITIES = {"none": None, "low": 1_000, "high": 40}
+
+
+def make_text(size: int, every, seed: int = 0) -> str:
+    """Deterministic text of ~size characters with a phone number every ~N chars"""
+    rng = random.Random(seed)
+    parts, length, next_phone = [], 0, every or size + 1
+    while length < size:
+        if every and length >= next_phone:
+            token = rng.choice(PHONES)
+            next_phone += every
+        else:
+            token = rng.choice(WORDS)
+        parts.append(token)
+        length += len(token) + 1
+    return " ".join(parts)[:size]
+
+
+# ---- redaction -----------------------------------------------------------
+
+for size_label, size in SIZES.items():
+    for density_label, every in DENSITIES.items():
+        text = make_text(size, every)
+        microbench.register(
+            f"redact_pii[{size_label},{density_label}]", lambda t=text: redact_pii(t)
+        )
+
+large_text = make_text(SIZES["1m"], DENSITIES["low"])
+microbench.register(
+    "redact_pii_chunked[1m,low]",
+    lambda: sum(1 for _ in redact_pii_chunked(iter_windows(large_text))),
+)
+
+# ---- process_message -----------------------------------------------------
+
+
+class StubMessage:
+    """Just enough of a Pub/Sub message; MagicMock would dominate the timings"""
+
+    message_id = "bench"
+    delivery_attempt = 1
+    ordering_key = ""
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def ack(self):
+        pass
+
+    def nack(self):
+        raise RuntimeError("process_message failed during benchmark")
+
+
+main.simulate_heavy_processing = lambda text: None
+main.store_in_firestore = lambda tenant_id, log_id, data: True
+
+for size_label in ("1k", "64k"):
+    payload = json.dumps(
+        {
+            "tenant_id": "acme",
+            "log_id": "bench",
+            "text": make_text(SIZES[size_label], DENSITIES["low"]),
+            "source": "json_upload",
+            "ingested_at": "2024-01-01T00:00:00",
+        }
+    ).encode("utf-8")
+    microbench.register(
+        f"process_message[{size_label}]",
+        lambda p=payload: main.process_message(StubMessage(p)),
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(
+        microbench.main(
+            "Worker microbenchmarks",
+            os.path.join(HERE, ".benchmarks", "baseline.json"),
+        )
+    )
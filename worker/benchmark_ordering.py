@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Ordered vs. unordered processing throughput for the worker
+Feeds synthetic messages through the same callback path the subscriber uses
+(a thread pool sized like flow control) with and without per-key ordering
+
+Usage:
+    python benchmark_ordering.py --messages 2000 --keys 1 10 100 --work-ms 5
+"""
+
+import argparse
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+# Mock GCP clients BEFORE importing main (no credentials needed)
+with patch("google.cloud.firestore.Client", return_value=MagicMock()), patch(
+    "google.cloud.pubsub_v1.SubscriberClient", return_value=MagicMock()
+):
+    from main import KeySequencer
+
+
+def run(messages: int, keys: int, work_ms: float, threads: int, ordered: bool):
+    """Returns (messages/sec, per-key order preserved)"""
+    sequencer = KeySequencer()
+    seen = defaultdict(list)
+
+    def work(key, seq):
+        time.sleep(work_ms / 1000)
+        seen[key].append(seq)
+
+    def callback(key, seq):
+        if ordered:
+            sequencer.run(key, work, key, seq)
+        else:
+            work(key, seq)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for seq in range(messages):
+            key = f"tenant_{seq % keys}"
+            pool.submit(callback, key, seq)
+    elapsed = time.perf_counter() - start
+
+    in_order = all(values == sorted(values) for values in seen.values())
+    return messages / elapsed, in_order
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--keys", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--work-ms", type=float, default=5)
+    parser.add_argument(
+        "--threads", type=int, default=100, help="Matches FlowControl.max_messages"
+    )
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("🔀 ORDERED vs UNORDERED WORKER THROUGHPUT")
+    print("=" * 70)
+    print(
+        f"{'keys':>6} {'unordered msg/s':>16} {'ordered msg/s':>14} "
+        f"{'ratio':>7} {'in order':>9}"
+    )
+    for keys in args.keys:
+        unordered, _ = run(args.messages, keys, args.work_ms, args.threads, False)
+        ordered, in_order = run(args.messages, keys, args.work_ms, args.threads, True)
+        print(
+            f"{keys:>6} {unordered:>16.1f} {ordered:>14.1f} "
+            f"{ordered / unordered:>6.2f}x {str(in_order):>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
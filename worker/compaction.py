@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Compaction: roll old processed_logs into compressed daily archive segments
+Logs processed before --older-than-days are read per tenant in
+(processed_at, id) order, packed per day into append-only segments with
+their index entries (see archive.py) and then deleted in batches. Chunked
+logs are left in place. With --retention-days, segments for days past the
+retention period are deleted together with their index entries
+
+Usage:
+    python compaction.py --dry-run --older-than-days 30
+    python compaction.py --tenant acme --older-than-days 30
+    python compaction.py --older-than-days 30 --retention-days 365
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+import archive
+from backfill import FIRESTORE_MAX_BATCH_WRITES, list_tenants
+from google.cloud import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+
+
+def cutoff(days: float, now: Optional[datetime] = None) -> str:
+    """Bound in the worker's processed_at format (naive UTC isoformat)"""
+    return ((now or datetime.utcnow()) - timedelta(days=days)).isoformat()
+
+
+def tenant_collection(db, tenant_id: str, name: str):
+    return db.collection("tenants").document(tenant_id).collection(name)
+
+
+# ---- reads ---------------------------------------------------------------
+
+
+def fetch_page(db, tenant_id: str, before: str, after: Optional[list], size: int):
+    """One page of processed_logs older than `before`, plus one extra"""
+    query = tenant_collection(db, tenant_id, "processed_logs").where(
+        filter=firestore.FieldFilter("processed_at", "<", before)
+    )
+    query = query.order_by("processed_at").order_by(FieldPath.document_id())
+    if after:
+        query = query.start_after({"processed_at": after[0], "__name__": after[1]})
+    return list(query.limit(size + 1).stream())
+
+
+def to_record(snapshot) -> Optional[dict]:
+    """Archive record for a stored log; None for chunked logs (kept as is)"""
+    data = snapshot.to_dict() or {}
+    if data.get("chunked") or not isinstance(data.get("processed_at"), str):
+        return None
+    return {**data, "log_id": snapshot.id}
+
+
+def pack_segments(records: List[dict]) -> Tuple[List[tuple], List[dict]]:
+    """
+    Split one day's records into (records, encoded) segments that fit a
+    document; returns (segments, oversized records that fit nowhere)
+    """
+    if not records:
+        return [], []
+    if len(records) > archive.SEGMENT_MAX_RECORDS:
+        middle = archive.SEGMENT_MAX_RECORDS
+    else:
+        data = archive.encode_records(records)
+        if len(data) <= archive.SEGMENT_MAX_BYTES:
+            return [(records, data)], []
+        if len(records) == 1:
+            return [], records
+        middle = len(records) // 2
+    head, head_oversized = pack_segments(records[:middle])
+    tail, tail_oversized = pack_segments(records[middle:])
+    return head + tail, head_oversized + tail_oversized
+
+
+# ---- writes --------------------------------------------------------------
+
+
+def write_segment(db, tenant_id: str, day: str, records: List[dict], data: bytes):
+    """Segment and index entries in one batch; returns the segment id"""
+    log_ids = [r["log_id"] for r in records]
+    segment = archive.segment_id(day, log_ids)
+    buckets = defaultdict(dict)
+    for log_id in log_ids:
+        buckets[archive.index_bucket(log_id)][log_id] = segment
+
+    batch = db.batch()
+    batch.set(
+        tenant_collection(db, tenant_id, archive.ARCHIVES_COLLECTION).document(segment),
+        {
+            "day": day,
+            "codec": archive.CODEC,
+            "data": data,
+            "record_count": len(records),
+            "compressed_bytes": len(data),
+            "first_processed_at": records[0]["processed_at"],
+            "last_processed_at": records[-1]["processed_at"],
+            "compacted_at": datetime.utcnow().isoformat(),
+        },
+    )
+    index = tenant_collection(db, tenant_id, archive.INDEX_COLLECTION)
+    for bucket, entries in buckets.items():
+        batch.set(index.document(bucket), {"entries": entries}, merge=True)
+    batch.commit()
+    return segment
+
+
+def delete_documents(db, refs: list) -> int:
+    batch, pending = db.batch(), 0
+    for ref in refs:
+        batch.delete(ref)
+        pending += 1
+        if pending >= FIRESTORE_MAX_BATCH_WRITES:
+            batch.commit()
+            batch, pending = db.batch(), 0
+    if pending:
+        batch.commit()
+    return len(refs)
+
+
+def expire_segments(db, tenant_id: str, before_day: str, dry_run: bool) -> int:
+    """
+    Delete segments for days before before_day; index entries go first and
+    only where they still point at the segment (a log may be re-archived)
+    """
+    archives = tenant_collection(db, tenant_id, archive.ARCHIVES_COLLECTION)
+    index = tenant_collection(db, tenant_id, archive.INDEX_COLLECTION)
+    query = archives.where(filter=firestore.FieldFilter("day", "<", before_day))
+    expired = 0
+    for snapshot in query.stream():
+        expired += 1
+        if dry_run:
+            continue
+        buckets = defaultdict(list)
+        for record in archive.decode_records(snapshot.get("data")):
+            buckets[archive.index_bucket(record["log_id"])].append(record["log_id"])
+        batch = db.batch()
+        for bucket, log_ids in buckets.items():
+            # Only this segment's entries, not the whole (up to ~1 MiB) bucket
+            paths = [FieldPath("entries", log_id).to_api_repr() for log_id in log_ids]
+            current = index.document(bucket).get(field_paths=paths)
+            entries = (current.to_dict() or {}).get("entries", {})
+            stale = {
+                FieldPath("entries", log_id).to_api_repr(): firestore.DELETE_FIELD
+                for log_id in log_ids
+                if entries.get(log_id) == snapshot.id
+            }
+            if stale:
+                batch.update(index.document(bucket), stale)
+        batch.delete(snapshot.reference)
+        batch.commit()
+    return expired
+
+
+# ---- report --------------------------------------------------------------
+
+
+class Report:
+    """Totals per tenant"""
+
+    FIELDS = ("scanned", "archived", "segments", "deleted", "skipped", "expired")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.tenants = defaultdict(lambda: defaultdict(int))
+
+    def add(self, tenant_id: str, **counts):
+        for name, value in counts.items():
+            self.tenants[tenant_id][name] += value
+
+    def total(self, name: str) -> int:
+        return sum(counts[name] for counts in self.tenants.values())
+
+    def line(self) -> str:
+        raw, packed = self.total("raw_bytes"), self.total("compressed_bytes")
+        return (
+            " ".join(f"{name}={self.total(name)}" for name in self.FIELDS)
+            + f" ratio={raw / max(packed, 1):.1f}x"
+            + f" elapsed={time.perf_counter() - self.started:.1f}s"
+        )
+
+    def report(self, out=sys.stdout):
+        print("=" * 78, file=out)
+        print("🗜️ COMPACTION REPORT", file=out)
+        print("=" * 78, file=out)
+        print(f"{'tenant':<24}" + "".join(f"{n:>9}" for n in self.FIELDS), file=out)
+        for tenant_id, counts in sorted(self.tenants.items()):
+            print(
+                f"{tenant_id:<24}" + "".join(f"{counts[n]:>9}" for n in self.FIELDS),
+                file=out,
+            )
+        print(self.line(), file=out)
+
+
+# ---- driver --------------------------------------------------------------
+
+
+def compact_tenant(db, tenant_id: str, before: str, args, report: Report):
+    """Archive one tenant's old logs, one day's worth of segments at a time"""
+    pending, refs, day, after = [], [], None, None
+
+    def flush():
+        segments, oversized = pack_segments(pending)
+        archived = {r["log_id"] for records, _ in segments for r in records}
+        for records, data in segments:
+            if not args.dry_run:
+                write_segment(db, tenant_id, day, records, data)
+            report.add(
+                tenant_id,
+                segments=1,
+                archived=len(records),
+                raw_bytes=sum(len(json.dumps(r, default=str)) for r in records),
+                compressed_bytes=len(data),
+            )
+        deletable = [ref for ref in refs if ref.id in archived]
+        deleted = 0 if args.dry_run else delete_documents(db, deletable)
+        report.add(tenant_id, deleted=deleted, skipped=len(oversized))
+        pending.clear()
+        refs.clear()
+
+    while True:
+        snapshots = fetch_page(db, tenant_id, before, after, args.page_size)
+        page = snapshots[: args.page_size]
+        for snapshot in page:
+            record = to_record(snapshot)
+            if record is None:
+                report.add(tenant_id, skipped=1)
+                continue
+            record_day = record["processed_at"][:10]
+            if pending and (
+                record_day != day or len(pending) >= archive.SEGMENT_MAX_RECORDS
+            ):
+                flush()
+            day = record_day
+            pending.append(record)
+            refs.append(snapshot.reference)
+        report.add(tenant_id, scanned=len(page))
+        if page:
+            last = page[-1].to_dict() or {}
+            after = [last.get("processed_at"), page[-1].id]
+        if len(snapshots) <= args.page_size:
+            break
+    if pending:
+        flush()
+
+
+def run_compaction(db, args, out=sys.stdout, now=None) -> Report:
+    before = cutoff(args.older_than_days, now)
+    tenants = [args.tenant] if args.tenant else list_tenants(db)
+    report = Report()
+    for tenant_id in tenants:
+        compact_tenant(db, tenant_id, before, args, report)
+        if args.retention_days:
+            expire_day = cutoff(args.retention_days, now)[:10]
+            expired = expire_segments(db, tenant_id, expire_day, args.dry_run)
+            report.add(tenant_id, expired=expired)
+        print(f"[{tenant_id}] {report.line()}", file=out)
+    return report
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--project", default=os.getenv("GCP_PROJECT_ID"))
+    parser.add_argument("--tenant", help="Only this tenant (default: all)")
+    parser.add_argument(
+        "--older-than-days",
+        type=float,
+        default=float(os.getenv("ARCHIVE_AFTER_DAYS", 30)),
+        help="Archive logs processed before this age",
+    )
+    parser.add_argument(
+        "--retention-days",
+        type=float,
+        default=float(os.getenv("ARCHIVE_RETENTION_DAYS", 0)),
+        help="Delete archived days older than this (0 = keep forever)",
+    )
+    parser.add_argument("--page-size", type=int, default=archive.SEGMENT_MAX_RECORDS)
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Report what would happen"
+    )
+    args = parser.parse_args(argv)
+    if args.retention_days and args.retention_days <= args.older_than_days:
+        parser.error("--retention-days must be longer than --older-than-days")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    db = firestore.Client(project=args.project)
+    run_compaction(db, args).report()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Dead-letter replay: bulk-pull the DLQ subscription and republish or export
+Messages are filtered by tenant, source, attribute or error class. Matches
+are republished to the main topic (the sharded one when SHARD_COUNT > 0;
+batched, rate limited) or written to a JSONL file; non-matching messages are
+left on the DLQ
+
+Usage:
+    python dlq_replay.py --dry-run
+    python dlq_replay.py --tenant acme --rate 50
+    python dlq_replay.py --attribute source=text_upload --output ./dlq-export
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import List, Optional
+
+import sharding
+from errors import DEAD_LETTER_ATTRIBUTES
+from google.cloud import pubsub_v1
+
+# Attributes Pub/Sub adds when dead-lettering; dropped when republishing
+# (as are the worker's own DEAD_LETTER_ATTRIBUTES)
+DEAD_LETTER_ATTRIBUTE_PREFIX = "CloudPubSubDeadLetter"
+# Pub/Sub returns at most 1000 messages per pull
+MAX_PULL_MESSAGES = 1000
+UNCLASSIFIED = "unclassified"
+# Shard attributes are recomputed for the current ring (SHARD_COUNT), since
+# tenants may have moved since the message was first published
+shard_ring = sharding.ring_from_env()
+
+
+def parse_attribute_filters(values: List[str]) -> dict:
+    """['k=v', ...] -> {"k": "v"}"""
+    filters = {}
+    for value in values or []:
+        if "=" not in value:
+            raise SystemExit(f"--attribute expects key=value, got {value!r}")
+        key, expected = value.split("=", 1)
+        filters[key] = expected
+    return filters
+
+
+def message_fields(message) -> dict:
+    """tenant_id/source from attributes, falling back to the JSON payload"""
+    attributes = dict(message.attributes)
+    fields = {
+        "tenant_id": attributes.get("tenant_id"),
+        "source": attributes.get("source"),
+        "error_class": attributes.get("error_class") or UNCLASSIFIED,
+    }
+    if fields["tenant_id"] is None or fields["source"] is None:
+        try:
+            payload = json.loads(message.data.decode("utf-8"))
+        except (UnicodeDecodeError, ValueError):
+            payload = {}
+        if isinstance(payload, dict):
+            fields["tenant_id"] = fields["tenant_id"] or payload.get("tenant_id")
+            fields["source"] = fields["source"] or payload.get("source")
+    return fields
+
+
+def skip_reason(message, args) -> Optional[str]:
+    """None if the message matches every filter, else why it was skipped"""
+    fields = message_fields(message)
+    if args.tenant and fields["tenant_id"] not in args.tenant:
+        return "tenant"
+    if args.source and fields["source"] not in args.source:
+        return "source"
+    if args.error_class and fields["error_class"] not in args.error_class:
+        return "error_class"
+    attributes = message.attributes
+    for key, expected in args.attribute_filters.items():
+        if attributes.get(key) != expected:
+            return f"attribute:{key}"
+    return None
+
+
+def replay_attributes(message) -> dict:
+    attributes = {
+        key: value
+        for key, value in message.attributes.items()
+        if not key.startswith(DEAD_LETTER_ATTRIBUTE_PREFIX)
+        and key not in DEAD_LETTER_ATTRIBUTES
+        and key != sharding.SHARD_ATTRIBUTE
+    }
+    tenant_id = message_fields(message)["tenant_id"]
+    if shard_ring is not None and tenant_id:
+        attributes[sharding.SHARD_ATTRIBUTE] = str(shard_ring.shard_for(tenant_id))
+    attributes["replay_count"] = str(int(attributes.get("replay_count", 0)) + 1)
+    attributes["replayed_at"] = datetime.utcnow().isoformat()
+    return attributes
+
+
+def export_record(message) -> dict:
+    try:
+        data, encoding = message.data.decode("utf-8"), "utf-8"
+    except UnicodeDecodeError:
+        data, encoding = base64.b64encode(message.data).decode("ascii"), "base64"
+    return {
+        "message_id": message.message_id,
+        "publish_time": str(message.publish_time),
+        "ordering_key": message.ordering_key,
+        "attributes": dict(message.attributes),
+        "data": data,
+        "encoding": encoding,
+    }
+
+
+class RateLimiter:
+    """Paces calls to at most `rate` per second (no limit when rate <= 0)"""
+
+    def __init__(self, rate: float, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.clock = clock
+        self.sleep = sleep
+        self.next_at = clock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = self.clock()
+        if self.next_at > now:
+            self.sleep(self.next_at - now)
+        self.next_at = max(self.next_at, now) + self.interval
+
+
+class Report:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.pulled = 0
+        self.replayed = Counter()
+        self.skipped = Counter()
+        self.failed = Counter()
+        self.errors = defaultdict(int)
+
+    def print(self, mode: str, out=sys.stdout):
+        elapsed = time.perf_counter() - self.started
+        print("=" * 70, file=out)
+        print(f"☠️  DLQ REPLAY REPORT ({mode})", file=out)
+        print("=" * 70, file=out)
+        print(f"pulled:     {self.pulled}", file=out)
+        print(f"{mode + ':':<11} {sum(self.replayed.values())}", file=out)
+        for tenant_id, count in sorted(self.replayed.items(), key=str):
+            print(f"    {tenant_id}: {count}", file=out)
+        print(f"skipped:    {sum(self.skipped.values())}", file=out)
+        for reason, count in sorted(self.skipped.items()):
+            print(f"    {reason}: {count}", file=out)
+        print(f"re-failed:  {sum(self.failed.values())}", file=out)
+        for error, count in sorted(self.errors.items()):
+            print(f"    {error}: {count}", file=out)
+        rate = sum(self.replayed.values()) / elapsed if elapsed else 0.0
+        print(f"elapsed:    {elapsed:.1f}s ({rate:.1f} msg/s)", file=out)
+
+
+def run_replay(subscriber, publisher, args, out=sys.stdout) -> Report:
+    """
+    Pull until the DLQ is drained or --max-messages is reached
+    Replayed/exported messages are acked once their publish (or file write)
+    is confirmed; skipped, failed and dry-run messages keep their lease
+    until the end and are then released back to the DLQ
+    """
+    subscription = subscriber.subscription_path(args.project, args.subscription)
+    topic = publisher.topic_path(args.project, args.topic) if publisher else None
+    limiter = RateLimiter(args.rate)
+    report = Report()
+    seen = set()
+    release = []
+    export = None
+    if args.output and not args.dry_run:
+        os.makedirs(args.output, exist_ok=True)
+        name = f"dlq-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.jsonl"
+        export = open(os.path.join(args.output, name), "a")
+        print(f"Writing messages to {export.name}", file=out)
+
+    try:
+        while report.pulled < args.max_messages:
+            response = subscriber.pull(
+                request={
+                    "subscription": subscription,
+                    "max_messages": min(
+                        MAX_PULL_MESSAGES, args.max_messages - report.pulled
+                    ),
+                },
+                timeout=args.pull_timeout,
+            )
+            received = []
+            for r in response.received_messages:
+                if r.message.message_id in seen:
+                    # Redelivered after its lease expired; already counted
+                    release.append(r.ack_id)
+                else:
+                    received.append(r)
+            if not received:
+                break
+
+            batch = []
+            for r in received:
+                seen.add(r.message.message_id)
+                report.pulled += 1
+                reason = skip_reason(r.message, args)
+                if reason:
+                    report.skipped[reason] += 1
+                    release.append(r.ack_id)
+                elif args.dry_run:
+                    report.replayed[message_fields(r.message)["tenant_id"]] += 1
+                    release.append(r.ack_id)
+                else:
+                    batch.append(r)
+
+            if export is not None:
+                ack_ids = write_batch(export, batch, report, args.ack)
+            else:
+                ack_ids = publish_batch(publisher, topic, batch, limiter, report)
+            release.extend(r.ack_id for r in batch if r.ack_id not in ack_ids)
+            if ack_ids:
+                subscriber.acknowledge(
+                    request={"subscription": subscription, "ack_ids": ack_ids}
+                )
+    finally:
+        if export is not None:
+            export.close()
+        # Make skipped/failed messages immediately available on the DLQ again
+        for start in range(0, len(release), MAX_PULL_MESSAGES):
+            subscriber.modify_ack_deadline(
+                request={
+                    "subscription": subscription,
+                    "ack_ids": release[start : start + MAX_PULL_MESSAGES],
+                    "ack_deadline_seconds": 0,
+                }
+            )
+
+    return report
+
+
+def publish_batch(publisher, topic, batch, limiter, report) -> List[str]:
+    """Republish with the client's batching; returns ack_ids of confirmed publishes"""
+    futures = []
+    for r in batch:
+        limiter.wait()
+        kwargs = replay_attributes(r.message)
+        if r.message.ordering_key:
+            kwargs["ordering_key"] = r.message.ordering_key
+        futures.append((r, publisher.publish(topic, r.message.data, **kwargs)))
+
+    confirmed = []
+    for r, future in futures:
+        tenant_id = message_fields(r.message)["tenant_id"]
+        try:
+            future.result()
+        except Exception as e:
+            report.failed[tenant_id] += 1
+            report.errors[type(e).__name__] += 1
+            if r.message.ordering_key:
+                publisher.resume_publish(topic, r.message.ordering_key)
+            continue
+        report.replayed[tenant_id] += 1
+        confirmed.append(r.ack_id)
+    return confirmed
+
+
+def write_batch(export, batch, report, ack: bool) -> List[str]:
+    """Append messages as JSON lines; with ack, return their ack_ids once on disk"""
+    for r in batch:
+        export.write(json.dumps(export_record(r.message)) + "\n")
+        report.replayed[message_fields(r.message)["tenant_id"]] += 1
+    export.flush()
+    os.fsync(export.fileno())
+    return [r.ack_id for r in batch] if ack else []
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--project", default=os.getenv("GCP_PROJECT_ID"))
+    parser.add_argument(
+        "--subscription",
+        default=os.getenv("PUBSUB_DLQ_SUBSCRIPTION_ID", "data-ingestion-dlq-sub"),
+    )
+    topic = os.getenv("PUBSUB_TOPIC_ID", "data-ingestion")
+    parser.add_argument(
+        "--topic",
+        # Sharded messages must reach the shard subscriptions, not the main one
+        default=sharding.sharded_topic_name(topic) if shard_ring else topic,
+        help="Republish topic (default: the sharded topic when SHARD_COUNT > 0)",
+    )
+    parser.add_argument("--tenant", action="append", help="Repeatable")
+    parser.add_argument("--source", action="append", help="Repeatable")
+    parser.add_argument(
+        "--attribute", action="append", help="key=value, repeatable (all must match)"
+    )
+    parser.add_argument(
+        "--error-class",
+        action="append",
+        help=f"error_class attribute, repeatable ('{UNCLASSIFIED}' if absent)",
+    )
+    parser.add_argument("--max-messages", type=int, default=10000)
+    parser.add_argument(
+        "--rate", type=float, default=100, help="Republish msg/s (0 = unlimited)"
+    )
+    parser.add_argument(
+        "--output", help="Write matches to a JSONL file in this directory instead"
+    )
+    parser.add_argument(
+        "--ack", action="store_true", help="With --output: remove exported messages"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Report matches, change nothing"
+    )
+    parser.add_argument("--pull-timeout", type=float, default=30)
+    args = parser.parse_args(argv)
+    args.attribute_filters = parse_attribute_filters(args.attribute)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    subscriber = pubsub_v1.SubscriberClient()
+    publisher = None
+    if not args.output and not args.dry_run:
+        publisher = pubsub_v1.PublisherClient(
+            batch_settings=pubsub_v1.types.BatchSettings(
+                max_messages=100, max_latency=0.05
+            ),
+            # Dead-lettered messages keep their ordering key
+            publisher_options=pubsub_v1.types.PublisherOptions(
+                enable_message_ordering=True
+            ),
+        )
+    mode = "exported" if args.output else "replayed"
+    report = run_replay(subscriber, publisher, args)
+    report.print(f"{mode}, dry run" if args.dry_run else mode)
+    if sum(report.failed.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
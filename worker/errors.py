@@ -0,0 +1,163 @@
+"""
+Error classification and in-process retries for the worker
+
+- transient: infrastructure hiccups (unavailable, deadline exceeded, rate
+  limits, timeouts); storage calls are retried in place with jittered
+  exponential backoff, so the work already done is not repeated
+- permanent: the message itself can never succeed (bad JSON, missing or
+  invalid fields, a write Firestore rejects); sent straight to the DLQ
+- unknown: anything else; nacked for redelivery as before
+"""
+
+import asyncio
+import json
+import logging
+import random
+import time
+from datetime import datetime
+from typing import Callable
+
+from faults import InjectedFault
+from google.api_core import exceptions as gcp_exceptions
+from structured_logging import log_event
+
+logger = logging.getLogger(__name__)
+
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+UNKNOWN = "unknown"
+
+TRANSIENT_ERRORS = (
+    gcp_exceptions.Aborted,
+    gcp_exceptions.DeadlineExceeded,
+    gcp_exceptions.InternalServerError,
+    gcp_exceptions.ServiceUnavailable,
+    gcp_exceptions.TooManyRequests,
+    gcp_exceptions.ResourceExhausted,
+    gcp_exceptions.GatewayTimeout,
+    gcp_exceptions.BadGateway,
+    TimeoutError,
+    ConnectionError,
+    InjectedFault,
+)
+
+# Attributes added when the worker dead-letters a message itself
+# (dlq_replay.py drops them again when republishing)
+DEAD_LETTER_ATTRIBUTES = (
+    "error_class",
+    "error_type",
+    "error_message",
+    "dead_letter_subscription",
+    "dead_lettered_at",
+    "delivery_attempt",
+    "original_message_id",
+)
+ERROR_MESSAGE_MAX_CHARS = 1024
+
+
+class PermanentMessageError(Exception):
+    """The message is malformed and will fail on every delivery"""
+
+
+# Only errors caused by the message itself: a misconfiguration such as
+# PermissionDenied would otherwise dead-letter every message
+PERMANENT_ERRORS = (
+    PermanentMessageError,
+    json.JSONDecodeError,
+    UnicodeDecodeError,
+    gcp_exceptions.InvalidArgument,
+)
+
+
+def classify_error(error: Exception) -> str:
+    if isinstance(error, PERMANENT_ERRORS):
+        return PERMANENT
+    if isinstance(error, TRANSIENT_ERRORS):
+        return TRANSIENT
+    return UNKNOWN
+
+
+def dead_letter_attributes(message, error: Exception, subscription: str) -> dict:
+    """The message's attributes plus the error details"""
+    attributes = {
+        key: value
+        for key, value in dict(message.attributes).items()
+        if key not in DEAD_LETTER_ATTRIBUTES
+    }
+    attributes.update(
+        error_class=classify_error(error),
+        error_type=type(error).__name__,
+        error_message=str(error)[:ERROR_MESSAGE_MAX_CHARS],
+        dead_letter_subscription=subscription,
+        dead_lettered_at=datetime.utcnow().isoformat(),
+        delivery_attempt=str(message.delivery_attempt or 1),
+        original_message_id=str(message.message_id),
+    )
+    return attributes
+
+
+def validate_message(message_data) -> dict:
+    """The decoded payload, or PermanentMessageError if it can never be stored"""
+    if not isinstance(message_data, dict):
+        raise PermanentMessageError("payload is not a JSON object")
+    for key in ("tenant_id", "log_id"):
+        value = message_data.get(key)
+        # "/" would change the Firestore document path
+        if not isinstance(value, str) or not value or "/" in value:
+            raise PermanentMessageError(f"invalid or missing {key}")
+    if not isinstance(message_data.get("text"), str):
+        raise PermanentMessageError("invalid or missing text")
+    return message_data
+
+
+def backoff_delay(retry: int, base: float, cap: float) -> float:
+    """Full jitter: uniform in [0, min(cap, base * 2^retry)]"""
+    return random.uniform(0, min(cap, base * 2**retry))
+
+
+def retry_transient(
+    fn: Callable,
+    *args,
+    attempts: int = 4,
+    base: float = 0.1,
+    cap: float = 2.0,
+    sleep: Callable[[float], None] = time.sleep,
+):
+    """fn(*args), retrying transient errors up to `attempts` calls in total"""
+    for retry in range(attempts):
+        try:
+            return fn(*args)
+        except Exception as e:
+            if retry + 1 >= attempts or classify_error(e) != TRANSIENT:
+                raise
+            delay = backoff_delay(retry, base, cap)
+            log_retry(fn, retry, delay, e)
+            sleep(delay)
+
+
+async def retry_transient_async(
+    fn: Callable, *args, attempts: int = 4, base: float = 0.1, cap: float = 2.0
+):
+    """retry_transient for coroutine functions"""
+    for retry in range(attempts):
+        try:
+            return await fn(*args)
+        except Exception as e:
+            if retry + 1 >= attempts or classify_error(e) != TRANSIENT:
+                raise
+            delay = backoff_delay(retry, base, cap)
+            log_retry(fn, retry, delay, e)
+            await asyncio.sleep(delay)
+
+
+def log_retry(fn: Callable, retry: int, delay: float, error: Exception):
+    log_event(
+        logger,
+        logging.WARNING,
+        "transient_retry",
+        "Transient error in %s, retrying in %.3fs: %s",
+        getattr(fn, "__name__", repr(fn)),
+        delay,
+        error,
+        attempt=retry + 1,
+    )
@@ -0,0 +1,304 @@
+"""
+Configurable fault injection around Pub/Sub and Firestore
+Off unless FAULT_INJECTION is set; used by chaos runs and benchmark_faults.py
+
+FAULT_INJECTION is a preset name (see PROFILES) or JSON keyed by target:
+
+    {"store": {"latency_ms": 20, "error_rate": 0.05},
+     "publish": {"timeout_rate": 0.01, "timeout_ms": 2000},
+     "subscribe": {"partial_failure_rate": 0.02}}
+
+Targets:
+- publish: futures returned by the wrapped publisher (FaultyPublisher)
+- subscribe: the streaming pull callback (wrap_callback)
+- store: the wrapped Firestore write functions (wrap)
+
+Per target:
+- latency_ms, jitter_ms: added delay (uniform jitter on top)
+- error_rate: the call fails without taking effect
+- timeout_rate, timeout_ms: the call stalls for timeout_ms, then times out
+- partial_failure_rate: the call takes effect but the caller sees a failure
+  (publish: published but unconfirmed; subscribe: processed but the ack is
+  lost; store: written but reported failed), so retries redo the work
+"""
+
+import asyncio
+import functools
+import inspect
+import json
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+TARGETS = ("publish", "subscribe", "store")
+
+PROFILES = {
+    "none": {},
+    "slow_store": {"store": {"latency_ms": 50, "jitter_ms": 50}},
+    "flaky_store": {"store": {"error_rate": 0.1}},
+    "store_timeouts": {"store": {"timeout_rate": 0.05, "timeout_ms": 1000}},
+    "store_partial": {"store": {"partial_failure_rate": 0.1}},
+    "flaky_publish": {"publish": {"latency_ms": 20, "error_rate": 0.1}},
+    "publish_timeouts": {"publish": {"timeout_rate": 0.05, "timeout_ms": 1000}},
+    "lost_acks": {"subscribe": {"partial_failure_rate": 0.05}},
+    "degraded": {
+        "publish": {"latency_ms": 10, "error_rate": 0.02},
+        "subscribe": {"latency_ms": 5, "partial_failure_rate": 0.01},
+        "store": {"latency_ms": 20, "jitter_ms": 20, "error_rate": 0.05},
+    },
+}
+
+
+class InjectedFault(Exception):
+    """Raised in place of a real Pub/Sub or Firestore error"""
+
+
+class InjectedTimeout(InjectedFault, TimeoutError):
+    """Raised when an injected stall runs out"""
+
+
+class FaultSpec:
+    """Fault rates and delays for one target"""
+
+    KEYS = (
+        "latency_ms",
+        "jitter_ms",
+        "error_rate",
+        "timeout_rate",
+        "timeout_ms",
+        "partial_failure_rate",
+    )
+
+    def __init__(
+        self,
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+        error_rate: float = 0,
+        timeout_rate: float = 0,
+        timeout_ms: float = 1000,
+        partial_failure_rate: float = 0,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_ms = timeout_ms
+        self.partial_failure_rate = partial_failure_rate
+
+    @classmethod
+    def from_dict(cls, spec: dict) -> "FaultSpec":
+        unknown = set(spec) - set(cls.KEYS)
+        if unknown:
+            raise ValueError(f"Unknown fault keys: {sorted(unknown)}")
+        for key, value in spec.items():
+            if not isinstance(value, (int, float)) or value < 0:
+                raise ValueError(f"{key} must be a non-negative number")
+            if key.endswith("_rate") and value > 1:
+                raise ValueError(f"{key} must be at most 1")
+        return cls(**spec)
+
+
+class FaultInjector:
+    """
+    Rolls faults per call; thread-safe. `active` toggles injection at runtime
+    """
+
+    def __init__(
+        self,
+        specs: Dict[str, FaultSpec],
+        seed: Optional[int] = None,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.specs = specs
+        self.active = True
+        self.sleep = sleep
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {
+            target: {"calls": 0, "errors": 0, "timeouts": 0, "partial": 0}
+            for target in specs
+        }
+
+    def roll(self, target: str):
+        """(delay_seconds, outcome) with outcome in ok/error/timeout/partial"""
+        spec = self.specs.get(target) if self.active else None
+        if spec is None:
+            return 0.0, "ok"
+        with self._lock:
+            delay = (spec.latency_ms + self._random.random() * spec.jitter_ms) / 1000
+            draw = self._random.random()
+            counts = self.counts[target]
+            counts["calls"] += 1
+            if draw < spec.error_rate:
+                outcome = "error"
+            elif draw < spec.error_rate + spec.timeout_rate:
+                outcome = "timeout"
+                delay += spec.timeout_ms / 1000
+            elif draw < spec.error_rate + spec.timeout_rate + spec.partial_failure_rate:
+                outcome = "partial"
+            else:
+                return delay, "ok"
+            counts[
+                {"error": "errors", "timeout": "timeouts"}.get(outcome, outcome)
+            ] += 1
+            return delay, outcome
+
+    @staticmethod
+    def _check(target: str, outcome: str, applied: bool):
+        if not applied and outcome == "error":
+            raise InjectedFault(f"injected {target} error")
+        if not applied and outcome == "timeout":
+            raise InjectedTimeout(f"injected {target} timeout")
+        if applied and outcome == "partial":
+            raise InjectedFault(f"injected {target} failure after the call applied")
+
+    def call(self, target: str, fn: Callable, *args, **kwargs):
+        """Run fn(*args, **kwargs) with the target's faults"""
+        delay, outcome = self.roll(target)
+        if delay:
+            self.sleep(delay)
+        self._check(target, outcome, applied=False)
+        result = fn(*args, **kwargs)
+        self._check(target, outcome, applied=True)
+        return result
+
+    async def acall(self, target: str, fn: Callable, *args, **kwargs):
+        """call() for coroutine functions; delays don't block the event loop"""
+        delay, outcome = self.roll(target)
+        if delay:
+            await asyncio.sleep(delay)
+        self._check(target, outcome, applied=False)
+        result = await fn(*args, **kwargs)
+        self._check(target, outcome, applied=True)
+        return result
+
+    def wrap(self, target: str, fn: Callable) -> Callable:
+        """fn (plain or coroutine function) with the target's faults"""
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                return await self.acall(target, fn, *args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return self.call(target, fn, *args, **kwargs)
+
+        return wrapper
+
+    def wrap_callback(self, callback: Callable) -> Callable:
+        """
+        Streaming pull callback with "subscribe" faults: delayed delivery,
+        failed deliveries (nacked unprocessed) and lost acks
+        """
+
+        @functools.wraps(callback)
+        def wrapper(message):
+            delay, outcome = self.roll("subscribe")
+            if delay:
+                self.sleep(delay)
+            if outcome in ("error", "timeout"):
+                message.nack()
+                return
+            callback(LostAckMessage(message) if outcome == "partial" else message)
+
+        return wrapper
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": True,
+                "active": self.active,
+                "targets": {target: dict(c) for target, c in self.counts.items()},
+            }
+
+
+class LostAckMessage:
+    """Pub/Sub message proxy whose ack never reaches the server"""
+
+    def __init__(self, message):
+        self._message = message
+
+    def ack(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._message, name)
+
+
+class InjectedFuture:
+    """Publish future that resolves after an injected delay and outcome"""
+
+    def __init__(self, inner, delay: float, error: Optional[Exception], sleep):
+        self._inner = inner
+        self._ready_at = time.monotonic() + delay
+        self._error = error
+        self._sleep = sleep
+
+    def result(self, timeout: Optional[float] = None):
+        wait = max(0.0, self._ready_at - time.monotonic())
+        if timeout is not None and wait > timeout:
+            self._sleep(timeout)
+            raise InjectedTimeout("injected publish timeout")
+        if wait:
+            self._sleep(wait)
+        if self._error is not None:
+            raise self._error
+        return self._inner.result(timeout) if self._inner is not None else None
+
+
+class FaultyPublisher:
+    """PublisherClient proxy whose publish futures carry "publish" faults"""
+
+    def __init__(self, publisher, injector: FaultInjector):
+        self._publisher = publisher
+        self._injector = injector
+
+    def publish(self, topic, data, *args, **kwargs):
+        delay, outcome = self._injector.roll("publish")
+        inner = None
+        if outcome in ("ok", "partial"):
+            inner = self._publisher.publish(topic, data, *args, **kwargs)
+        error = None
+        if outcome == "error":
+            error = InjectedFault("injected publish error")
+        elif outcome == "partial":
+            error = InjectedFault("injected publish failure after the call applied")
+        elif outcome == "timeout":
+            error = InjectedTimeout("injected publish timeout")
+        return InjectedFuture(inner, delay, error, self._injector.sleep)
+
+    def __getattr__(self, name):
+        return getattr(self._publisher, name)
+
+
+def parse_profile(value: str) -> Dict[str, FaultSpec]:
+    """Preset name or JSON -> {target: FaultSpec}; raises ValueError"""
+    if value in PROFILES:
+        spec = PROFILES[value]
+    else:
+        try:
+            spec = json.loads(value)
+        except json.JSONDecodeError:
+            raise ValueError(
+                f"FAULT_INJECTION must be JSON or one of {sorted(PROFILES)}"
+            )
+    if not isinstance(spec, dict):
+        raise ValueError("A fault profile must be an object keyed by target")
+    unknown = set(spec) - set(TARGETS)
+    if unknown:
+        raise ValueError(f"Unknown fault targets: {sorted(unknown)}")
+    return {target: FaultSpec.from_dict(s) for target, s in spec.items()}
+
+
+def injector_from_env() -> Optional[FaultInjector]:
+    """FaultInjector from FAULT_INJECTION / FAULT_INJECTION_SEED, or None"""
+    value = os.getenv("FAULT_INJECTION")
+    if not value:
+        return None
+    seed = os.getenv("FAULT_INJECTION_SEED")
+    return FaultInjector(parse_profile(value), int(seed) if seed else None)
@@ -5,26 +5,61 @@ Includes HTTP health check endpoint for Cloud Run
 NOW WITH: Crash simulation that succeeds after 5 attempts
 """
 
+import asyncio
+import hmac
+import itertools
 import json
 import logging
 import os
-import re
+import random
 import time
-from concurrent.futures import TimeoutError
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 from datetime import datetime
 from http.server import BaseHTTPRequestHandler, HTTPServer
-from threading import Thread
+from threading import Event, Lock, Thread
+from typing import Iterable, Tuple
+from urllib.parse import parse_qs, urlparse
 
+import diagnostics
+import faults
+import sharding
+import structured_logging
+from errors import (
+    PERMANENT,
+    classify_error,
+    dead_letter_attributes,
+    retry_transient,
+    retry_transient_async,
+    validate_message,
+)
 from google.cloud import firestore, pubsub_v1
+from redaction import (
+    REDACT_OVERLAP_CHARS,
+    REDACT_WINDOW_CHARS,
+    iter_windows,
+    redact_pii,
+    redact_pii_chunked,
+    redact_structured,
+)
+from structured_logging import log_event
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (JSON, queue-based; see structured_logging.py)
+structured_logging.configure_logging()
 logger = logging.getLogger(__name__)
 
 # GCP Configuration
 PROJECT_ID = os.getenv("GCP_PROJECT_ID")
 SUBSCRIPTION_ID = os.getenv("PUBSUB_SUBSCRIPTION_ID", "data-ingestion-sub")
 
+# Tenant-affinity sharding: WORKER_SHARD binds this instance to one shard's
+# subscription (<PUBSUB_SUBSCRIPTION_ID>-shard-<n>); SHARD_COUNT is the ring
+# the API currently routes with, used to spot tenants that moved away
+WORKER_SHARD = int(os.environ["WORKER_SHARD"]) if os.getenv("WORKER_SHARD") else None
+if WORKER_SHARD is not None:
+    SUBSCRIPTION_ID = sharding.subscription_name(SUBSCRIPTION_ID, WORKER_SHARD)
+shard_ring = sharding.ring_from_env()
+
 # Initialize Firestore
 db = firestore.Client(project=PROJECT_ID)
 
@@ -32,24 +67,140 @@ db = firestore.Client(project=PROJECT_ID)
 subscriber = pubsub_v1.SubscriberClient()
 subscription_path = subscriber.subscription_path(PROJECT_ID, SUBSCRIPTION_ID)
 
+# Admin endpoints (profiling) are disabled unless ADMIN_TOKEN is set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+profiler = diagnostics.profiler_from_env()
+
+# Per-tenant aggregate configuration
+AGGREGATE_SHARDS = int(os.getenv("AGGREGATE_SHARDS", 10))
+AGGREGATE_FLUSH_INTERVAL_SECONDS = float(
+    os.getenv("AGGREGATE_FLUSH_INTERVAL_SECONDS", 5)
+)
+# Firestore allows at most 500 writes per batch
+FIRESTORE_MAX_BATCH_WRITES = 500
+
+# Texts longer than this are redacted in windows and stored as chunk
+# documents (Firestore documents are limited to 1 MiB)
+REDACT_STREAM_THRESHOLD_CHARS = int(
+    os.getenv("REDACT_STREAM_THRESHOLD_CHARS", 256 * 1024)
+)
+# Chunk documents per batch commit (keeps requests well under 10 MiB)
+REDACT_CHUNKS_PER_BATCH = int(os.getenv("REDACT_CHUNKS_PER_BATCH", 8))
+
+# Transient storage errors are retried in place with jittered exponential
+# backoff (attempts counts the first call)
+STORE_RETRY_ATTEMPTS = int(os.getenv("STORE_RETRY_ATTEMPTS", 4))
+STORE_RETRY_BASE_SECONDS = float(os.getenv("STORE_RETRY_BASE_SECONDS", 0.1))
+STORE_RETRY_MAX_SECONDS = float(os.getenv("STORE_RETRY_MAX_SECONDS", 2))
+
+# Permanently failing messages are published here and acked instead of
+# burning every delivery attempt (empty disables: they are nacked)
+DEAD_LETTER_TOPIC_ID = os.getenv("DEAD_LETTER_TOPIC_ID", "data-ingestion-dlq")
+DEAD_LETTER_PUBLISH_TIMEOUT_SECONDS = float(
+    os.getenv("DEAD_LETTER_PUBLISH_TIMEOUT_SECONDS", 10)
+)
+
+# I/O mode: "threads" (each in-flight message holds a callback thread) or
+# "async" (callbacks only enqueue; parsing, Firestore writes and acks run on
+# one asyncio event loop with the async Firestore client)
+WORKER_IO_MODE = os.getenv("WORKER_IO_MODE", "threads").lower()
+# Async mode: outstanding messages allowed by flow control
+ASYNC_MAX_IN_FLIGHT = int(os.getenv("ASYNC_MAX_IN_FLIGHT", 2000))
+# Async mode: threads that hand messages to the loop (they never block)
+ASYNC_CALLBACK_THREADS = int(os.getenv("ASYNC_CALLBACK_THREADS", 4))
+# Async mode: texts longer than this are redacted off the event loop
+ASYNC_OFFLOAD_REDACT_CHARS = int(os.getenv("ASYNC_OFFLOAD_REDACT_CHARS", 16 * 1024))
+
 
 class HealthCheckHandler(BaseHTTPRequestHandler):
-    """Simple HTTP handler for health checks"""
+    """Simple HTTP handler for health checks and profiling admin"""
+
+    def send_body(self, status: int, body: str, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-type", content_type)
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def is_admin(self) -> bool:
+        """Admin paths need ADMIN_TOKEN configured and a matching header"""
+        if not ADMIN_TOKEN:
+            self.send_body(404, json.dumps({"detail": "Not Found"}))
+            return False
+        token = self.headers.get("X-Admin-Token") or ""
+        if not hmac.compare_digest(token, ADMIN_TOKEN):
+            self.send_body(403, json.dumps({"detail": "Invalid admin token"}))
+            return False
+        return True
+
+    def do_POST(self):
+        """
+        POST /admin/profiling?sample_rate=N&tracemalloc_frames=N&reset=1
+        """
+        url = urlparse(self.path)
+        if url.path != "/admin/profiling":
+            self.send_body(404, json.dumps({"detail": "Not Found"}))
+            return
+        if not self.is_admin():
+            return
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            if "sample_rate" in params:
+                profiler.configure(sample_rate=int(params["sample_rate"]))
+            if "tracemalloc_frames" in params:
+                frames = int(params["tracemalloc_frames"])
+                if frames:
+                    diagnostics.start_allocation_tracing(frames)
+                else:
+                    diagnostics.stop_allocation_tracing()
+        except ValueError:
+            self.send_body(400, json.dumps({"detail": "Invalid parameter"}))
+            return
+        if params.get("reset") in ("1", "true"):
+            profiler.reset()
+        self.send_body(200, json.dumps(profiler.status()))
+
+    def do_admin_get(self, url):
+        """GET /admin/profiling[/cpu|/allocations]"""
+        if not self.is_admin():
+            return
+        if url.path == "/admin/profiling":
+            self.send_body(200, json.dumps(profiler.status()))
+        elif url.path == "/admin/profiling/cpu":
+            if "format=json" in url.query:
+                body = {"functions": profiler.function_stats(), **profiler.status()}
+                self.send_body(200, json.dumps(body))
+            else:
+                self.send_body(200, profiler.folded(), "text/plain")
+        elif url.path == "/admin/profiling/allocations":
+            try:
+                self.send_body(200, diagnostics.allocations_folded(), "text/plain")
+            except RuntimeError as e:
+                self.send_body(409, json.dumps({"detail": str(e)}))
+        else:
+            self.send_body(404, json.dumps({"detail": "Not Found"}))
 
     def do_GET(self):
         """Handle GET requests for health checks"""
-        if self.path == "/health" or self.path == "/":
+        if self.path.startswith("/admin/"):
+            self.do_admin_get(urlparse(self.path))
+        elif self.path == "/health" or self.path == "/":
             self.send_response(200)
             self.send_header("Content-type", "application/json")
             self.end_headers()
-            response = json.dumps(
-                {
-                    "status": "healthy",
-                    "service": "data-processor-worker",
-                    "subscription": SUBSCRIPTION_ID,
-                    # "retry_counter_size": len(retry_counter),
-                }
-            )
+            body = {
+                "status": "healthy",
+                "service": "data-processor-worker",
+                "subscription": SUBSCRIPTION_ID,
+                # "retry_counter_size": len(retry_counter),
+            }
+            if async_core is not None:
+                body["in_flight"] = async_core.in_flight()
+            if fault_injector is not None:
+                body["faults"] = fault_injector.stats()
+            if WORKER_SHARD is not None:
+                body["sharding"] = shard_affinity.stats()
+            response = json.dumps(body)
             self.wfile.write(response.encode())
         else:
             self.send_response(404)
@@ -68,47 +219,12 @@ def start_health_check_server():
     server.serve_forever()
 
 
-def redact_pii(text: str) -> str:
-    # """
-    # Simple PII redaction - redacts phone numbers
-    # Example: 555-0199 -> [REDACTED]
-    # Example: 555-123-4567 -> [REDACTED]
-    # """
-    # # IMPORTANT: Apply longer pattern first!
-    # # Redact XXX-XXX-XXXX format (10 digits with dashes)
-    # redacted = re.sub(r"\b\d{3}-\d{3}-\d{4}\b", "[REDACTED]", text)
-    # # Then redact XXX-XXXX format (7 digits with dash)
-    # redacted = re.sub(r"\b\d{3}-\d{4}\b", "[REDACTED]", redacted)
-
-    PHONE_REGEX = re.compile(
-        r"""
-    (                           # Main phone patterns
-        (?:\+?\d{1,3}[\s.\-]?)?       # optional country code, e.g. +1, 1, +91-
-        (?:\(?\d{3}\)?[\s.\-]?)       # area code with or without parentheses
-        \d{3}[\s.\-]?\d{4}            # 3 + 4 digits (local number)
-        (?:\s*(?:ext\.?|x)\s*\d{1,5})?  # optional extension like ext 1234 or x1234
-    )
-    |
-    (?:\b\d{3}[\s.\-]\d{4}\b)         # 7-digit local: 555-0199 or 555.0199
-    """,
-        re.VERBOSE,
-    )
-
-    # Plain 10-digit numbers like 5551234567
-    PHONE_DIGITS_ONLY_REGEX = re.compile(r"\b\d{10}\b")
-
-    """
-    Redact common phone number patterns from text.
-    Covers:
-      - +1 555 123 4567 / +91-22-1234-5678 (simple intl)
-      - (555) 123-4567
-      - 555-123-4567 / 555.123.4567 / 555 123 4567
-      - 555-0199
-      - 5551234567
-    """
-    redacted = PHONE_REGEX.sub("[REDACTED]", text)
-    redacted = PHONE_DIGITS_ONLY_REGEX.sub("[REDACTED]", redacted)
-    return redacted
+def store_retry_options() -> dict:
+    return {
+        "attempts": STORE_RETRY_ATTEMPTS,
+        "base": STORE_RETRY_BASE_SECONDS,
+        "cap": STORE_RETRY_MAX_SECONDS,
+    }
 
 
 def simulate_heavy_processing(text: str):
@@ -119,10 +235,17 @@ def simulate_heavy_processing(text: str):
     char_count = len(text)
     sleep_time = char_count * 0.05
 
-    logger.info(f"Processing {char_count} characters, sleeping for {sleep_time}s")
+    logger.debug("Processing %d characters, sleeping for %ss", char_count, sleep_time)
     time.sleep(sleep_time)
 
 
+async def simulate_heavy_processing_async(text: str):
+    """
+    simulate_heavy_processing without holding a thread
+    """
+    await asyncio.sleep(len(text) * 0.05)
+
+
 def store_in_firestore(tenant_id: str, log_id: str, data: dict):
     """
     Store processed data in Firestore with strict multi-tenant isolation
@@ -140,7 +263,7 @@ def store_in_firestore(tenant_id: str, log_id: str, data: dict):
         # Store with timestamp
         doc_ref.set(data)
 
-        logger.info(f"Stored log {log_id} for tenant {tenant_id}")
+        logger.debug("Stored log %s for tenant %s", log_id, tenant_id)
         return True
 
     except Exception as e:
@@ -148,79 +271,721 @@ def store_in_firestore(tenant_id: str, log_id: str, data: dict):
         raise
 
 
+def store_chunked_in_firestore(
+    tenant_id: str, log_id: str, data: dict, segments: Iterable[Tuple[str, str]]
+) -> Tuple[int, int]:
+    """
+    Stream (original, redacted) segments into chunk documents, then store
+    the parent document; only REDACT_CHUNKS_PER_BATCH segments are held
+    Structure: tenants/{tenant_id}/processed_logs/{log_id}/chunks/{index}
+    Returns (chunk_count, redactions)
+    """
+    doc_ref = (
+        db.collection("tenants")
+        .document(tenant_id)
+        .collection("processed_logs")
+        .document(log_id)
+    )
+    chunk_count = redactions = 0
+    batch, pending = db.batch(), 0
+    for original, redacted in segments:
+        redactions += redacted.count("[REDACTED]") - original.count("[REDACTED]")
+        batch.set(
+            doc_ref.collection("chunks").document(f"{chunk_count:06d}"),
+            {
+                "index": chunk_count,
+                "original_text": original,
+                "modified_data": redacted,
+            },
+        )
+        chunk_count += 1
+        pending += 1
+        if pending >= REDACT_CHUNKS_PER_BATCH:
+            retry_transient(batch.commit, **store_retry_options())
+            batch, pending = db.batch(), 0
+    if pending:
+        retry_transient(batch.commit, **store_retry_options())
+
+    # Parent last, so readers never see a chunk_count with missing chunks
+    parent = {**data, "chunked": True, "chunk_count": chunk_count}
+    retry_transient(doc_ref.set, parent, **store_retry_options())
+    logger.debug(
+        "Stored log %s for tenant %s in %d chunks", log_id, tenant_id, chunk_count
+    )
+    return chunk_count, redactions
+
+
+# Async Firestore client, created on the event loop by AsyncCore.start()
+async_db = None
+
+
+async def store_in_firestore_async(tenant_id: str, log_id: str, data: dict):
+    """
+    store_in_firestore for the async I/O core
+    Structure: tenants/{tenant_id}/processed_logs/{log_id}
+    """
+    doc_ref = (
+        async_db.collection("tenants")
+        .document(tenant_id)
+        .collection("processed_logs")
+        .document(log_id)
+    )
+    await doc_ref.set(data)
+    logger.debug("Stored log %s for tenant %s", log_id, tenant_id)
+    return True
+
+
+async def store_chunked_in_firestore_async(
+    tenant_id: str, log_id: str, data: dict, segments: Iterable[Tuple[str, str]]
+) -> Tuple[int, int]:
+    """
+    store_chunked_in_firestore for the async I/O core
+    Each batch of segments is redacted on the default executor, so the
+    event loop keeps serving other messages meanwhile
+    Returns (chunk_count, redactions)
+    """
+    loop = asyncio.get_running_loop()
+    doc_ref = (
+        async_db.collection("tenants")
+        .document(tenant_id)
+        .collection("processed_logs")
+        .document(log_id)
+    )
+    chunk_count = redactions = 0
+    while True:
+        pending = await loop.run_in_executor(
+            None, list, itertools.islice(segments, REDACT_CHUNKS_PER_BATCH)
+        )
+        if not pending:
+            break
+        batch = async_db.batch()
+        for original, redacted in pending:
+            redactions += redacted.count("[REDACTED]") - original.count("[REDACTED]")
+            batch.set(
+                doc_ref.collection("chunks").document(f"{chunk_count:06d}"),
+                {
+                    "index": chunk_count,
+                    "original_text": original,
+                    "modified_data": redacted,
+                },
+            )
+            chunk_count += 1
+        await retry_transient_async(batch.commit, **store_retry_options())
+
+    # Parent last, so readers never see a chunk_count with missing chunks
+    parent = {**data, "chunked": True, "chunk_count": chunk_count}
+    await retry_transient_async(doc_ref.set, parent, **store_retry_options())
+    return chunk_count, redactions
+
+
+# Fault injection for chaos runs and benchmarks (off unless FAULT_INJECTION is set)
+fault_injector = faults.injector_from_env()
+if fault_injector is not None:
+    store_in_firestore = fault_injector.wrap("store", store_in_firestore)
+    store_chunked_in_firestore = fault_injector.wrap(
+        "store", store_chunked_in_firestore
+    )
+    store_in_firestore_async = fault_injector.wrap("store", store_in_firestore_async)
+    store_chunked_in_firestore_async = fault_injector.wrap(
+        "store", store_chunked_in_firestore_async
+    )
+    logger.warning("⚠️ Fault injection enabled for Firestore writes and delivery")
+
+
+class TenantAggregator:
+    """
+    Coalesces per-tenant counters in memory and periodically flushes them
+    to sharded counter documents:
+    tenants/{tenant_id}/aggregate_shards/{shard_id}
+    Each flush increments one randomly chosen shard per tenant, so concurrent
+    worker instances rarely contend on the same document
+    """
+
+    def __init__(self, shards: int = AGGREGATE_SHARDS):
+        self.shards = max(1, shards)
+        self._pending = {}
+        self._lock = Lock()
+        self._stop = Event()
+
+    def record(self, tenant_id: str, **deltas):
+        """Add deltas for a tenant (cheap, in-memory only)"""
+        with self._lock:
+            totals = self._pending.setdefault(tenant_id, {})
+            for field, value in deltas.items():
+                totals[field] = totals.get(field, 0) + value
+
+    def pending(self) -> dict:
+        with self._lock:
+            return {tenant: dict(totals) for tenant, totals in self._pending.items()}
+
+    def flush(self) -> int:
+        """
+        Write coalesced deltas using atomic increments
+        On failure, deltas are merged back so the next flush retries them
+        Returns the number of tenants flushed
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        if not pending:
+            return 0
+
+        items = list(pending.items())
+        for start in range(0, len(items), FIRESTORE_MAX_BATCH_WRITES):
+            chunk = items[start : start + FIRESTORE_MAX_BATCH_WRITES]
+            try:
+                batch = db.batch()
+                for tenant_id, totals in chunk:
+                    shard_ref = (
+                        db.collection("tenants")
+                        .document(tenant_id)
+                        .collection("aggregate_shards")
+                        .document(str(random.randrange(self.shards)))
+                    )
+                    update = {
+                        field: firestore.Increment(value)
+                        for field, value in totals.items()
+                    }
+                    update["updated_at"] = firestore.SERVER_TIMESTAMP
+                    batch.set(shard_ref, update, merge=True)
+                batch.commit()
+            except Exception as e:
+                logger.error(f"Failed to flush tenant aggregates: {e}")
+                for tenant_id, totals in items[start:]:
+                    self.record(tenant_id, **totals)
+                return start
+
+        return len(items)
+
+    def run(self, interval: float = AGGREGATE_FLUSH_INTERVAL_SECONDS):
+        """Flush loop; intended to run in a daemon thread"""
+        while not self._stop.wait(interval):
+            self.flush()
+        self.flush()
+
+    def stop(self):
+        self._stop.set()
+
+
+aggregator = TenantAggregator()
+
+
+class ShardAffinity:
+    """
+    Counts messages for tenants the current ring places on another shard:
+    nonzero while a rebalance drains, or if routing and WORKER_SHARD disagree
+    """
+
+    def __init__(self, shard, ring):
+        self.shard = shard
+        self.ring = ring
+        self.messages = 0
+        self.off_shard = 0
+        self.off_shard_tenants = set()
+        self._lock = Lock()
+
+    def record(self, tenant_id: str):
+        if self.shard is None:
+            return
+        home = self.ring.shard_for(tenant_id) if self.ring is not None else None
+        with self._lock:
+            self.messages += 1
+            if home is not None and home != self.shard:
+                self.off_shard += 1
+                self.off_shard_tenants.add(tenant_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "shard": self.shard,
+                "shards": self.ring.shards if self.ring is not None else None,
+                "messages": self.messages,
+                "off_shard_messages": self.off_shard,
+                "off_shard_tenants": len(self.off_shard_tenants),
+            }
+
+
+shard_affinity = ShardAffinity(WORKER_SHARD, shard_ring)
+
+
+def check_crash_test(text: str, delivery_attempt: int):
+    """
+    🧪 CRASH TEST: Fail first 5 attempts, then succeed
+    """
+    if "crash_test" in text.lower():
+        if delivery_attempt <= 5:
+            logger.error("🔥 CRASH (Attempt %d/5)", delivery_attempt)
+            raise Exception(f"Simulated crash - Attempt {delivery_attempt}")
+        else:
+            logger.info("✅ PASSED after %d attempts", delivery_attempt)
+
+
+def build_document(message_data: dict, delivery_attempt: int) -> dict:
+    """
+    Stored fields for a message, before the (redacted) text is added
+    """
+    text = message_data.get("text")
+    document = {
+        "source": message_data.get("source"),
+        "ingested_at": message_data.get("ingested_at"),
+        "processed_at": datetime.utcnow().isoformat(),
+        "character_count": len(text),
+        "processing_time_seconds": len(text) * 0.05,
+        # "retry_attempts": retry_counter.get(f"{tenant_id}:{log_id}", 0)  # Track retries
+        # "retry_attempts": retry_count  # Track retries
+        "delivery_attempt(s)": delivery_attempt,  # Use Pub/Sub's counter
+    }
+    fields = message_data.get("fields")
+    if fields:
+        # Structured fields kept by the tenant's normalization rule
+        document["fields"] = redact_structured(fields)
+    return document
+
+
+def log_processed(message, message_data: dict, redactions: int, chunks: int, marks):
+    """
+    One summary record per processed message
+    marks: perf_counter() at start, parsed, processed, redacted and stored
+    """
+    started, parsed, processed, redacted, stored = marks
+    log_event(
+        logger,
+        logging.INFO,
+        "message_processed",
+        "Processed message %s",
+        message.message_id,
+        tenant_id=message_data.get("tenant_id"),
+        log_id=message_data.get("log_id"),
+        delivery_attempt=message.delivery_attempt or 1,
+        characters=len(message_data.get("text")),
+        redactions=redactions,
+        chunks=chunks,
+        parse_ms=round((parsed - started) * 1000, 3),
+        processing_ms=round((processed - parsed) * 1000, 3),
+        redact_ms=round((redacted - processed) * 1000, 3),
+        store_ms=round((stored - redacted) * 1000, 3),
+        total_ms=round((time.perf_counter() - started) * 1000, 3),
+    )
+
+
+def log_failed(
+    message, message_data: dict, error: Exception, started: float, dead_lettered: bool
+):
+    if dead_lettered:
+        event, msg = "message_dead_lettered", "☠️ Message %s dead-lettered: %s"
+    else:
+        event, msg = "message_failed", "❌ Error processing message %s, nacked: %s"
+    log_event(
+        logger,
+        logging.ERROR,
+        event,
+        msg,
+        message.message_id,
+        error,
+        tenant_id=message_data.get("tenant_id"),
+        log_id=message_data.get("log_id"),
+        delivery_attempt=message.delivery_attempt or 1,
+        error_class=classify_error(error),
+        total_ms=round((time.perf_counter() - started) * 1000, 3),
+    )
+
+
+# Created on first use: most workers never dead-letter anything
+dead_letter_publisher = None
+dead_letter_lock = Lock()
+
+
+def publish_dead_letter(message, error: Exception):
+    """
+    Publish the original payload to DEAD_LETTER_TOPIC_ID with the error
+    details as attributes; returns the publish future (None if disabled
+    or the publish could not be started)
+    """
+    global dead_letter_publisher
+    if not DEAD_LETTER_TOPIC_ID:
+        return None
+    try:
+        with dead_letter_lock:
+            if dead_letter_publisher is None:
+                dead_letter_publisher = pubsub_v1.PublisherClient()
+        topic = dead_letter_publisher.topic_path(PROJECT_ID, DEAD_LETTER_TOPIC_ID)
+        attributes = dead_letter_attributes(message, error, SUBSCRIPTION_ID)
+        return dead_letter_publisher.publish(topic, message.data, **attributes)
+    except Exception as e:
+        logger.error(f"Dead-letter publish failed, nacking instead: {e}")
+        return None
+
+
+def wait_dead_letter(future) -> bool:
+    """True once the dead-letter publish is confirmed"""
+    if future is None:
+        return False
+    try:
+        future.result(timeout=DEAD_LETTER_PUBLISH_TIMEOUT_SECONDS)
+        return True
+    except Exception as e:
+        logger.error(f"Dead-letter publish failed, nacking instead: {e}")
+        return False
+
+
+async def wait_dead_letter_async(future) -> bool:
+    """wait_dead_letter without blocking the event loop"""
+    if future is None:
+        return False
+    try:
+        await asyncio.wait_for(
+            asyncio.wrap_future(future), DEAD_LETTER_PUBLISH_TIMEOUT_SECONDS
+        )
+        return True
+    except Exception as e:
+        logger.error(f"Dead-letter publish failed, nacking instead: {e}")
+        return False
+
+
 def process_message(message: pubsub_v1.subscriber.message.Message):
     """
     Process a single Pub/Sub message
+    Emits one summary record per message with per-stage timings
     """
+    started = time.perf_counter()
+    message_data = {}
+    delivery_attempt = message.delivery_attempt or 1
     try:
         # Parse message data
-        message_data = json.loads(message.data.decode("utf-8"))
+        message_data = validate_message(json.loads(message.data.decode("utf-8")))
 
-        delivery_attempt = message.delivery_attempt or 1
+        tenant_id = message_data.get("tenant_id")
+        log_id = message_data.get("log_id")
+        text = message_data.get("text")
+        shard_affinity.record(tenant_id)
+        parsed = time.perf_counter()
 
-        logger.info(f"📬 Delivery attempt #{delivery_attempt}")
+        check_crash_test(text, delivery_attempt)
+
+        # Normal processing continues...
+        simulate_heavy_processing(text)
+        processed = time.perf_counter()
+
+        # Prepare document for storage
+        document = build_document(message_data, delivery_attempt)
+
+        chunks = 0
+        if len(text) > REDACT_STREAM_THRESHOLD_CHARS:
+            # Redact window by window straight into chunk documents, so the
+            # full redacted copy never exists; redaction time is in store_ms
+            redacted = time.perf_counter()
+            segments = redact_pii_chunked(
+                iter_windows(text, REDACT_WINDOW_CHARS),
+                REDACT_WINDOW_CHARS,
+                REDACT_OVERLAP_CHARS,
+            )
+            chunks, redactions = store_chunked_in_firestore(
+                tenant_id, log_id, document, segments
+            )
+        else:
+            # Redact PII
+            modified_data = redact_pii(text)
+            redacted = time.perf_counter()
+            redactions = modified_data.count("[REDACTED]") - text.count("[REDACTED]")
+
+            document["original_text"] = text
+            document["modified_data"] = modified_data
+
+            # Store in Firestore with multi-tenant isolation
+            retry_transient(
+                store_in_firestore, tenant_id, log_id, document, **store_retry_options()
+            )
+        stored = time.perf_counter()
+
+        # Update rolling per-tenant totals (flushed in the background)
+        aggregator.record(
+            tenant_id,
+            messages=1,
+            characters=len(text),
+            redactions=redactions,
+            delivery_attempts=delivery_attempt,
+        )
+
+        # Acknowledge message (prevents reprocessing)
+        message.ack()
+
+        log_processed(
+            message,
+            message_data,
+            redactions,
+            chunks,
+            (started, parsed, processed, redacted, stored),
+        )
+
+    except Exception as e:
+        # Permanent errors go straight to the DLQ; anything else is nacked
+        # to retry later (handles crash scenarios)
+        dead_lettered = False
+        if classify_error(e) == PERMANENT:
+            dead_lettered = wait_dead_letter(publish_dead_letter(message, e))
+        if dead_lettered:
+            message.ack()
+        else:
+            message.nack()
+        log_failed(message, message_data, e, started, dead_lettered)
+
+
+async def process_message_async(message: pubsub_v1.subscriber.message.Message):
+    """
+    process_message for the async I/O core (same stages, record and acks)
+    """
+    started = time.perf_counter()
+    message_data = {}
+    delivery_attempt = message.delivery_attempt or 1
+    try:
+        message_data = validate_message(json.loads(message.data.decode("utf-8")))
 
         tenant_id = message_data.get("tenant_id")
         log_id = message_data.get("log_id")
         text = message_data.get("text")
-        source = message_data.get("source")
-        ingested_at = message_data.get("ingested_at")
+        shard_affinity.record(tenant_id)
+        parsed = time.perf_counter()
+
+        check_crash_test(text, delivery_attempt)
 
-        logger.info(f"Processing message for tenant={tenant_id}, log_id={log_id}")
+        await simulate_heavy_processing_async(text)
+        processed = time.perf_counter()
 
-        # 🧪 CRASH TEST: Fail first 5 attempts, then succeed
-        if "crash_test" in text.lower():
-            if delivery_attempt <= 5:
-                logger.error(f"🔥 CRASH (Attempt {delivery_attempt}/5)")
-                raise Exception(f"Simulated crash - Attempt {delivery_attempt}")
+        document = build_document(message_data, delivery_attempt)
+
+        chunks = 0
+        if len(text) > REDACT_STREAM_THRESHOLD_CHARS:
+            redacted = time.perf_counter()
+            segments = redact_pii_chunked(
+                iter_windows(text, REDACT_WINDOW_CHARS),
+                REDACT_WINDOW_CHARS,
+                REDACT_OVERLAP_CHARS,
+            )
+            chunks, redactions = await store_chunked_in_firestore_async(
+                tenant_id, log_id, document, segments
+            )
+        else:
+            if len(text) > ASYNC_OFFLOAD_REDACT_CHARS:
+                modified_data = await asyncio.get_running_loop().run_in_executor(
+                    None, redact_pii, text
+                )
             else:
-                logger.info(f"✅ PASSED after {delivery_attempt} attempts")
+                modified_data = redact_pii(text)
+            redacted = time.perf_counter()
+            redactions = modified_data.count("[REDACTED]") - text.count("[REDACTED]")
 
-        # Normal processing continues...
-        simulate_heavy_processing(text)
+            document["original_text"] = text
+            document["modified_data"] = modified_data
 
-        # Redact PII
-        modified_data = redact_pii(text)
+            await retry_transient_async(
+                store_in_firestore_async,
+                tenant_id,
+                log_id,
+                document,
+                **store_retry_options(),
+            )
+        stored = time.perf_counter()
 
-        # Prepare document for storage
-        document = {
-            "source": source,
-            "original_text": text,
-            "modified_data": modified_data,
-            "ingested_at": ingested_at,
-            "processed_at": datetime.utcnow().isoformat(),
-            "character_count": len(text),
-            "processing_time_seconds": len(text) * 0.05,
-            # "retry_attempts": retry_counter.get(f"{tenant_id}:{log_id}", 0)  # Track retries
-            # "retry_attempts": retry_count  # Track retries
-            "delivery_attempt(s)": delivery_attempt,  # Use Pub/Sub's counter
-        }
-
-        # Store in Firestore with multi-tenant isolation
-        store_in_firestore(tenant_id, log_id, document)
+        aggregator.record(
+            tenant_id,
+            messages=1,
+            characters=len(text),
+            redactions=redactions,
+            delivery_attempts=delivery_attempt,
+        )
 
-        # Acknowledge message (prevents reprocessing)
+        # ack()/nack() only queue a request for the client's dispatcher
         message.ack()
-        logger.info(f"✅ Successfully processed and acked message {message.message_id}")
+
+        log_processed(
+            message,
+            message_data,
+            redactions,
+            chunks,
+            (started, parsed, processed, redacted, stored),
+        )
 
     except Exception as e:
-        logger.error(f"❌ Error processing message: {e}")
-        # NACK the message to retry later (handles crash scenarios)
-        message.nack()
-        logger.info(f"🔄 Message {message.message_id} nacked for retry")
+        dead_lettered = False
+        if classify_error(e) == PERMANENT:
+            future = publish_dead_letter(message, e)
+            dead_lettered = await wait_dead_letter_async(future)
+        if dead_lettered:
+            message.ack()
+        else:
+            message.nack()
+        log_failed(message, message_data, e, started, dead_lettered)
+
+
+class KeySequencer:
+    """
+    Runs work for the same ordering key strictly one at a time, in arrival
+    order, while different keys run in parallel on the caller's threads
+
+    The first caller for an idle key runs its work inline and then drains
+    anything queued for that key meanwhile; later callers only enqueue and
+    return. No extra threads are used
+    """
+
+    def __init__(self):
+        self._queues = {}
+        self._lock = Lock()
+
+    def run(self, key: str, fn, *args):
+        if not key:
+            fn(*args)
+            return
+
+        with self._lock:
+            queue = self._queues.get(key)
+            if queue is not None:
+                queue.append((fn, args))
+                return
+            self._queues[key] = deque()
+
+        while True:
+            try:
+                fn(*args)
+            except Exception as e:
+                logger.error(f"Ordered work failed for key {key}: {e}")
+            with self._lock:
+                queue = self._queues[key]
+                if not queue:
+                    del self._queues[key]
+                    return
+                fn, args = queue.popleft()
+
+    def active_keys(self) -> int:
+        with self._lock:
+            return len(self._queues)
+
+
+sequencer = KeySequencer()
+
+
+class AsyncKeySequencer:
+    """
+    KeySequencer for coroutines on a single event loop: one message at a
+    time per ordering key, in arrival order; no lock needed on one loop
+    """
+
+    def __init__(self):
+        self._queues = {}
+
+    async def run(self, key: str, fn, *args):
+        if not key:
+            await fn(*args)
+            return
+
+        queue = self._queues.get(key)
+        if queue is not None:
+            queue.append((fn, args))
+            return
+        self._queues[key] = deque()
+
+        while True:
+            try:
+                await fn(*args)
+            except Exception as e:
+                logger.error(f"Ordered work failed for key {key}: {e}")
+            queue = self._queues[key]
+            if not queue:
+                del self._queues[key]
+                return
+            fn, args = queue.popleft()
+
+    def active_keys(self) -> int:
+        return len(self._queues)
+
+
+class AsyncCore:
+    """
+    Worker I/O on one asyncio event loop thread (WORKER_IO_MODE=async)
+
+    The streaming pull callback only hands each message to the loop
+    (submit), so an in-flight message costs a task rather than a thread and
+    flow control, not the callback pool, bounds concurrency
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.sequencer = AsyncKeySequencer()
+        self._tasks = set()
+        self._thread = Thread(target=self._run, name="async-core", daemon=True)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def _open_client(self):
+        global async_db
+        # grpc.aio channels belong to the loop that creates them
+        if async_db is None:
+            async_db = firestore.AsyncClient(project=PROJECT_ID)
+
+    def start(self):
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._open_client(), self.loop).result()
+
+    def submit(self, message: pubsub_v1.subscriber.message.Message):
+        """Streaming pull callback: enqueue onto the loop and return"""
+        self.loop.call_soon_threadsafe(self._spawn, message)
+
+    def _spawn(self, message):
+        task = self.loop.create_task(
+            self.sequencer.run(message.ordering_key, self._process, message)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _process(self, message):
+        """
+        process_message_async, traced 1-in-N like callback(); messages share
+        the loop thread, so samples taken while a traced message is in
+        flight may include work for concurrent messages
+        """
+        if not profiler.should_sample():
+            return await process_message_async(message)
+        ident = profiler.begin()
+        try:
+            return await process_message_async(message)
+        finally:
+            profiler.end(ident)
+
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def stop(self, timeout: float = 30):
+        """Let in-flight messages finish (up to timeout), then stop the loop"""
+
+        async def drain():
+            if self._tasks:
+                await asyncio.wait(set(self._tasks), timeout=timeout)
+
+        if self._thread.is_alive():
+            asyncio.run_coroutine_threadsafe(drain(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout)
+
+
+# Set by main() in async I/O mode
+async_core = None
 
 
 def callback(message: pubsub_v1.subscriber.message.Message):
     """
     Callback for each message received
+    Messages with an ordering key are processed one at a time per key
     """
-    process_message(message)
+    with profiler.profile():
+        sequencer.run(message.ordering_key, process_message, message)
 
 
 def main():
     """
     Main worker loop - subscribes to Pub/Sub and processes messages
     """
+    global async_core
     logger.info(f"Worker starting, subscribing to {subscription_path}")
 
     # Start health check server in background thread
@@ -228,15 +993,39 @@ def main():
     health_thread.start()
     logger.info("Health check endpoint available at /health")
 
+    # Start periodic flush of per-tenant aggregates
+    aggregate_thread = Thread(target=aggregator.run, daemon=True)
+    aggregate_thread.start()
+
     # Configure flow control for high throughput
     flow_control = pubsub_v1.types.FlowControl(
         max_messages=100,  # Process up to 100 messages concurrently
         max_bytes=100 * 1024 * 1024,  # 100 MB
     )
+    on_message, scheduler = callback, None
+
+    if WORKER_IO_MODE == "async":
+        async_core = AsyncCore()
+        async_core.start()
+        on_message = async_core.submit
+        # Callbacks return immediately, so a few threads feed the loop and
+        # flow control alone bounds the messages in flight
+        flow_control = pubsub_v1.types.FlowControl(
+            max_messages=ASYNC_MAX_IN_FLIGHT, max_bytes=100 * 1024 * 1024
+        )
+        scheduler = pubsub_v1.subscriber.scheduler.ThreadScheduler(
+            ThreadPoolExecutor(max_workers=ASYNC_CALLBACK_THREADS)
+        )
+        logger.info(f"Async I/O core: up to {ASYNC_MAX_IN_FLIGHT} messages in flight")
 
     # Start streaming pull
+    if fault_injector is not None:
+        on_message = fault_injector.wrap_callback(on_message)
     streaming_pull_future = subscriber.subscribe(
-        subscription_path, callback=callback, flow_control=flow_control
+        subscription_path,
+        callback=on_message,
+        flow_control=flow_control,
+        scheduler=scheduler,
     )
 
     logger.info(f"Listening for messages on {subscription_path}")
@@ -255,6 +1044,11 @@ def main():
         logger.error(f"Worker error: {e}")
         streaming_pull_future.cancel()
         raise
+    finally:
+        if async_core is not None:
+            async_core.stop()
+        aggregator.stop()
+        aggregator.flush()
 
 
 if __name__ == "__main__":
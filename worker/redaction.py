@@ -0,0 +1,147 @@
+"""
+PII redaction
+Phone number detectors shared by the worker and the backfill job
+Has no GCP dependencies, so process pools can import it cheaply
+"""
+
+import bisect
+import os
+import re
+from typing import Iterable, Iterator, List, Tuple
+
+# Window size and lookahead for redact_pii_chunked
+REDACT_WINDOW_CHARS = int(os.getenv("REDACT_WINDOW_CHARS", 64 * 1024))
+# Must exceed the longest phone number match (PHONE_MAX_MATCH_CHARS)
+REDACT_OVERLAP_CHARS = int(os.getenv("REDACT_OVERLAP_CHARS", 256))
+
+PHONE_REGEX = re.compile(
+    r"""
+    (                           # Main phone patterns
+        (?:\+?\d{1,3}[\s.\-]?)?       # optional country code, e.g. +1, 1, +91-
+        (?:\(?\d{3}\)?[\s.\-]?)       # area code with or without parentheses
+        \d{3}[\s.\-]?\d{4}            # 3 + 4 digits (local number)
+        (?:\s{0,3}(?:ext\.?|x)\s{0,3}\d{1,5})?  # optional extension, ext 1234 / x1234
+    )
+    |
+    (?:\b\d{3}[\s.\-]\d{4}\b)         # 7-digit local: 555-0199 or 555.0199
+    """,
+    re.VERBOSE,
+)
+
+# Every repetition above is bounded: 5 + 6 + 8 + 15 characters at most
+PHONE_MAX_MATCH_CHARS = 34
+
+# Plain 10-digit numbers like 5551234567
+PHONE_DIGITS_ONLY_REGEX = re.compile(r"\b\d{10}\b")
+
+
+def redact_pii(text: str) -> str:
+    """
+    Redact common phone number patterns from text.
+    Covers:
+      - +1 555 123 4567 / +91-22-1234-5678 (simple intl)
+      - (555) 123-4567
+      - 555-123-4567 / 555.123.4567 / 555 123 4567
+      - 555-0199
+      - 5551234567
+    """
+    redacted = PHONE_REGEX.sub("[REDACTED]", text)
+    redacted = PHONE_DIGITS_ONLY_REGEX.sub("[REDACTED]", redacted)
+    return redacted
+
+
+WORD_CHAR_REGEX = re.compile(r"\w")
+
+
+def redact_structured(value):
+    """redact_pii applied to every string inside nested dicts/lists"""
+    if isinstance(value, str):
+        return redact_pii(value)
+    if isinstance(value, dict):
+        return {key: redact_structured(child) for key, child in value.items()}
+    if isinstance(value, list):
+        return [redact_structured(child) for child in value]
+    return value
+
+
+def _phone_spans(buffer: str, endpos: int) -> List[Tuple[int, int]]:
+    return [match.span() for match in PHONE_REGEX.finditer(buffer, 0, endpos)]
+
+
+def _safe_cut(buffer: str, limit: int, spans: List[Tuple[int, int]]) -> int:
+    """
+    Largest position <= limit where buffer can be split without changing
+    what redact_pii matches: not inside a phone match and not between two
+    word characters (so word-boundary anchors see the same neighbours)
+    Returns 0 if there is no such position
+    """
+    starts = [start for start, _ in spans]
+    cut = limit
+    while cut > 0:
+        index = bisect.bisect_left(starts, cut) - 1
+        if index >= 0 and spans[index][1] > cut:
+            cut = spans[index][0]
+        start = cut
+        while (
+            0 < cut < len(buffer)
+            and WORD_CHAR_REGEX.match(buffer, cut - 1)
+            and WORD_CHAR_REGEX.match(buffer, cut)
+        ):
+            cut -= 1
+        if cut == start:
+            return cut
+    return 0
+
+
+def _redact_segment(buffer: str, cut: int, spans: List[Tuple[int, int]]) -> str:
+    """redact_pii(buffer[:cut]), reusing the phone matches already found"""
+    parts, position = [], 0
+    for start, end in spans:
+        if end > cut:
+            break
+        parts.append(buffer[position:start])
+        parts.append("[REDACTED]")
+        position = end
+    parts.append(buffer[position:cut])
+    return PHONE_DIGITS_ONLY_REGEX.sub("[REDACTED]", "".join(parts))
+
+
+def redact_pii_chunked(
+    pieces: Iterable[str],
+    window: int = REDACT_WINDOW_CHARS,
+    overlap: int = REDACT_OVERLAP_CHARS,
+) -> Iterator[Tuple[str, str]]:
+    """
+    Streaming redact_pii: yields (original_segment, redacted_segment) pairs
+    whose concatenations equal the input and redact_pii(input)
+
+    Input is consumed piece by piece; a segment of at most `window`
+    characters is emitted once `overlap` characters past it are buffered,
+    and is cut where no phone number spans the boundary. `overlap` must be
+    longer than PHONE_MAX_MATCH_CHARS. A run of word characters longer
+    than `window` is kept whole in one segment up to 4x `window`; beyond
+    that it is split at the window edge
+    """
+    buffer = ""
+    for piece in pieces:
+        buffer += piece
+        while len(buffer) >= window + overlap:
+            spans = _phone_spans(buffer, window + overlap)
+            cut = _safe_cut(buffer, window, spans)
+            if not cut:
+                limit = min(len(buffer) - overlap, 4 * window)
+                spans = _phone_spans(buffer, limit + overlap)
+                cut = _safe_cut(buffer, limit, spans)
+            if not cut:
+                if len(buffer) < 4 * window + overlap:
+                    break
+                cut = window
+            yield buffer[:cut], _redact_segment(buffer, cut, spans)
+            buffer = buffer[cut:]
+    if buffer:
+        yield buffer, redact_pii(buffer)
+
+
+def iter_windows(text: str, window: int = REDACT_WINDOW_CHARS) -> Iterator[str]:
+    for start in range(0, len(text), window):
+        yield text[start : start + window]
@@ -0,0 +1,146 @@
+"""
+Low-overhead structured logging
+- JSON records (Cloud Logging understands "severity" and "message")
+- Non-blocking: callers enqueue records; a listener thread formats and
+  writes them. A full queue drops records instead of blocking
+- Lazy: %-style args are only formatted on the listener thread, and
+  log_event() checks level and per-event sampling before building a record
+
+This module is kept identical in api/ and worker/ (separate build contexts)
+
+Environment:
+    LOG_LEVEL           INFO by default
+    LOG_FORMAT          json (default) or text
+    LOG_QUEUE_SIZE      max queued records before dropping (default 10000)
+    LOG_SAMPLE_RATES    per-event keep ratio, e.g. "published=0.01,stored=0"
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+_sample_rates = {}
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; structured fields come from extra={"fields"}"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(
+                record.created, timezone.utc
+            ).isoformat(),
+            "severity": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        event = getattr(record, "event", None)
+        if event:
+            entry["event"] = event
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that defers all formatting to the listener thread and
+    drops records when the queue is full
+    """
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Stock QueueHandler formats in the caller; the listener shares this
+        # process, so the record (and its args) can be passed as-is
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+def parse_sample_rates(spec: str) -> dict:
+    """'a=0.1,b=0' -> {"a": 0.1, "b": 0.0}"""
+    rates = {}
+    for item in spec.split(","):
+        if "=" in item:
+            event, rate = item.split("=", 1)
+            rates[event.strip()] = float(rate)
+    return rates
+
+
+def configure_logging(level: str = None, fmt: str = None):
+    """Install the queue-based handler on the root logger (idempotent)"""
+    global _listener, _sample_rates
+
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.getenv("LOG_FORMAT", "json")).lower()
+    _sample_rates = parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if fmt == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(
+            logging.Formatter("%(levelname)s:%(name)s:%(message)s")
+        )
+
+    stop_logging()
+
+    log_queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", 10000)))
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, NonBlockingQueueHandler):
+            root.removeHandler(handler)
+    root.addHandler(NonBlockingQueueHandler(log_queue))
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, stream_handler, respect_handler_level=False
+    )
+    _listener.start()
+
+
+@atexit.register
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def set_sample_rate(event: str, rate: float):
+    _sample_rates[event] = rate
+
+
+def log_event(
+    logger: logging.Logger, level: int, event: str, msg: str, *args, **fields
+):
+    """
+    Log a structured event if its level is enabled and it wins the
+    per-event sampling draw; otherwise return before building a record
+    """
+    if not logger.isEnabledFor(level):
+        return
+    rate = _sample_rates.get(event, 1.0)
+    if rate < 1.0 and (rate <= 0.0 or random.random() >= rate):
+        return
+    logger.log(level, msg, *args, extra={"event": event, "fields": fields})
+
+
+def dropped_records() -> int:
+    return NonBlockingQueueHandler.dropped
@@ -0,0 +1,268 @@
+"""
+Unit tests for the re-redaction backfill job
+Run with: pytest tests/
+"""
+
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import ANY, MagicMock, patch
+
+import backfill
+import pytest
+from google.api_core import exceptions as gcp_exceptions
+
+
+def snapshot(tenant_id, log_id, processed_at, original, modified):
+    snap = MagicMock()
+    snap.id = log_id
+    snap.reference.path = f"tenants/{tenant_id}/processed_logs/{log_id}"
+    snap.to_dict.return_value = {
+        "processed_at": processed_at,
+        "original_text": original,
+        "modified_data": modified,
+    }
+    return snap
+
+
+@pytest.fixture
+def store():
+    """Two tenants; every other log was stored by an older, weaker detector"""
+    logs = {}
+    for tenant_id in ("acme", "globex"):
+        logs[tenant_id] = [
+            snapshot(
+                tenant_id,
+                f"log_{i:02d}",
+                f"2024-01-01T00:00:{i:02d}",
+                f"call (555) 123-{4000 + i}",
+                (
+                    "call [REDACTED]"
+                    if i % 2
+                    else f"call (555) [REDACTED]{i}"  # missed by the old detector
+                ),
+            )
+            for i in range(7)
+        ]
+    return logs
+
+
+def fake_fetch(store):
+    def fetch_page(db, tenant_id, after, page_size, start=None, end=None):
+        rows = store[tenant_id]
+        if after:
+            rows = [r for r in rows if r.id > after[1]]
+        return rows[: page_size + 1]
+
+    return fetch_page
+
+
+def make_args(**overrides):
+    args = backfill.parse_args([])
+    args.page_size = 3
+    args.workers = 2
+    args.report_every = 3600
+    for name, value in overrides.items():
+        setattr(args, name, value)
+    return args
+
+
+class TestRedactRecords:
+    def test_returns_only_changed_documents(self):
+        records = [
+            ("a", "call 555-0199", "call [REDACTED]", None),
+            ("b", "call 555-0199", "call 555-0199", None),
+        ]
+        assert backfill.redact_records(records) == [
+            (
+                "b",
+                {"modified_data": "call 555-0199"},
+                {"modified_data": "call [REDACTED]"},
+            )
+        ]
+
+    def test_re_redacts_structured_fields(self):
+        stale = {"user": {"phone": "555-0199", "id": 7}, "tags": ["ok"]}
+        records = [
+            ("a", "ok", "ok", {"user": {"phone": "[REDACTED]"}}),
+            ("b", "ok", "ok", stale),
+            ("c", None, None, stale),  # chunked parent: fields only
+        ]
+
+        changed = backfill.redact_records(records)
+
+        redacted = {"user": {"phone": "[REDACTED]", "id": 7}, "tags": ["ok"]}
+        assert changed == [
+            ("b", {"fields": stale}, {"fields": redacted}),
+            ("c", {"fields": stale}, {"fields": redacted}),
+        ]
+
+    def test_split_covers_all_records(self):
+        parts = backfill.split(list(range(10)), 3)
+        assert len(parts) == 3
+        assert sum(parts, []) == list(range(10))
+
+
+class TestRunBackfill:
+    def run(self, store, args, db=None):
+        db = db or MagicMock()
+        db.collection.return_value.list_documents.return_value = [
+            MagicMock(id=tenant_id) for tenant_id in store
+        ]
+        out = io.StringIO()
+        with patch("backfill.fetch_page", fake_fetch(store)), ThreadPoolExecutor(
+            2
+        ) as pool:
+            stats = backfill.run_backfill(db, args, pool, out)
+        return db, stats, out.getvalue()
+
+    def test_writes_changed_documents(self, store):
+        db, stats, _ = self.run(store, make_args())
+
+        assert stats.total("scanned") == 14
+        assert stats.total("changed") == 8
+        assert stats.total("written") == 8
+        updated = [c[0][0] for c in db.document.call_args_list]
+        assert "tenants/acme/processed_logs/log_00" in updated
+        assert "tenants/acme/processed_logs/log_01" not in updated
+        fields = db.batch.return_value.update.call_args[0][1]
+        assert fields["modified_data"] == "call [REDACTED]"
+
+    def test_writes_changed_structured_fields(self, store):
+        chunked = snapshot("acme", "log_99", "2024-01-01T00:01:00", None, None)
+        chunked.to_dict.return_value = {
+            "processed_at": "2024-01-01T00:01:00",
+            "chunked": True,
+            "fields": {"caller": "555-0199"},
+        }
+        store["acme"][1].to_dict.return_value["fields"] = {"caller": "555-0199"}
+        store["acme"][3].to_dict.return_value["fields"] = {"caller": "[REDACTED]"}
+        store["acme"].append(chunked)
+
+        db, stats, _ = self.run(store, make_args(tenant="acme"))
+
+        written = {
+            path[0][0]: update[0][1]
+            for path, update in zip(
+                db.document.call_args_list,
+                db.batch.return_value.update.call_args_list,
+            )
+        }
+        redacted = {"caller": "[REDACTED]"}
+        assert written["tenants/acme/processed_logs/log_01"] == {
+            "fields": redacted,
+            "redaction_backfilled_at": ANY,
+        }
+        assert written["tenants/acme/processed_logs/log_99"]["fields"] == redacted
+        assert "tenants/acme/processed_logs/log_03" not in written
+        assert stats.total("changed") == 6
+
+    def test_dry_run_prints_diff_and_writes_nothing(self, store, tmp_path):
+        checkpoint = str(tmp_path / "ckpt.json")
+        db, stats, out = self.run(
+            store, make_args(dry_run=True, diff_limit=1, checkpoint=checkpoint)
+        )
+
+        db.batch.return_value.update.assert_not_called()
+        assert stats.total("changed") == 8
+        assert out.count("(re-redacted)") == 1
+        assert "+call [REDACTED]" in out
+        assert not (tmp_path / "ckpt.json").exists()
+
+    def test_resumes_from_checkpoint(self, store, tmp_path):
+        checkpoint = str(tmp_path / "ckpt.json")
+        failing_db = MagicMock()
+        commits = {"count": 0}
+
+        def commit():
+            commits["count"] += 1
+            if commits["count"] == 4:
+                raise RuntimeError("Firestore unavailable")
+
+        failing_db.batch.return_value.commit.side_effect = commit
+        with pytest.raises(RuntimeError):
+            self.run(store, make_args(checkpoint=checkpoint), failing_db)
+
+        with open(checkpoint) as f:
+            state = json.load(f)
+        assert state["done"] == ["acme"]
+        assert state["tenant"] is None
+
+        _, stats, _ = self.run(store, make_args(checkpoint=checkpoint))
+        assert list(stats.tenants) == ["globex"]
+        assert stats.total("written") == 4
+
+    def test_checkpoint_filters_must_match(self, store, tmp_path):
+        checkpoint = str(tmp_path / "ckpt.json")
+        self.run(store, make_args(checkpoint=checkpoint, tenant="acme"))
+
+        with pytest.raises(SystemExit):
+            self.run(store, make_args(checkpoint=checkpoint, tenant="globex"))
+
+
+class TestParseArgs:
+    def test_time_bounds_normalized_to_naive_utc(self):
+        args = backfill.parse_args(
+            [
+                "--processed-after",
+                "2024-01-01",
+                "--processed-before",
+                "2024-02-01T02:00:00+02:00",
+            ]
+        )
+
+        assert args.processed_after == "2024-01-01T00:00:00"
+        assert args.processed_before == "2024-02-01T00:00:00"
+        assert backfill.iso_timestamp("2024-01-01T00:00:00Z") == "2024-01-01T00:00:00"
+
+    def test_invalid_time_bound_rejected(self, capsys):
+        with pytest.raises(SystemExit):
+            backfill.parse_args(["--processed-after", "last tuesday"])
+
+        assert "invalid ISO-8601 timestamp" in capsys.readouterr().err
+
+
+class TestWriteChanges:
+    def test_commits_in_batches_of_500(self):
+        db = MagicMock()
+        changes = [
+            (f"p/{i}", {"modified_data": "old"}, {"modified_data": "new"})
+            for i in range(1200)
+        ]
+
+        assert backfill.write_changes(db, changes) == (1200, 0)
+        assert db.batch.return_value.commit.call_count == 3
+
+    def test_skips_documents_deleted_since_read(self):
+        db = MagicMock()
+        db.document.side_effect = lambda path: MagicMock(path=path)
+        commits = {"count": 0}
+
+        def commit():
+            commits["count"] += 1
+            if commits["count"] == 1:
+                raise gcp_exceptions.NotFound("No document to update")
+
+        db.batch.return_value.commit.side_effect = commit
+        db.get_all.side_effect = lambda refs, field_paths: [
+            MagicMock(reference=ref, exists=ref.path != "p/1") for ref in refs
+        ]
+        changes = [
+            (f"p/{i}", {"modified_data": "old"}, {"modified_data": "new"})
+            for i in range(3)
+        ]
+
+        assert backfill.write_changes(db, changes) == (2, 1)
+        retried = [c[0][0].path for c in db.batch.return_value.update.call_args_list]
+        assert retried[3:] == ["p/0", "p/2"]
+
+    def test_not_found_without_missing_documents_raises(self):
+        db = MagicMock()
+        db.batch.return_value.commit.side_effect = gcp_exceptions.NotFound("gone")
+        db.get_all.return_value = [MagicMock(exists=True)]
+        db.get_all.return_value[0].reference = db.document.return_value
+
+        with pytest.raises(gcp_exceptions.NotFound):
+            backfill.write_changes(
+                db, [("p/0", {"modified_data": "old"}, {"modified_data": "new"})]
+            )
@@ -0,0 +1,148 @@
+"""
+Unit tests for the processed_logs compaction job
+Run with: pytest tests/
+"""
+
+import io
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import archive
+import compaction
+import pytest
+
+
+def snapshot(log_id, processed_at, **data):
+    snap = MagicMock()
+    snap.id = log_id
+    snap.reference.id = log_id
+    snap.to_dict.return_value = {
+        "processed_at": processed_at,
+        "modified_data": f"{log_id}: Call [REDACTED]",
+        **data,
+    }
+    return snap
+
+
+@pytest.fixture
+def logs():
+    """Two days of logs plus one chunked log"""
+    rows = [snapshot(f"a{i}", f"2024-01-01T00:00:{i:02d}") for i in range(5)]
+    rows.append(snapshot("big", "2024-01-01T12:00:00", chunked=True))
+    rows += [snapshot(f"b{i}", f"2024-01-02T00:00:{i:02d}") for i in range(3)]
+    return rows
+
+
+def fake_fetch(rows):
+    def fetch_page(db, tenant_id, before, after, size):
+        ids = [r.id for r in rows]
+        start = ids.index(after[1]) + 1 if after else 0
+        return rows[start : start + size + 1]
+
+    return fetch_page
+
+
+def make_args(*argv):
+    args = compaction.parse_args(["--tenant", "acme", *argv])
+    args.page_size = 2
+    return args
+
+
+def written_segments(db):
+    return [c for c in db.batch().set.call_args_list if "codec" in c[0][1]]
+
+
+class TestPackSegments:
+    def test_splits_on_record_count_and_size(self):
+        records = [{"log_id": str(i), "text": "x" * 100} for i in range(10)]
+
+        with patch("archive.SEGMENT_MAX_RECORDS", 4):
+            segments, oversized = compaction.pack_segments(records)
+        assert [len(r) for r, _ in segments] == [4, 4, 2]
+        assert oversized == []
+
+        with patch("archive.SEGMENT_MAX_BYTES", 60):
+            segments, oversized = compaction.pack_segments(records)
+        assert all(len(data) <= 60 for _, data in segments)
+        assert sum(len(r) for r, _ in segments) + len(oversized) == 10
+
+    def test_record_larger_than_a_segment_is_left_out(self):
+        record = {"log_id": "huge", "text": "x" * 50}
+
+        with patch("archive.SEGMENT_MAX_BYTES", 10):
+            assert compaction.pack_segments([record]) == ([], [record])
+
+
+class TestCompaction:
+    def test_archives_per_day_indexes_and_deletes(self, logs):
+        db = MagicMock()
+
+        with patch("compaction.fetch_page", fake_fetch(logs)):
+            report = compaction.run_compaction(db, make_args(), io.StringIO())
+
+        segments = written_segments(db)
+        assert [c[0][1]["day"] for c in segments] == ["2024-01-01", "2024-01-02"]
+        first = archive.decode_records(segments[0][0][1]["data"])
+        assert [r["log_id"] for r in first] == [f"a{i}" for i in range(5)]
+
+        index_writes = [
+            c for c in db.batch().set.call_args_list if "entries" in c[0][1]
+        ]
+        entries = {k: v for c in index_writes for k, v in c[0][1]["entries"].items()}
+        assert set(entries) == {f"a{i}" for i in range(5)} | {"b0", "b1", "b2"}
+        assert all(c[1] == {"merge": True} for c in index_writes)
+
+        deleted = {c[0][0].id for c in db.batch().delete.call_args_list}
+        assert deleted == set(entries)
+        counts = report.tenants["acme"]
+        assert (counts["scanned"], counts["archived"], counts["skipped"]) == (9, 8, 1)
+        assert counts["segments"] == 2
+
+    def test_dry_run_writes_nothing(self, logs):
+        db = MagicMock()
+
+        with patch("compaction.fetch_page", fake_fetch(logs)):
+            report = compaction.run_compaction(
+                db, make_args("--dry-run"), io.StringIO()
+            )
+
+        db.batch().commit.assert_not_called()
+        assert report.tenants["acme"]["archived"] == 8
+        assert report.tenants["acme"]["deleted"] == 0
+
+    def test_cutoff_matches_processed_at_format(self):
+        now = datetime(2024, 3, 1, 12, 0, 0)
+
+        assert compaction.cutoff(30, now) == "2024-01-31T12:00:00"
+
+    def test_retention_must_outlast_archiving(self):
+        with pytest.raises(SystemExit):
+            compaction.parse_args(["--older-than-days", "30", "--retention-days", "7"])
+
+
+class TestExpireSegments:
+    def test_removes_only_index_entries_pointing_at_the_segment(self):
+        db = MagicMock()
+        segment = MagicMock()
+        segment.id = "2023-01-01-abc"
+        segment.get.return_value = archive.encode_records(
+            [{"log_id": "kept"}, {"log_id": "moved"}]
+        )
+        collection = db.collection().document().collection()
+        collection.where.return_value.stream.return_value = [segment]
+        collection.document.return_value.get.return_value.to_dict.return_value = {
+            "entries": {"kept": "2023-01-01-abc", "moved": "2023-02-01-def"}
+        }
+
+        expired = compaction.expire_segments(db, "acme", "2023-06-01", False)
+
+        assert expired == 1
+        updates = [c[0][1] for c in db.batch().update.call_args_list]
+        removed = {path for update in updates for path in update}
+        assert removed == {"entries.kept"}
+        reads = collection.document.return_value.get.call_args_list
+        assert {path for c in reads for path in c[1]["field_paths"]} == {
+            "entries.kept",
+            "entries.moved",
+        }
+        db.batch().delete.assert_called_once_with(segment.reference)
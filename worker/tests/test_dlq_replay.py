@@ -0,0 +1,217 @@
+"""
+Unit tests for the dead-letter replay tool
+Run with: pytest tests/
+"""
+
+import io
+import json
+from unittest.mock import MagicMock
+
+import dlq_replay
+import pytest
+
+
+def received(message_id, tenant_id, source="json_upload", **attributes):
+    r = MagicMock()
+    r.ack_id = f"ack-{message_id}"
+    r.message.message_id = message_id
+    r.message.data = json.dumps({"tenant_id": tenant_id, "text": "hi"}).encode()
+    r.message.attributes = {
+        "tenant_id": tenant_id,
+        "source": source,
+        "CloudPubSubDeadLetterSourceDeliveryCount": "20",
+        **attributes,
+    }
+    r.message.ordering_key = ""
+    return r
+
+
+def subscriber_with(*pulls):
+    subscriber = MagicMock()
+    responses = [MagicMock(received_messages=list(p)) for p in pulls]
+    responses.append(MagicMock(received_messages=[]))
+    subscriber.pull.side_effect = responses
+    return subscriber
+
+
+def acked(subscriber):
+    return [
+        ack_id
+        for c in subscriber.acknowledge.call_args_list
+        for ack_id in c[1]["request"]["ack_ids"]
+    ]
+
+
+def released(subscriber):
+    return [
+        ack_id
+        for c in subscriber.modify_ack_deadline.call_args_list
+        for ack_id in c[1]["request"]["ack_ids"]
+    ]
+
+
+def args_for(*argv):
+    return dlq_replay.parse_args(["--project", "p", "--rate", "0", *argv])
+
+
+class TestReplay:
+    def test_republishes_matching_and_releases_others(self):
+        subscriber = subscriber_with(
+            [
+                received("1", "acme"),
+                received("2", "globex"),
+                received("3", "acme", error_class="permanent", error_type="X"),
+            ]
+        )
+        publisher = MagicMock()
+
+        report = dlq_replay.run_replay(
+            subscriber, publisher, args_for("--tenant", "acme"), io.StringIO()
+        )
+
+        assert report.replayed == {"acme": 2}
+        assert report.skipped == {"tenant": 1}
+        assert acked(subscriber) == ["ack-1", "ack-3"]
+        assert released(subscriber) == ["ack-2"]
+        attributes = publisher.publish.call_args[1]
+        assert attributes["replay_count"] == "1"
+        assert "CloudPubSubDeadLetterSourceDeliveryCount" not in attributes
+        assert "error_class" not in attributes and "error_type" not in attributes
+
+    def test_shard_is_recomputed_for_the_current_ring(self, monkeypatch):
+        from sharding import ShardRing
+
+        ring = ShardRing(3)
+        monkeypatch.setattr(dlq_replay, "shard_ring", ring)
+        attributes = dlq_replay.replay_attributes(
+            received("1", "acme", shard="7").message
+        )
+        assert attributes["shard"] == str(ring.shard_for("acme"))
+
+        monkeypatch.setattr(dlq_replay, "shard_ring", None)
+        attributes = dlq_replay.replay_attributes(
+            received("1", "acme", shard="7").message
+        )
+        assert "shard" not in attributes
+
+    def test_default_topic_follows_sharding(self, monkeypatch):
+        from sharding import ShardRing
+
+        monkeypatch.delenv("PUBSUB_TOPIC_ID", raising=False)
+        monkeypatch.setattr(dlq_replay, "shard_ring", None)
+        assert args_for().topic == "data-ingestion"
+
+        monkeypatch.setattr(dlq_replay, "shard_ring", ShardRing(2, vnodes=4))
+        assert args_for().topic == "data-ingestion-sharded"
+        assert args_for("--topic", "other").topic == "other"
+
+    def test_failed_publish_is_not_acked(self):
+        subscriber = subscriber_with([received("1", "acme"), received("2", "acme")])
+        publisher = MagicMock()
+        failed = MagicMock()
+        failed.result.side_effect = TimeoutError()
+        publisher.publish.side_effect = [MagicMock(), failed]
+
+        report = dlq_replay.run_replay(subscriber, publisher, args_for(), io.StringIO())
+
+        assert sum(report.failed.values()) == 1
+        assert report.errors == {"TimeoutError": 1}
+        assert acked(subscriber) == ["ack-1"]
+        assert released(subscriber) == ["ack-2"]
+
+    def test_filters_by_attribute_and_error_class(self):
+        subscriber = subscriber_with(
+            [
+                received("1", "acme", error_class="transient"),
+                received("2", "acme", error_class="permanent"),
+                received("3", "acme"),
+            ]
+        )
+
+        report = dlq_replay.run_replay(
+            subscriber,
+            MagicMock(),
+            args_for("--error-class", "transient", "--error-class", "unclassified"),
+            io.StringIO(),
+        )
+
+        assert acked(subscriber) == ["ack-1", "ack-3"]
+        assert report.skipped == {"error_class": 1}
+
+        args = args_for("--attribute", "source=text_upload")
+        subscriber = subscriber_with([received("4", "acme", source="text_upload")])
+        dlq_replay.run_replay(subscriber, MagicMock(), args, io.StringIO())
+        assert acked(subscriber) == ["ack-4"]
+
+    def test_dry_run_changes_nothing(self):
+        subscriber = subscriber_with([received("1", "acme"), received("2", "acme")])
+        publisher = MagicMock()
+
+        report = dlq_replay.run_replay(
+            subscriber, publisher, args_for("--dry-run"), io.StringIO()
+        )
+
+        assert sum(report.replayed.values()) == 2
+        publisher.publish.assert_not_called()
+        subscriber.acknowledge.assert_not_called()
+        assert released(subscriber) == ["ack-1", "ack-2"]
+
+    def test_redelivered_messages_are_counted_once(self):
+        first = received("1", "acme", source="other")
+        again = received("1", "acme", source="other")
+        again.ack_id = "ack-1-again"
+        subscriber = subscriber_with([first], [again])
+
+        report = dlq_replay.run_replay(
+            subscriber, None, args_for("--source", "json_upload"), io.StringIO()
+        )
+
+        assert report.pulled == 1
+        assert released(subscriber) == ["ack-1", "ack-1-again"]
+
+    def test_exports_to_jsonl(self, tmp_path):
+        subscriber = subscriber_with([received("1", "acme")])
+
+        report = dlq_replay.run_replay(
+            subscriber,
+            None,
+            args_for("--output", str(tmp_path), "--ack"),
+            io.StringIO(),
+        )
+
+        (path,) = tmp_path.iterdir()
+        record = json.loads(path.read_text())
+        assert record["message_id"] == "1"
+        assert record["attributes"]["tenant_id"] == "acme"
+        assert report.replayed == {"acme": 1}
+        assert acked(subscriber) == ["ack-1"]
+
+    def test_export_without_ack_keeps_messages(self, tmp_path):
+        subscriber = subscriber_with([received("1", "acme")])
+
+        dlq_replay.run_replay(
+            subscriber, None, args_for("--output", str(tmp_path)), io.StringIO()
+        )
+
+        subscriber.acknowledge.assert_not_called()
+        assert released(subscriber) == ["ack-1"]
+
+
+class TestRateLimiter:
+    def test_paces_to_rate(self):
+        now = {"t": 0.0}
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now["t"] += seconds
+
+        limiter = dlq_replay.RateLimiter(10, clock=lambda: now["t"], sleep=sleep)
+        for _ in range(5):
+            limiter.wait()
+
+        assert now["t"] == pytest.approx(0.4)
+
+    def test_attribute_filter_requires_key_value(self):
+        with pytest.raises(SystemExit):
+            dlq_replay.parse_attribute_filters(["tenant_id"])
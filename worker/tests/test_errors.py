@@ -0,0 +1,131 @@
+"""
+Unit tests for worker error classification and retries
+Run with: pytest tests/
+"""
+
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import errors
+import pytest
+from errors import PermanentMessageError, retry_transient, retry_transient_async
+from faults import InjectedFault
+from google.api_core import exceptions as gcp_exceptions
+
+
+class TestClassifyError:
+    @pytest.mark.parametrize(
+        "error",
+        [
+            gcp_exceptions.ServiceUnavailable("down"),
+            gcp_exceptions.DeadlineExceeded("slow"),
+            gcp_exceptions.TooManyRequests("busy"),
+            TimeoutError(),
+            ConnectionResetError(),
+            InjectedFault("injected store error"),
+        ],
+    )
+    def test_transient(self, error):
+        assert errors.classify_error(error) == errors.TRANSIENT
+
+    @pytest.mark.parametrize(
+        "error",
+        [
+            PermanentMessageError("bad"),
+            json.JSONDecodeError("bad", "{", 0),
+            UnicodeDecodeError("utf-8", b"\xff", 0, 1, "invalid"),
+            gcp_exceptions.InvalidArgument("too big"),
+        ],
+    )
+    def test_permanent(self, error):
+        assert errors.classify_error(error) == errors.PERMANENT
+
+    def test_anything_else_is_unknown(self):
+        assert errors.classify_error(Exception("boom")) == errors.UNKNOWN
+        assert (
+            errors.classify_error(gcp_exceptions.PermissionDenied("iam"))
+            == errors.UNKNOWN
+        )
+
+
+class TestValidateMessage:
+    def test_valid_payload_is_returned(self):
+        data = {"tenant_id": "acme", "log_id": "log_1", "text": ""}
+        assert errors.validate_message(data) is data
+
+    @pytest.mark.parametrize(
+        "data",
+        [
+            ["not", "an", "object"],
+            {"log_id": "log_1", "text": "hi"},
+            {"tenant_id": "", "log_id": "log_1", "text": "hi"},
+            {"tenant_id": "a/b", "log_id": "log_1", "text": "hi"},
+            {"tenant_id": "acme", "log_id": 7, "text": "hi"},
+            {"tenant_id": "acme", "log_id": "log_1"},
+        ],
+    )
+    def test_invalid_payloads_are_permanent(self, data):
+        with pytest.raises(PermanentMessageError):
+            errors.validate_message(data)
+
+
+class TestRetryTransient:
+    def test_retries_transient_errors_until_success(self):
+        fn = MagicMock(side_effect=[TimeoutError(), InjectedFault("x"), "ok"])
+        slept = []
+
+        assert retry_transient(fn, "a", sleep=slept.append) == "ok"
+
+        assert fn.call_count == 3
+        assert len(slept) == 2
+        assert all(0 <= s <= 0.2 for s in slept)
+
+    def test_gives_up_after_attempts(self):
+        fn = MagicMock(side_effect=TimeoutError())
+
+        with pytest.raises(TimeoutError):
+            retry_transient(fn, attempts=3, sleep=lambda s: None)
+
+        assert fn.call_count == 3
+
+    @pytest.mark.parametrize("error", [PermanentMessageError("bad"), Exception()])
+    def test_other_errors_are_not_retried(self, error):
+        fn = MagicMock(side_effect=error)
+
+        with pytest.raises(type(error)):
+            retry_transient(fn, sleep=lambda s: None)
+
+        fn.assert_called_once()
+
+    def test_async(self):
+        fn = AsyncMock(side_effect=[gcp_exceptions.ServiceUnavailable("down"), "ok"])
+
+        result = asyncio.run(retry_transient_async(fn, "a", base=0))
+
+        assert result == "ok"
+        assert fn.await_count == 2
+
+    def test_backoff_is_capped(self):
+        assert all(errors.backoff_delay(30, 0.1, 2.0) <= 2.0 for _ in range(100))
+
+
+class TestDeadLetterAttributes:
+    def test_error_details_and_original_attributes(self):
+        message = MagicMock()
+        message.attributes = {"tenant_id": "acme", "error_class": "stale"}
+        message.delivery_attempt = 3
+        message.message_id = "msg_1"
+
+        attributes = errors.dead_letter_attributes(
+            message, PermanentMessageError("x" * 5000), "sub"
+        )
+
+        assert attributes["tenant_id"] == "acme"
+        assert attributes["error_class"] == errors.PERMANENT
+        assert attributes["error_type"] == "PermanentMessageError"
+        assert len(attributes["error_message"]) == errors.ERROR_MESSAGE_MAX_CHARS
+        assert attributes["delivery_attempt"] == "3"
+        assert attributes["original_message_id"] == "msg_1"
+        assert attributes["dead_letter_subscription"] == "sub"
+        assert all(isinstance(v, str) for v in attributes.values())
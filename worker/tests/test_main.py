@@ -45,6 +45,115 @@ class TestPIIRedaction:
         assert result == text
 
 
+class TestChunkedRedaction:
+    """Test windowed redaction matches whole-text redaction"""
+
+    PHONES = [
+        "555-0199",
+        "555-123-4567",
+        "(555) 123-4567",
+        "+1 555 123 4567",
+        "5551234567",
+        "555.123.4567 ext 42",
+    ]
+
+    def make_text(self, seed, length=5000):
+        import random
+
+        rng = random.Random(seed)
+        parts = []
+        while sum(len(p) for p in parts) < length:
+            choice = rng.random()
+            if choice < 0.2:
+                parts.append(rng.choice(self.PHONES))
+            elif choice < 0.3:
+                parts.append(str(rng.randrange(10**12)))
+            else:
+                parts.append(rng.choice(["user", "from", "ip", "[REDACTED]", "a_b"]))
+            parts.append(rng.choice([" ", "  ", "\n", ", ", ""]))
+        return "".join(parts)
+
+    def test_matches_whole_text_redaction(self):
+        from main import iter_windows, redact_pii_chunked
+
+        for seed in range(20):
+            text = self.make_text(seed)
+            segments = list(redact_pii_chunked(iter_windows(text, 50), 50, 64))
+            assert len(segments) > 1
+            assert "".join(original for original, _ in segments) == text
+            assert "".join(redacted for _, redacted in segments) == redact_pii(text)
+
+    def test_phone_spanning_window_boundary(self):
+        from main import redact_pii_chunked
+
+        text = "x" * 45 + " call 555-123-4567 now " + "y" * 40
+        segments = list(redact_pii_chunked([text[:50], text[50:]], 50, 32))
+        assert "".join(redacted for _, redacted in segments) == redact_pii(text)
+        assert all("555" not in redacted for _, redacted in segments)
+
+    def test_long_whitespace_before_extension_at_boundary(self):
+        """Test matches stay within the overlap whatever follows a number"""
+        from main import REDACT_OVERLAP_CHARS, iter_windows, redact_pii_chunked
+
+        for offset in range(400, 520, 2):
+            text = "a " * (offset // 2) + "555-123-4567" + " " * 300 + "x12 end"
+            segments = redact_pii_chunked(
+                iter_windows(text, 64), 512, REDACT_OVERLAP_CHARS
+            )
+            assert "".join(redacted for _, redacted in segments) == redact_pii(text)
+
+    def test_segments_bounded_by_window(self):
+        from main import iter_windows, redact_pii_chunked
+
+        text = self.make_text(1, 20000)
+        segments = list(redact_pii_chunked(iter_windows(text, 100), 100, 64))
+        assert max(len(original) for original, _ in segments) <= 100
+
+    def test_long_token_is_not_split(self):
+        from main import redact_pii_chunked
+
+        text = "a" * 150 + " 555-0199"
+        segments = list(redact_pii_chunked([text], 50, 32))
+        assert "".join(redacted for _, redacted in segments) == redact_pii(text)
+        assert segments[0][0].startswith("a" * 150)
+
+    def test_large_message_stored_as_chunks(self):
+        with patch("main.db") as mock_db, patch(
+            "main.store_in_firestore"
+        ) as mock_store, patch("main.simulate_heavy_processing"), patch(
+            "main.aggregator"
+        ) as mock_aggregator, patch(
+            "main.REDACT_STREAM_THRESHOLD_CHARS", 100
+        ), patch(
+            "main.REDACT_WINDOW_CHARS", 64
+        ), patch(
+            "main.REDACT_OVERLAP_CHARS", 32
+        ):
+            from main import process_message
+
+            text = "Call 555-0199 please. " * 30
+            mock_message = MagicMock()
+            mock_message.data = json.dumps(
+                {"tenant_id": "acme", "log_id": "big", "text": text}
+            ).encode("utf-8")
+            mock_message.delivery_attempt = 1
+
+            process_message(mock_message)
+
+            mock_store.assert_not_called()
+            mock_message.ack.assert_called_once()
+            log_ref = mock_db.collection().document().collection().document()
+            parent = log_ref.set.call_args[0][0]
+            assert parent["chunked"] is True
+            assert "modified_data" not in parent
+
+            chunks = [c[0][1] for c in mock_db.batch().set.call_args_list]
+            assert parent["chunk_count"] == len(chunks) > 1
+            assert "".join(c["original_text"] for c in chunks) == text
+            assert "".join(c["modified_data"] for c in chunks) == redact_pii(text)
+            assert mock_aggregator.record.call_args[1]["redactions"] == 30
+
+
 class TestHeavyProcessing:
     """Test simulated heavy processing"""
 
@@ -152,6 +261,54 @@ class TestMessageProcessing:
             mock_store.assert_called_once()
             mock_message.ack.assert_called_once()
 
+    def test_emits_single_summary_record(self, caplog):
+        """Test one structured summary record with timings per message"""
+        import logging
+
+        with patch("main.store_in_firestore"), patch(
+            "main.simulate_heavy_processing"
+        ), caplog.at_level(logging.INFO, logger="main"):
+            from main import process_message
+
+            mock_message = MagicMock()
+            mock_message.data = json.dumps(
+                {"tenant_id": "acme", "log_id": "log_1", "text": "Call 555-0199"}
+            ).encode("utf-8")
+            mock_message.message_id = "msg_1"
+            mock_message.delivery_attempt = 1
+
+            process_message(mock_message)
+
+        records = [r for r in caplog.records if r.name == "main"]
+        assert len(records) == 1
+        assert records[0].event == "message_processed"
+        assert records[0].fields["tenant_id"] == "acme"
+        assert records[0].fields["redactions"] == 1
+        for timing in ("parse_ms", "processing_ms", "redact_ms", "store_ms"):
+            assert records[0].fields[timing] >= 0
+
+    def test_structured_fields_are_redacted_and_stored(self):
+        with patch("main.store_in_firestore") as mock_store, patch(
+            "main.simulate_heavy_processing"
+        ):
+            from main import process_message
+
+            mock_message = MagicMock()
+            mock_message.data = json.dumps(
+                {
+                    "tenant_id": "acme",
+                    "log_id": "log_1",
+                    "text": "severity=WARN",
+                    "fields": {"user": {"id": 42, "phone": "555-0199"}},
+                }
+            ).encode("utf-8")
+            mock_message.delivery_attempt = 1
+
+            process_message(mock_message)
+
+            document = mock_store.call_args[0][2]
+            assert document["fields"] == {"user": {"id": 42, "phone": "[REDACTED]"}}
+
     def test_message_processing_failure(self):
         """Test message processing with failure"""
         with patch("main.store_in_firestore") as mock_store, patch(
@@ -181,6 +338,475 @@ class TestMessageProcessing:
             mock_message.nack.assert_called_once()
             mock_message.ack.assert_not_called()
 
+    def test_transient_store_error_is_retried_without_reprocessing(self):
+        from google.api_core import exceptions as gcp_exceptions
+
+        with patch("main.store_in_firestore") as mock_store, patch(
+            "main.simulate_heavy_processing"
+        ) as mock_process, patch("main.STORE_RETRY_BASE_SECONDS", 0):
+            from main import process_message
+
+            mock_store.side_effect = [gcp_exceptions.ServiceUnavailable("down"), None]
+            message = make_message()
+            process_message(message)
+
+        assert mock_store.call_count == 2
+        mock_process.assert_called_once()
+        message.ack.assert_called_once()
+        message.nack.assert_not_called()
+
+    def test_permanent_error_is_dead_lettered_and_acked(self):
+        with patch("main.store_in_firestore") as mock_store, patch(
+            "main.dead_letter_publisher"
+        ) as publisher:
+            from main import process_message
+
+            message = make_message()
+            message.data = b"{not json"
+            message.attributes = {"tenant_id": "acme"}
+            process_message(message)
+
+        mock_store.assert_not_called()
+        data = publisher.publish.call_args[0][1]
+        attributes = publisher.publish.call_args[1]
+        assert data == b"{not json"
+        assert attributes["error_class"] == "permanent"
+        assert attributes["error_type"] == "JSONDecodeError"
+        assert attributes["tenant_id"] == "acme"
+        message.ack.assert_called_once()
+        message.nack.assert_not_called()
+
+    def test_invalid_payload_is_dead_lettered(self):
+        with patch("main.dead_letter_publisher") as publisher:
+            from main import process_message
+
+            message = make_message(tenant_id="a/b")
+            message.attributes = {}
+            process_message(message)
+
+        assert publisher.publish.call_args[1]["error_type"] == "PermanentMessageError"
+        message.ack.assert_called_once()
+
+    def test_failed_dead_letter_publish_falls_back_to_nack(self):
+        with patch("main.dead_letter_publisher") as publisher:
+            from main import process_message
+
+            publisher.publish.return_value.result.side_effect = TimeoutError()
+            message = make_message()
+            message.data = b"{not json"
+            message.attributes = {}
+            process_message(message)
+
+        message.nack.assert_called_once()
+        message.ack.assert_not_called()
+
+    def test_crash_test_failures_are_not_dead_lettered(self):
+        with patch("main.dead_letter_publisher") as publisher, patch(
+            "main.simulate_heavy_processing"
+        ):
+            from main import process_message
+
+            process_message(make_message(text="crash_test"))
+
+        publisher.publish.assert_not_called()
+
+
+class TestTenantAggregator:
+    """Test per-tenant aggregate coalescing and flushing"""
+
+    def test_record_coalesces_per_tenant(self):
+        from main import TenantAggregator
+
+        aggregator = TenantAggregator(shards=4)
+        aggregator.record("acme", messages=1, characters=10)
+        aggregator.record("acme", messages=1, characters=5, redactions=2)
+        aggregator.record("beta", messages=1)
+
+        assert aggregator.pending() == {
+            "acme": {"messages": 2, "characters": 15, "redactions": 2},
+            "beta": {"messages": 1},
+        }
+
+    def test_flush_writes_one_batch_and_clears(self):
+        with patch("main.db") as mock_db:
+            from main import TenantAggregator
+
+            aggregator = TenantAggregator(shards=4)
+            aggregator.record("acme", messages=3)
+            aggregator.record("beta", messages=1)
+
+            assert aggregator.flush() == 2
+
+            batch = mock_db.batch.return_value
+            assert batch.set.call_count == 2
+            batch.commit.assert_called_once()
+            assert aggregator.pending() == {}
+
+    def test_flush_failure_keeps_deltas(self):
+        with patch("main.db") as mock_db:
+            from main import TenantAggregator
+
+            mock_db.batch.return_value.commit.side_effect = Exception("unavailable")
+
+            aggregator = TenantAggregator()
+            aggregator.record("acme", messages=1)
+            aggregator.flush()
+            aggregator.record("acme", messages=1)
+
+            assert aggregator.pending() == {"acme": {"messages": 2}}
+
+    def test_process_message_records_aggregates(self):
+        with patch("main.store_in_firestore"), patch(
+            "main.simulate_heavy_processing"
+        ), patch("main.aggregator") as mock_aggregator:
+            from main import process_message
+
+            mock_message = MagicMock()
+            mock_message.data = json.dumps(
+                {"tenant_id": "acme", "log_id": "log_1", "text": "Call 555-0199"}
+            ).encode("utf-8")
+            mock_message.delivery_attempt = 2
+
+            process_message(mock_message)
+
+            mock_aggregator.record.assert_called_once_with(
+                "acme",
+                messages=1,
+                characters=13,
+                redactions=1,
+                delivery_attempts=2,
+            )
+
+
+class TestShardAffinity:
+    """Test off-shard accounting for sharded workers"""
+
+    def test_counts_tenants_routed_elsewhere(self):
+        from main import ShardAffinity
+        from sharding import ShardRing
+
+        ring = ShardRing(4)
+        tenants = [f"tenant-{i}" for i in range(40)]
+        affinity = ShardAffinity(0, ring)
+        for tenant in tenants:
+            affinity.record(tenant)
+
+        away = [t for t in tenants if ring.shard_for(t) != 0]
+        stats = affinity.stats()
+        assert stats["messages"] == 40
+        assert stats["off_shard_messages"] == len(away)
+        assert stats["off_shard_tenants"] == len(away)
+        assert stats["shards"] == 4
+
+    def test_unsharded_worker_records_nothing(self):
+        from main import ShardAffinity
+
+        affinity = ShardAffinity(None, None)
+        affinity.record("acme")
+
+        assert affinity.messages == 0
+
+
+class TestKeySequencer:
+    """Test per-key ordered execution"""
+
+    def test_same_key_runs_in_order_one_at_a_time(self):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+
+        from main import KeySequencer
+
+        sequencer = KeySequencer()
+        results = []
+        running = {"count": 0, "max": 0}
+        lock = threading.Lock()
+
+        def work(seq):
+            with lock:
+                running["count"] += 1
+                running["max"] = max(running["max"], running["count"])
+            time.sleep(0.001)
+            results.append(seq)
+            with lock:
+                running["count"] -= 1
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            for seq in range(50):
+                pool.submit(sequencer.run, "acme", work, seq)
+
+        assert results == list(range(50))
+        assert running["max"] == 1
+        assert sequencer.active_keys() == 0
+
+    def test_different_keys_run_in_parallel(self):
+        import threading
+
+        from main import KeySequencer
+
+        sequencer = KeySequencer()
+        barrier = threading.Barrier(2, timeout=2)
+
+        threads = [
+            threading.Thread(target=sequencer.run, args=(key, barrier.wait))
+            for key in ("acme", "beta")
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert not barrier.broken
+
+    def test_failure_does_not_block_key(self):
+        from main import KeySequencer
+
+        sequencer = KeySequencer()
+        calls = []
+
+        def failing():
+            raise RuntimeError("boom")
+
+        sequencer.run("acme", failing)
+        sequencer.run("acme", calls.append, "next")
+
+        assert calls == ["next"]
+
+
+def make_message(text="Call 555-0199", ordering_key="", **extra):
+    message = MagicMock()
+    message.data = json.dumps(
+        {"tenant_id": "acme", "log_id": "log_1", "text": text, **extra}
+    ).encode("utf-8")
+    message.message_id = "msg_1"
+    message.delivery_attempt = 1
+    message.ordering_key = ordering_key
+    return message
+
+
+class TestAsyncCore:
+    """Test the asyncio I/O core (WORKER_IO_MODE=async)"""
+
+    def test_process_message_async_stores_and_acks(self):
+        import asyncio
+        from unittest.mock import AsyncMock
+
+        from main import process_message_async
+
+        with patch(
+            "main.store_in_firestore_async", new_callable=AsyncMock
+        ) as store, patch(
+            "main.simulate_heavy_processing_async", new_callable=AsyncMock
+        ):
+            message = make_message(fields={"phone": "555-0199"})
+            asyncio.run(process_message_async(message))
+
+        tenant_id, log_id, document = store.call_args[0]
+        assert (tenant_id, log_id) == ("acme", "log_1")
+        assert document["modified_data"] == "Call [REDACTED]"
+        assert document["fields"] == {"phone": "[REDACTED]"}
+        message.ack.assert_called_once()
+
+    def test_process_message_async_failure_nacks(self):
+        import asyncio
+        from unittest.mock import AsyncMock
+
+        from main import process_message_async
+
+        with patch(
+            "main.store_in_firestore_async",
+            new_callable=AsyncMock,
+            side_effect=Exception("Storage failed"),
+        ), patch("main.simulate_heavy_processing_async", new_callable=AsyncMock):
+            message = make_message(text="hello")
+            asyncio.run(process_message_async(message))
+
+        message.nack.assert_called_once()
+        message.ack.assert_not_called()
+
+    def test_process_message_async_dead_letters_permanent_errors(self):
+        import asyncio
+        from concurrent.futures import Future
+
+        from main import process_message_async
+
+        published = Future()
+        published.set_result("dlq-msg-1")
+        with patch("main.dead_letter_publisher") as publisher:
+            publisher.publish.return_value = published
+            message = make_message(text=["not", "a", "string"])
+            message.attributes = {}
+            asyncio.run(process_message_async(message))
+
+        assert publisher.publish.call_args[1]["error_class"] == "permanent"
+        message.ack.assert_called_once()
+        message.nack.assert_not_called()
+
+    def test_store_in_firestore_async_path(self):
+        import asyncio
+        from unittest.mock import AsyncMock
+
+        from main import store_in_firestore_async
+
+        with patch("main.async_db") as mock_db:
+            doc_ref = mock_db.collection().document().collection().document()
+            doc_ref.set = AsyncMock()
+            asyncio.run(store_in_firestore_async("acme", "log_1", {"a": 1}))
+
+        mock_db.collection.assert_any_call("tenants")
+        doc_ref.set.assert_awaited_once_with({"a": 1})
+
+    def test_chunked_store_async_commits_batches_then_parent(self):
+        import asyncio
+        from unittest.mock import AsyncMock
+
+        from main import store_chunked_in_firestore_async
+
+        segments = iter([("555-0199 a", "[REDACTED] a")] * 5)
+        with patch("main.async_db") as mock_db, patch(
+            "main.REDACT_CHUNKS_PER_BATCH", 2
+        ):
+            mock_db.batch.return_value.commit = AsyncMock()
+            parent = mock_db.collection().document().collection().document()
+            parent.set = AsyncMock()
+            result = asyncio.run(
+                store_chunked_in_firestore_async("acme", "log_1", {}, segments)
+            )
+
+        assert result == (5, 5)
+        assert mock_db.batch.return_value.commit.await_count == 3
+        assert parent.set.await_args[0][0] == {"chunked": True, "chunk_count": 5}
+
+    def test_async_sequencer_orders_per_key(self):
+        import asyncio
+
+        from main import AsyncKeySequencer
+
+        sequencer = AsyncKeySequencer()
+        results = []
+
+        async def work(seq):
+            await asyncio.sleep(0.001 * (seq % 3))
+            results.append(seq)
+
+        async def run():
+            await asyncio.gather(*(sequencer.run("acme", work, s) for s in range(20)))
+
+        asyncio.run(run())
+
+        assert results == list(range(20))
+        assert sequencer.active_keys() == 0
+
+    def test_submit_keeps_many_messages_in_flight_on_one_thread(self):
+        import asyncio
+        import threading
+        from unittest.mock import AsyncMock
+
+        from main import AsyncCore
+
+        threads, in_flight = set(), {"now": 0, "max": 0}
+
+        async def store(tenant_id, log_id, data):
+            threads.add(threading.get_ident())
+            in_flight["now"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["now"])
+            await asyncio.sleep(0.05)
+            in_flight["now"] -= 1
+
+        with patch("main.store_in_firestore_async", store), patch(
+            "main.simulate_heavy_processing_async", new_callable=AsyncMock
+        ), patch("main.async_db", MagicMock()):
+            core = AsyncCore()
+            core.start()
+            messages = [make_message() for _ in range(500)]
+            for message in messages:
+                core.submit(message)
+            core.stop()
+
+        assert all(m.ack.call_count == 1 for m in messages)
+        assert in_flight["max"] > 100
+        assert len(threads) == 1
+
+    def test_sampled_messages_are_profiled(self):
+        from unittest.mock import AsyncMock
+
+        from main import AsyncCore, profiler
+
+        with patch(
+            "main.process_message_async", new_callable=AsyncMock
+        ) as process, patch("main.async_db", MagicMock()), patch.object(
+            profiler, "sample_rate", 2
+        ), patch.object(
+            profiler, "begin", wraps=profiler.begin
+        ) as begin, patch.object(
+            profiler, "end", wraps=profiler.end
+        ) as end:
+            core = AsyncCore()
+            core.start()
+            for _ in range(10):
+                core.submit(make_message())
+            core.stop()
+
+        assert process.await_count == 10
+        assert begin.call_count == 5
+        assert end.call_count == 5
+
+
+class TestProfilingAdmin:
+    """Test profiling admin routes on the health check server"""
+
+    @pytest.fixture
+    def server_url(self):
+        import threading
+        from http.server import HTTPServer
+
+        from main import HealthCheckHandler
+
+        server = HTTPServer(("127.0.0.1", 0), HealthCheckHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield f"http://127.0.0.1:{server.server_port}"
+        server.shutdown()
+
+    def request(self, url, method="GET", token=None):
+        import urllib.error
+        import urllib.request
+
+        req = urllib.request.Request(url, method=method)
+        if token:
+            req.add_header("X-Admin-Token", token)
+        try:
+            with urllib.request.urlopen(req) as response:
+                return response.status, response.read().decode()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode()
+
+    def test_admin_disabled_without_token(self, server_url):
+        with patch("main.ADMIN_TOKEN", None):
+            status, _ = self.request(f"{server_url}/admin/profiling")
+        assert status == 404
+
+    def test_configure_sample_rate(self, server_url):
+        from main import profiler
+
+        with patch("main.ADMIN_TOKEN", "secret"):
+            status, _ = self.request(
+                f"{server_url}/admin/profiling?sample_rate=5", "POST", token="bad"
+            )
+            assert status == 403
+
+            status, body = self.request(
+                f"{server_url}/admin/profiling?sample_rate=5", "POST", token="secret"
+            )
+            assert status == 200
+            assert json.loads(body)["sample_rate"] == 5
+
+            status, body = self.request(
+                f"{server_url}/admin/profiling/cpu", token="secret"
+            )
+            assert status == 200
+
+        profiler.configure(sample_rate=0)
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])